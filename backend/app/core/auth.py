@@ -1,40 +1,115 @@
+import hashlib
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 
-from .database import get_db
+from .cache import LRUCache
+from .database import get_async_db
+from .security import decode_access_token
 from ..models.user import User
 from .config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+class Principal:
+    """The authenticated user of a request, detached from any database session"""
+
+    __slots__ = ("id", "email", "first_name", "last_name", "is_active", "created_at")
+
+    def __init__(self, id: int, email: str, first_name: Optional[str], last_name: Optional[str],
+                 is_active: bool, created_at: Optional[datetime]):
+        self.id = id
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.is_active = is_active
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.email, user.first_name, user.last_name, user.is_active, user.created_at)
+
+class PrincipalCache:
+    """Access tokens resolved to principals without decoding or querying again
+
+    Tokens are keyed by their SHA-256 digest and map to the user id and
+    expiry of their claims; principals are keyed by user id, so dropping a
+    user's principal covers every token they hold. Entries live at most
+    ttl_seconds, which bounds how long other processes serve a user that
+    was changed elsewhere.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._tokens = LRUCache(max_size, ttl_seconds)
+        self._principals = LRUCache(max_size, ttl_seconds)
+
+    def user_id(self, token: str) -> int:
+        """User id of a valid token, raising 401 if it is invalid or expired"""
+        key = hashlib.sha256(token.encode()).digest()
+        cached = self._tokens.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        claims = decode_access_token(token)
+        user_id = int(claims["sub"])
+        self._tokens.put(key, (user_id, claims.get("exp", float("inf"))))
+        return user_id
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        return self._principals.get(user_id)
+
+    def put(self, principal: Principal) -> None:
+        self._principals.put(principal.id, principal)
+
+    def invalidate(self, user_id: int) -> None:
+        self._principals.pop(user_id)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._principals.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": self._tokens.stats(), "principals": self._principals.stats()}
+
+principal_cache = PrincipalCache(settings.auth_cache_size, settings.auth_cache_ttl_seconds)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, user: User) -> None:
+    # Deactivations and profile changes take effect on the user's next request
+    principal_cache.invalidate(user.id)
+
+def _cache_principal(user: Optional[User]) -> Optional[Principal]:
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return principal
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Principal of a user from the users table, cached for later requests; None if there is no such user"""
+    return _cache_principal(db.query(User).filter(User.id == user_id).first())
+
+async def load_principal_async(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    return _cache_principal(await db.scalar(select(User).where(User.id == user_id)))
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = jwt.decode(
-            token,
-            settings.secret_key,
-            algorithms=[settings.algorithm]
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    user_id = principal_cache.user_id(token)
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = await load_principal_async(db, user_id)
+
+    if principal is None or not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if user is None:
-        raise credentials_exception
-        
-    return user 
\ No newline at end of file
+    return principal
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after ttl_seconds
+
+    With sliding=True an entry's lifetime restarts on every read, so
+    entries expire after ttl_seconds of idle time instead. With max_cost
+    set, least recently used entries are also evicted while the summed
+    cost passed to put() exceeds it.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, sliding: bool = False, max_cost: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.sliding = sliding
+        self.max_cost = max_cost
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._cost = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, cost = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._cost -= cost
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if self.sliding:
+                self._entries[key] = (value, now + self.ttl_seconds, cost)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, cost: int = 0) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._cost -= previous[2]
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, cost)
+            self._cost += cost
+            while len(self._entries) > self.max_size or (
+                self.max_cost is not None and self._cost > self.max_cost and len(self._entries) > 1
+            ):
+                _, (_, _, evicted_cost) = self._entries.popitem(last=False)
+                self._cost -= evicted_cost
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._cost -= entry[2]
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._cost = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "cost": self._cost,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
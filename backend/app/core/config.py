@@ -7,8 +7,71 @@ class Settings(BaseSettings):
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Decoded access tokens and the users they resolve to, so authenticated requests skip the
+    # users lookup; a user's entry is dropped when it is updated in this process
+    auth_cache_size: int = 10000
+    auth_cache_ttl_seconds: int = 60
+    # bcrypt cost factor; hashes below it are upgraded on the next successful login
+    bcrypt_rounds: int = 12
+    # Threads hashing and verifying passwords, and how many more requests may wait for one
+    # before logins and registrations are turned away with a 503
+    password_hash_workers: int = min(4, os.cpu_count() or 1)
+    password_hash_max_pending: int = 32
     cors_origins: List[str] = ["http://localhost:5173", "http://localhost:3000"]
     debug: bool = True
+    # Build the in-memory catalog indexes on a background thread, serving requests from the
+    # database until they are ready, rather than holding up startup
+    catalog_indexes_in_background: bool = True
+    # Product text search: "memory" (BM25 index), "fulltext" (FTS5/tsvector) or "ilike"
+    search_backend: str = "memory"
+    # Retry searches that match nothing with misspelled words corrected
+    fuzzy_search_enabled: bool = True
+    # Search result cache, also invalidated whenever the catalog changes
+    search_cache_size: int = 1024
+    search_cache_ttl_seconds: int = 300
+    # Answer filter-only product queries from an in-memory NumPy column snapshot
+    catalog_snapshot_enabled: bool = False
+    catalog_snapshot_refresh_seconds: int = 30
+    # Top up short text search results with LSA nearest neighbours built at startup
+    semantic_search_enabled: bool = True
+    semantic_min_similarity: float = 0.35
+    # Rendered product, category and brand responses served with ETag/Last-Modified
+    catalog_response_cache_size: int = 4096
+    catalog_response_cache_ttl_seconds: int = 300
+    catalog_http_max_age_seconds: int = 0
+    # Most messages accepted by one POST /chat/query/batch request
+    chat_batch_max_size: int = 1000
+    # /chat/ws: messages buffered per connection before reading pauses, and idle disconnect
+    chat_ws_queue_size: int = 8
+    chat_ws_idle_timeout_seconds: int = 300
+    # Last search per chat session for follow-ups, dropped after idle time or over the memory cap
+    conversation_state_max_sessions: int = 10000
+    conversation_state_idle_seconds: int = 1800
+    conversation_state_max_bytes: int = 64 * 1024 * 1024
+    # Results fetched by each chat search, so follow-ups can page through them from memory
+    conversation_prefetch_results: int = 30
+    # Intent detection: "regex" (pattern cascade), "model" (trained classifier) or "hybrid"
+    # (classifier when confident, patterns otherwise); weights come from train_intent_classifier
+    intent_detection: str = "regex"
+    intent_model_path: str = "intent_model.npz"
+    intent_min_confidence: float = 0.8
+    # "Frequently added together": neighbours kept per product, and the file written by
+    # build_related_products (counted from cart_items at startup when it is missing)
+    related_products_top_n: int = 20
+    related_products_path: str = "related_products.npz"
+    # Write-behind chat history: replies queue their messages and a background thread inserts
+    # them in bulk, by batch size or after the interval, journaling them until committed; each
+    # process journals to its own file, the journal path suffixed with its pid
+    chat_write_behind: bool = False
+    chat_write_behind_batch_size: int = 500
+    chat_write_behind_interval_ms: int = 200
+    chat_write_behind_queue_size: int = 10000
+    chat_write_behind_journal: str = "chat_messages.journal"
+    # Cold storage: archive_chat_history moves sessions idle for this many days into gzip
+    # segment files under the directory, rolling to a new segment past the size
+    chat_archive_dir: str = "chat_archive"
+    chat_archive_after_days: int = 90
+    chat_archive_segment_mb: int = 64
 
     class Config:
         env_file = ".env"
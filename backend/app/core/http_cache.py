@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from .config import settings
+
+class RenderedResponse:
+    """A serialized JSON body with the validators clients revalidate it against"""
+
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(self, content: Any, last_modified: Optional[datetime]):
+        self.body = JSONResponse(content=jsonable_encoder(content)).body
+        # Hash the body so every worker hands out the same tag for the same content
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()[:20]
+        if last_modified is not None and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def is_not_modified(request: Request, rendered: RenderedResponse) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no tags were sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, rendered.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and rendered.last_modified is not None:
+        try:
+            return rendered.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def conditional_response(request: Request, rendered: RenderedResponse) -> Response:
+    """Send the cached body, or an empty 304 if the client's copy is current"""
+    headers = {
+        "ETag": rendered.etag,
+        "Cache-Control": f"public, max-age={settings.catalog_http_max_age_seconds}"
+    }
+    if rendered.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(rendered.last_modified, usegmt=True)
+    if is_not_modified(request, rendered):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
@@ -1,13 +1,34 @@
+import logging
+import threading
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from .core.auth import principal_cache
 from .core.config import settings
-from .core.database import engine, Base
+from .core.database import engine, Base, SessionLocal, create_missing_indexes
+from .core.security import password_hasher
+from .models.chat import ChatMessage, ChatSession
+from .models.product import Product
 from .routes import auth, products, chat, cart
+from .services.catalog_events import catalog_version, indexes_loading, load_indexes
+from .services.catalog_responses import catalog_responses
+from .services.chat_archive import chat_archive
+from .services.conversation_state import conversation_states
+from .services.fulltext_search import fulltext_search
+from .services.intent_classifier import intent_classifier
+from .services.message_writer import message_writer
+from .services.product_search import search_cache
+from .services.related_products import related_products
+
+logger = logging.getLogger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# create_all skips tables that already exist, so add the listing and history indexes to older databases
+create_missing_indexes(engine, [Product.__table__, ChatSession.__table__, ChatMessage.__table__])
+
 app = FastAPI(
     title="Uplyft E-commerce Chatbot API",
     description="A modern e-commerce chatbot API built with FastAPI",
@@ -23,8 +44,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+def _load_catalog():
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        load_indexes(db)
+        if not related_products.load(settings.related_products_path):
+            related_products.build(db)
+        logger.info("Catalog indexes built in %.1fs", time.perf_counter() - started)
+    except Exception:
+        logger.exception("Building the catalog indexes failed; searches are served from the database")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def build_catalog_indexes():
+    if settings.search_backend == "fulltext":
+        fulltext_search.install(engine)
+
+    if settings.intent_detection != "regex" and not intent_classifier.load(settings.intent_model_path):
+        logger.warning("Intent model %s not found; detecting intents with patterns", settings.intent_model_path)
+
+    if settings.catalog_indexes_in_background:
+        threading.Thread(target=_load_catalog, name="catalog-indexes", daemon=True).start()
+    else:
+        _load_catalog()
+
+    if settings.chat_write_behind:
+        message_writer.start()
+
+@app.on_event("shutdown")
+def drain_message_writer():
+    message_writer.stop()
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(products.router, prefix="/products", tags=["Products"])
@@ -43,6 +98,21 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "API is running smoothly"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "catalog_version": catalog_version(),
+        "catalog_indexes_loading": indexes_loading(),
+        "search_cache": search_cache.stats(),
+        "catalog_responses": catalog_responses.stats(),
+        "conversation_states": conversation_states.stats(),
+        "related_products": related_products.stats(),
+        "message_writer": message_writer.stats(),
+        "chat_archive": chat_archive.stats(),
+        "auth_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
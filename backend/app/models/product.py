@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..core.database import Base
@@ -12,12 +12,17 @@ class Product(Base):
     price = Column(Float, nullable=False)
     category = Column(String, nullable=False, index=True)
     image_url = Column(String, nullable=True)
-    brand = Column(String, nullable=True)
+    brand = Column(String, nullable=True, index=True)
     rating = Column(Float, default=0.0)
     stock_quantity = Column(Integer, default=0)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)
+
+    # Matches the listing order so keyset pagination is an index range scan
+    __table_args__ = (
+        Index("ix_products_active_rating_created_id", "is_active", "rating", "created_at", "id"),
+    )
 
     # Relationships
     cart_items = relationship("CartItem", back_populates="product")
@@ -1,37 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from ..core.database import get_db
-from ..core.auth import get_current_user
+from ..core.database import get_async_db
+from ..core.auth import Principal, get_current_user
 from ..models.cart import CartItem
-from ..models.user import User
 from ..models.product import Product
 from ..schemas.cart import CartItemCreate, CartItemResponse
+from ..services.related_products import related_products
 
 router = APIRouter(tags=["cart"])
 
 @router.post("/add", response_model=CartItemResponse)
 async def add_to_cart(
     item: CartItemCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if product exists
-    product = db.query(Product).filter(Product.id == item.product_id).first()
+    product = await db.get(Product, item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Check if item already exists in cart
-    cart_item = db.query(CartItem).filter(
+    cart_item = await db.scalar(select(CartItem).where(
         CartItem.user_id == current_user.id,
         CartItem.product_id == item.product_id
-    ).first()
+    ))
     
     if cart_item:
         # Update quantity if item exists
         cart_item.quantity += item.quantity
+        cart_product_ids = None
     else:
         # Create new cart item
+        cart_product_ids = list(await db.scalars(
+            select(CartItem.product_id).where(CartItem.user_id == current_user.id)
+        ))
         cart_item = CartItem(
             user_id=current_user.id,
             product_id=item.product_id,
@@ -39,64 +44,67 @@ async def add_to_cart(
         )
         db.add(cart_item)
     
-    db.commit()
-    db.refresh(cart_item)
+    await db.commit()
+    # A product new to the cart now co-occurs with everything already in it
+    if cart_product_ids:
+        related_products.record_add(item.product_id, cart_product_ids)
+    await db.refresh(cart_item)
     return cart_item
 
 @router.delete("/remove/{product_id}")
 async def remove_from_cart(
     product_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    cart_item = db.query(CartItem).filter(
+    cart_item = await db.scalar(select(CartItem).where(
         CartItem.user_id == current_user.id,
         CartItem.product_id == product_id
-    ).first()
+    ))
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
     return {"message": "Item removed from cart"}
 
 @router.put("/update/{product_id}")
 async def update_cart_item(
     product_id: int,
     quantity: int = Query(..., ge=1),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if quantity < 1:
         raise HTTPException(status_code=400, detail="Quantity must be at least 1")
     
-    cart_item = db.query(CartItem).filter(
+    cart_item = await db.scalar(select(CartItem).where(
         CartItem.user_id == current_user.id,
         CartItem.product_id == product_id
-    ).first()
+    ))
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
     cart_item.quantity = quantity
-    db.commit()
-    db.refresh(cart_item)
+    await db.commit()
+    await db.refresh(cart_item)
     return cart_item
 
 @router.get("/items", response_model=List[CartItemResponse])
 async def get_cart_items(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
+    cart_items = (await db.scalars(select(CartItem).where(CartItem.user_id == current_user.id))).all()
     return cart_items
 
 @router.delete("/clear")
 async def clear_cart(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
-    db.commit()
+    await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
+    await db.commit()
     return {"message": "Cart cleared successfully"} 
\ No newline at end of file
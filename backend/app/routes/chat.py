@@ -1,66 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
-from ..core.database import get_db
-from ..models.user import User
+from starlette.background import BackgroundTask
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.auth import Principal, get_current_user, load_principal, principal_cache
+from ..core.config import settings
+from ..core.database import SessionLocal, get_db
+from ..core.security import decode_access_token
 from ..models.chat import ChatSession, ChatMessage
 from ..schemas.chat import (
-    ChatQuery, ChatResponse, ChatSession as ChatSessionSchema,
+    ChatQuery, ChatResponse, ChatSessionSummary,
     ChatMessage as ChatMessageSchema
 )
+from ..services.chat_archive import chat_archive
+from ..services.chat_history import ChatHistoryService
 from ..services.chatbot import ChatbotService
-from .auth import get_current_user
+from ..services.conversation_state import conversation_states
+from ..services.message_metadata import compact_metadata
+from ..services.message_writer import message_writer
 import json
 
 router = APIRouter()
 
+def _bot_metadata(bot_response: Dict[str, Any]) -> str:
+    # Product references only; full cards are filled in when history is read
+    return compact_metadata(bot_response['products'], bot_response.get('suggestions', []))
+
+def _message_rows(session_id: int, message: str, bot_response: Dict[str, Any], metadata: Optional[str] = None) -> List[Dict[str, Any]]:
+    """chat_messages rows for one exchange: the user's message and the bot's reply"""
+    return [
+        {'session_id': session_id, 'content': message, 'is_bot': False, 'message_metadata': None},
+        {
+            'session_id': session_id,
+            'content': bot_response['message'],
+            'is_bot': True,
+            'message_metadata': metadata or _bot_metadata(bot_response)
+        }
+    ]
+
+def _get_or_create_session(db: Session, session_id: Optional[int], user_id: int) -> Optional[ChatSession]:
+    """The user's session with this id, or a new one flushed for its id; None if not found"""
+    if session_id:
+        return db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        ).first()
+    session = ChatSession(user_id=user_id)
+    db.add(session)
+    db.flush()
+    return session
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.post("/query", response_model=ChatResponse)
 def chat_query(
     query: ChatQuery,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Process chat query and return response"""
     
-    # Get or create chat session
-    if query.session_id:
-        session = db.query(ChatSession).filter(
-            ChatSession.id == query.session_id,
-            ChatSession.user_id == current_user.id
-        ).first()
-        if not session:
-            raise HTTPException(status_code=404, detail="Chat session not found")
-    else:
-        # Create new session
-        session = ChatSession(user_id=current_user.id)
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-    
-    # Save user message
-    user_message = ChatMessage(
-        session_id=session.id,
-        content=query.message,
-        is_bot=False
-    )
-    db.add(user_message)
+    # Get or create chat session; a new one is committed together with the messages
+    session = _get_or_create_session(db, query.session_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
     
     # Process with chatbot service
     chatbot = ChatbotService(db)
-    bot_response = chatbot.process_message(query.message, current_user.id)
+    bot_response = chatbot.process_message(query.message, current_user.id, session.id)
     
-    # Save bot response
-    bot_message = ChatMessage(
-        session_id=session.id,
-        content=bot_response['message'],
-        is_bot=True,
-        metadata=json.dumps({
-            'products': bot_response['products'],
-            'suggestions': bot_response.get('suggestions', [])
-        })
-    )
-    db.add(bot_message)
-    db.commit()
+    # Save both messages, or queue them when write-behind is on
+    message_writer.save(db, _message_rows(session.id, query.message, bot_response))
     
     return ChatResponse(
         message=bot_response['message'],
@@ -69,39 +84,301 @@ def chat_query(
         suggestions=bot_response.get('suggestions', [])
     )
 
-@router.get("/sessions", response_model=List[ChatSessionSchema])
+def _save_streamed_reply(message: str, session_id: int, reply: Dict[str, Any]) -> None:
+    """Persist a streamed exchange once the response has been sent"""
+    if 'suggestions' not in reply:
+        # The client went away before the reply was complete
+        return
+    db = SessionLocal()
+    try:
+        message_writer.save(db, _message_rows(session_id, message, reply))
+    finally:
+        db.close()
+
+@router.post("/query/stream")
+def chat_query_stream(
+    query: ChatQuery,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream the response as Server-Sent Events: message, session, products, suggestions, done"""
+    user_id = current_user.id
+    # The session is settled before streaming starts, so a missing one is a plain 404 and
+    # conversation state is keyed on the real session id
+    session = _get_or_create_session(db, query.session_id, user_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    db.commit()
+    session_id = session.id
+    reply: Dict[str, Any] = {}
+
+    def events():
+        db = SessionLocal()
+        try:
+            for part, value in ChatbotService(db).respond(query.message, user_id, session_id):
+                reply[part] = value
+                if part != 'message':
+                    yield _sse(part, value)
+                    continue
+                yield _sse('message', {'message': value, 'is_bot': True})
+                yield _sse('session', {'session_id': session_id})
+            yield _sse('done', {})
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_save_streamed_reply, query.message, session_id, reply)
+    )
+
+def _bind_socket(user_id: int, session_id: Optional[int]) -> Optional[int]:
+    """Check the user and requested session once for a socket connection"""
+    db = SessionLocal()
+    try:
+        principal = principal_cache.get(user_id) or load_principal(db, user_id)
+        if principal is None or not principal.is_active:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+        if session_id and _get_or_create_session(db, session_id, user_id) is None:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        return session_id
+    finally:
+        db.close()
+
+def _socket_reply(user_id: int, session_id: Optional[int], message: str) -> Tuple[int, Dict[str, Any]]:
+    """Answer one socket message and save both sides of it in one commit"""
+    db = SessionLocal()
+    try:
+        if session_id is None:
+            session_id = _get_or_create_session(db, None, user_id).id
+        bot_response = ChatbotService(db).process_message(message, user_id, session_id)
+        message_writer.save(db, _message_rows(session_id, message, bot_response))
+        return session_id, bot_response
+    finally:
+        db.close()
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket, token: Optional[str] = None, session_id: Optional[int] = None):
+    """Chat over one socket: authenticate once, then exchange ChatQuery and ChatResponse JSON frames
+
+    Browsers pass the access token as the token query parameter. Messages
+    without a session_id continue the connection's session, which is
+    created with the first message unless one was given when connecting.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = token or authorization.removeprefix("Bearer ").strip()
+    try:
+        claims = decode_access_token(token)
+        user_id = int(claims["sub"])
+        session_id = await run_in_threadpool(_bind_socket, user_id, session_id)
+    except HTTPException as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=exc.detail)
+        return
+    except (KeyError, TypeError, ValueError):
+        # A signed token whose subject is not a user id
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    await websocket.accept()
+    expires_at = claims.get("exp")
+
+    # Reading pauses while the queue is full, so a fast sender is slowed by TCP flow control
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.chat_ws_queue_size)
+
+    async def receive():
+        # Text frames are queued as they arrive; however reading ends, the last item queued is
+        # the close code and reason for the socket, or None once the client has gone
+        closing = None
+        expiring = False
+        try:
+            while True:
+                # An idle socket is closed once its token expires, without waiting for its next frame
+                timeout = settings.chat_ws_idle_timeout_seconds
+                expiring = expires_at is not None and expires_at - time.time() < timeout
+                if expiring:
+                    timeout = max(0.0, expires_at - time.time())
+                message = await asyncio.wait_for(websocket.receive(), timeout)
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is None:
+                    closing = (status.WS_1003_UNSUPPORTED_DATA, "Expected text frames")
+                    break
+                await queue.put(message["text"])
+        except asyncio.TimeoutError:
+            if expiring:
+                closing = (status.WS_1008_POLICY_VIOLATION, "Token expired")
+            else:
+                closing = (status.WS_1000_NORMAL_CLOSURE, "Idle timeout")
+        except Exception:
+            closing = (status.WS_1011_INTERNAL_ERROR, "Could not read the message")
+        await queue.put(closing)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            frame = await queue.get()
+            if not isinstance(frame, str):
+                if frame is not None:
+                    await websocket.close(code=frame[0], reason=frame[1])
+                break
+            if expires_at is not None and expires_at <= time.time():
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                break
+
+            try:
+                query = ChatQuery.model_validate_json(frame)
+            except ValidationError:
+                await websocket.send_json({"type": "error", "detail": "Expected a ChatQuery JSON object"})
+                continue
+
+            if query.session_id and query.session_id != session_id:
+                try:
+                    session_id = await run_in_threadpool(_bind_socket, user_id, query.session_id)
+                except HTTPException as exc:
+                    await websocket.send_json({"type": "error", "detail": exc.detail})
+                    continue
+
+            session_id, bot_response = await run_in_threadpool(_socket_reply, user_id, session_id, query.message)
+            response = ChatResponse(
+                message=bot_response['message'],
+                products=bot_response['products'],
+                session_id=session_id,
+                suggestions=bot_response.get('suggestions', [])
+            )
+            await websocket.send_json({"type": "response", **response.model_dump()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+@router.post("/query/batch", response_model=List[ChatResponse])
+def chat_query_batch(
+    queries: List[ChatQuery],
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Process many chat queries with one session lookup, one insert and one commit"""
+    if len(queries) > settings.chat_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may hold at most {settings.chat_batch_max_size} messages"
+        )
+
+    # Look up every referenced session at once
+    session_ids = {query.session_id for query in queries if query.session_id}
+    sessions = {}
+    if session_ids:
+        sessions = {
+            session.id: session
+            for session in db.query(ChatSession).filter(
+                ChatSession.id.in_(session_ids),
+                ChatSession.user_id == current_user.id
+            )
+        }
+        if len(sessions) != len(session_ids):
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+    # Queries without a session each start a new one, as with /chat/query
+    new_sessions = [ChatSession(user_id=current_user.id) for query in queries if not query.session_id]
+    if new_sessions:
+        db.add_all(new_sessions)
+        db.flush()
+    new_session_ids = iter(session.id for session in new_sessions)
+
+    # Each distinct message's intent is detected once, up front, in one batch when a classifier is in use
+    chatbot = ChatbotService(db, memoize_searches=True)
+    messages = [query.message.lower().strip() for query in queries]
+    distinct = list(dict.fromkeys(messages))
+    intents = dict(zip(distinct, chatbot.detect_intents(distinct)))
+    responses = []
+    rows = []
+    for query, message in zip(queries, messages):
+        session_id = query.session_id or next(new_session_ids)
+        # Every message still updates its own session's follow-up state, but searches with the same
+        # parameters, from any session in the batch, are run and serialized once
+        bot_response = chatbot.process_message(query.message, current_user.id, session_id, intents[message])
+
+        rows.extend(_message_rows(session_id, query.message, bot_response))
+        responses.append(ChatResponse(
+            message=bot_response['message'],
+            products=bot_response['products'],
+            session_id=session_id,
+            suggestions=bot_response.get('suggestions', [])
+        ))
+
+    # One multi-row insert, made now or by the write-behind worker
+    message_writer.save(db, rows)
+    return responses
+
+@router.get("/sessions", response_model=List[ChatSessionSummary])
 def get_chat_sessions(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's chat sessions"""
-    sessions = db.query(ChatSession)\
-        .filter(ChatSession.user_id == current_user.id)\
-        .order_by(ChatSession.updated_at.desc())\
-        .all()
+    """Get a page of user's chat sessions, newest first, with message counts and last message"""
+    try:
+        sessions, next_cursor = ChatHistoryService(db).list_sessions(current_user.id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Pass the cursor back to fetch the next page
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return sessions
 
-@router.get("/sessions/{session_id}", response_model=ChatSessionSchema)
+@router.get("/sessions/{session_id}", response_model=ChatSessionSummary)
 def get_chat_session(
     session_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get specific chat session with messages"""
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
+    """Get specific chat session summary; its messages are paged from /messages"""
+    history = ChatHistoryService(db)
+    session = history.get_session(current_user.id, session_id)
+    # Sessions moved to cold storage come back into the hot tables on first access
+    if not session and chat_archive.restore(db, current_user.id, session_id):
+        session = history.get_session(current_user.id, session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
     return session
 
+@router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageSchema])
+def get_chat_messages(
+    session_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a page of a chat session's messages, newest first"""
+    owned = db.query(ChatSession.id).filter(
+        ChatSession.id == session_id,
+        ChatSession.user_id == current_user.id
+    ).first() or chat_archive.restore(db, current_user.id, session_id)
+    
+    if not owned:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    try:
+        messages, next_cursor = ChatHistoryService(db).list_messages(session_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Pass the cursor back to fetch older messages
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
+
 @router.delete("/sessions/{session_id}")
 def delete_chat_session(
     session_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete chat session"""
@@ -115,5 +392,6 @@ def delete_chat_session(
     
     db.delete(session)
     db.commit()
+    conversation_states.discard(current_user.id, session_id)
     
     return {"message": "Chat session deleted successfully"}
@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import select
 from typing import List, Optional
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_async_db, get_db
+from ..core.http_cache import RenderedResponse, conditional_response
 from ..models.product import Product
 from ..models.user import User
-from ..schemas.product import ProductResponse, ProductSearch
-from .auth import get_current_user
+from ..schemas.product import ProductResponse, ProductSearch, ProductFacets, ProductSuggestion
+from ..services.catalog_events import catalog_changed_at
+from ..services.catalog_responses import catalog_responses
+from ..services.product_search import AsyncProductSearchService, ProductSearchService
+from ..services.related_products import related_products
+from ..services.suggest_index import SuggestIndex, suggest_index
+from ..core.auth import get_current_user
 
 router = APIRouter()
 
 @router.get("/", response_model=List[ProductResponse])
-def get_products(
+async def get_products(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
     category: Optional[str] = None,
@@ -19,46 +28,98 @@ def get_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     brand: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Product).filter(Product.is_active == True)
-    
-    if category:
-        query = query.filter(Product.category.ilike(f"%{category}%"))
-    
-    if search:
-        query = query.filter(
-            or_(
-                Product.title.ilike(f"%{search}%"),
-                Product.description.ilike(f"%{search}%")
-            )
+    try:
+        products, next_cursor = await AsyncProductSearchService(db).search_products_page(
+            query=search,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            brand=brand,
+            limit=limit,
+            offset=skip,
+            cursor=cursor
         )
-    
-    if min_price is not None:
-        query = query.filter(Product.price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(Product.price <= max_price)
-    
-    if brand:
-        query = query.filter(Product.brand.ilike(f"%{brand}%"))
-    
-    products = query.offset(skip).limit(limit).all()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Pass the cursor back to fetch the next page; skip keeps working for older clients
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return products
 
+@router.get("/facets", response_model=ProductFacets)
+async def get_product_facets(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await AsyncProductSearchService(db).get_facets(
+        query=search,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        brand=brand
+    )
+
+@router.get("/suggest", response_model=List[ProductSuggestion])
+def suggest_products(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=SuggestIndex.TOP_K),
+    db: Session = Depends(get_db)
+):
+    if not suggest_index.ready:
+        # Still being built at startup
+        return ProductSearchService(db).suggest(prefix, limit)
+    return suggest_index.suggest(prefix, limit)
+
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def render():
+        product = await db.get(Product, product_id)
+        if product is None:
+            return None
+        return RenderedResponse(
+            ProductResponse.model_validate(product),
+            product.updated_at or product.created_at
+        )
+
+    # Served from memory, so revalidation with If-None-Match never reaches the database
+    rendered = await catalog_responses.get_or_render_async(("product", product_id), render)
+    if rendered is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return conditional_response(request, rendered)
+
+@router.get("/{product_id}/related", response_model=List[ProductResponse])
+async def get_related_products(
+    product_id: int,
+    limit: int = Query(10, ge=1, le=settings.related_products_top_n),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Products most often added to the same carts as this one"""
+    if await db.scalar(select(Product.id).where(Product.id == product_id)) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    # Neighbours that were since deactivated are dropped, so ask for all of them
+    related_ids = [other for other, _ in related_products.related(product_id, settings.related_products_top_n)]
+    return (await AsyncProductSearchService(db).get_products_by_ids(related_ids))[:limit]
 
 @router.get("/categories/", response_model=List[str])
-def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(Product.category).distinct().all()
-    return [category[0] for category in categories if category[0]]
+async def get_categories(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def render():
+        return RenderedResponse(await AsyncProductSearchService(db).get_categories(), catalog_changed_at())
+
+    rendered = await catalog_responses.get_or_render_async("categories", render)
+    return conditional_response(request, rendered)
 
 @router.get("/brands/", response_model=List[str])
-def get_brands(db: Session = Depends(get_db)):
-    brands = db.query(Product.brand).distinct().all()
-    return [brand[0] for brand in brands if brand[0]]
+async def get_brands(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def render():
+        return RenderedResponse(await AsyncProductSearchService(db).get_brands(), catalog_changed_at())
+
+    rendered = await catalog_responses.get_or_render_async("brands", render)
+    return conditional_response(request, rendered)
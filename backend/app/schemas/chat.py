@@ -1,11 +1,23 @@
-from pydantic import BaseModel
+import json
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 from typing import Optional, List, Any, Dict
 from datetime import datetime
 
 class ChatMessageBase(BaseModel):
     content: str
     is_bot: bool = False
-    metadata: Optional[Dict[str, Any]] = None
+    # Read from the model's message_metadata column, which holds JSON text; the model's own
+    # metadata attribute is SQLAlchemy's table MetaData
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("message_metadata", "metadata")
+    )
+
+    @field_validator("metadata", mode="before")
+    @classmethod
+    def parse_metadata(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
 
 class ChatMessageCreate(ChatMessageBase):
     session_id: int
@@ -34,6 +46,15 @@ class ChatSession(ChatSessionBase):
     class Config:
         from_attributes = True
 
+class ChatSessionSummary(ChatSessionBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+    message_count: int = 0
+    last_message: Optional[str] = None
+    last_message_is_bot: Optional[bool] = None
+    last_message_at: Optional[datetime] = None
+
 class ChatQuery(BaseModel):
     message: str
     session_id: Optional[int] = None
@@ -43,6 +64,7 @@ class ChatResponse(BaseModel):
     products: List[Dict[str, Any]] = []
     session_id: int
     is_bot: bool = True
+    suggestions: List[str] = []
 
 class MessageBase(BaseModel):
     content: str
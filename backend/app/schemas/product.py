@@ -32,3 +32,22 @@ class ProductSearch(BaseModel):
     brand: Optional[str] = None
     limit: Optional[int] = 20
     offset: Optional[int] = 0
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min_price: float
+    max_price: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[FacetCount] = []
+    brands: List[FacetCount] = []
+    price_histogram: List[PriceBucket] = []
+
+class ProductSuggestion(BaseModel):
+    text: str
+    kind: str
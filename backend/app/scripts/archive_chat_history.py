@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.services.chat_archive import ChatArchive
+
+def main():
+    parser = argparse.ArgumentParser(description="Move idle chat sessions out of the database into gzip archive segments")
+    parser.add_argument("--days", type=int, default=settings.chat_archive_after_days)
+    parser.add_argument("--directory", default=settings.chat_archive_dir)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    args = parser.parse_args()
+
+    archive = ChatArchive(args.directory, settings.chat_archive_segment_mb * 1024 * 1024)
+    before = datetime.utcnow() - timedelta(days=args.days)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        totals = archive.archive(db, before, args.batch_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    print(
+        f"Archived {totals['sessions']} sessions ({totals['messages']} messages) idle since {before:%Y-%m-%d} "
+        f"into {totals['bytes'] / 1024:.1f} KiB under {args.directory} in {elapsed:.2f}s"
+    )
+
+    if args.vacuum:
+        # VACUUM can't run inside a transaction on SQLite or PostgreSQL
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+        print("Vacuumed the database")
+
+if __name__ == "__main__":
+    main()
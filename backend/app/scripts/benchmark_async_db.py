@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, text
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.models.cart import CartItem
+from app.models.product import Product
+from app.services.catalog_events import load_indexes
+from app.services.product_search import AsyncProductSearchService, ProductSearchService, search_cache
+
+# Stands in for one slow query: SQLite counting through a recursive CTE
+SLOW_QUERY = text("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < :rows) SELECT count(*) FROM n")
+SEARCHES = ["laptop", "headphones", "phone", "shoes", "camera", "book", "watch", "speaker"]
+
+def operation(rng: random.Random, slow_share: float) -> tuple:
+    """A request of the mixed load: a cart read, a product search or, now and then, a slow query"""
+    if rng.random() < slow_share:
+        return ("slow",)
+    if rng.random() < 0.5:
+        return ("cart", rng.randint(1, 50))
+    # Random price floors keep searches from being served by the result cache
+    return ("search", rng.choice(SEARCHES), round(rng.uniform(0, 200), 2))
+
+def run_sync_operation(op: tuple, slow_rows: int) -> None:
+    db = SessionLocal()
+    try:
+        if op[0] == "slow":
+            db.execute(SLOW_QUERY, {"rows": slow_rows}).scalar()
+        elif op[0] == "cart":
+            db.query(CartItem).filter(CartItem.user_id == op[1]).all()
+        else:
+            ProductSearchService(db).search_products_page(query=op[1], min_price=op[2], limit=20)
+    finally:
+        db.close()
+
+async def run_async_operation(op: tuple, slow_rows: int) -> None:
+    async with AsyncSessionLocal() as db:
+        if op[0] == "slow":
+            await db.scalar(SLOW_QUERY, {"rows": slow_rows})
+        elif op[0] == "cart":
+            (await db.scalars(select(CartItem).where(CartItem.user_id == op[1]))).all()
+        else:
+            await AsyncProductSearchService(db).search_products_page(query=op[1], min_price=op[2], limit=20)
+
+async def run_mode(mode: str, args) -> dict:
+    rng = random.Random(args.seed)
+    operations = [operation(rng, args.slow_share) for _ in range(args.requests)]
+    queue: asyncio.Queue = asyncio.Queue()
+    for op in operations:
+        queue.put_nowait(op)
+    latencies = []
+    lags = []
+    done = asyncio.Event()
+
+    async def client():
+        while not queue.empty():
+            op = queue.get_nowait()
+            started = time.perf_counter()
+            if mode == "blocking":
+                # async def routes calling the sync Session, as the cart routes did
+                run_sync_operation(op, args.slow_rows)
+            elif mode == "threadpool":
+                # def routes, which FastAPI runs on its threadpool
+                await run_in_threadpool(run_sync_operation, op, args.slow_rows)
+            else:
+                await run_async_operation(op, args.slow_rows)
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    async def heartbeat():
+        # How late a 1 ms timer fires shows how long the event loop was blocked
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    search_cache.clear()
+    monitor = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await monitor
+    return {
+        "throughput": len(operations) / elapsed,
+        "p50": np.percentile(latencies, 50) * 1000,
+        "p99": np.percentile(latencies, 99) * 1000,
+        "lag_p99": np.percentile(lags, 99) * 1000 if lags else float("nan"),
+        "lag_max": max(lags) * 1000 if lags else float("nan")
+    }
+
+async def main_async(args) -> None:
+    db = SessionLocal()
+    try:
+        if not db.query(func.count(Product.id)).scalar():
+            print("No products; run app/scripts/seed_database.py first")
+            sys.exit(1)
+        # Searches use the same in-memory indexes as the API
+        load_indexes(db)
+    finally:
+        db.close()
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.slow_share:.0%} slow queries of {args.slow_rows} rows")
+    print(f"{'mode':<11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'loop lag p99 ms':>16} {'loop lag max ms':>16}")
+    for mode in args.modes:
+        result = await run_mode(mode, args)
+        print(
+            f"{mode:<11} {result['throughput']:>8.1f} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+            f"{result['lag_p99']:>16.1f} {result['lag_max']:>16.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async database sessions under a mixed concurrent load")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--slow-share", type=float, default=0.02, help="fraction of requests running the slow query")
+    parser.add_argument("--slow-rows", type=int, default=300000, help="rows the slow query counts through")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "threadpool", "async"],
+                        choices=["blocking", "threadpool", "async"])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.config import settings
+from app.core.database import Base
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.services.catalog_events import load_indexes
+from app.services.fuzzy_index import fuzzy_index
+from app.services.product_search import ProductSearchService
+from app.scripts.seed_database import PRODUCT_DATA, create_sample_products
+
+def catalog_words():
+    """Brand and item words users type when searching"""
+    words = set()
+    for data in PRODUCT_DATA.values():
+        for phrase in data["items"] + data["brands"]:
+            for word in phrase.lower().split():
+                if len(word) >= 4 and word.isalpha():
+                    words.add(word)
+    return sorted(words)
+
+def make_typo(word: str, rng: random.Random) -> str:
+    """Apply one random deletion, insertion, substitution or transposition"""
+    position = rng.randrange(1, len(word) - 1)
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    operation = rng.choice(["delete", "insert", "substitute", "transpose"])
+    if operation == "delete":
+        return word[:position] + word[position + 1:]
+    if operation == "insert":
+        return word[:position] + letter + word[position:]
+    if operation == "substitute":
+        return word[:position] + letter + word[position + 1:]
+    return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+
+def is_hit(products, word: str) -> bool:
+    for found in products:
+        text = " ".join(filter(None, (found.title, found.brand, found.category))).lower()
+        if word in text:
+            return True
+    return False
+
+def run(db, queries, backend: str, fuzzy: bool):
+    settings.search_backend = backend
+    settings.fuzzy_search_enabled = fuzzy
+    service = ProductSearchService(db)
+    latencies = []
+    hits = 0
+    for typo, word in queries:
+        started = time.perf_counter()
+        products = service.search_products(query=typo, limit=10)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += is_hit(products, word)
+    return hits / len(queries), latencies
+
+def report(name: str, recall: float, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<30} recall {recall:6.1%}   mean {statistics.mean(latencies):7.2f} ms   "
+          f"p50 {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare typo recall and latency of product search paths")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    print(f"Seeding {args.products} products...")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_sample_products(db, args.products)
+    load_indexes(db)
+
+    words = catalog_words()
+    queries = []
+    for _ in range(args.queries):
+        word = rng.choice(words)
+        queries.append((make_typo(word, rng), word))
+
+    print(f"Running {len(queries)} misspelled queries\n")
+    report("ilike (current)", *run(db, queries, "ilike", fuzzy=False))
+    report("ilike + fuzzy correction", *run(db, queries, "ilike", fuzzy=True))
+    report("bm25 index", *run(db, queries, "memory", fuzzy=False))
+    report("bm25 index + fuzzy correction", *run(db, queries, "memory", fuzzy=True))
+
+    latencies = []
+    for typo, _ in queries:
+        started = time.perf_counter()
+        fuzzy_index.correct(typo)
+        latencies.append((time.perf_counter() - started) * 1000)
+    corrected = sum(fuzzy_index.correct(typo) == word for typo, word in queries)
+    report("fuzzy index lookup only", corrected / len(queries), latencies)
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
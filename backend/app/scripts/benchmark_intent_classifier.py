@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.chatbot import ChatbotService
+from app.services.intent_classifier import intent_classifier
+
+# Messages as users send them, labelled with the intent a person would give them
+LABELED_MESSAGES = [
+    ("hi", "greeting"), ("hello there", "greeting"), ("good morning", "greeting"), ("how are you?", "greeting"),
+    ("hey, how's it going", "greeting"), ("what's up", "greeting"),
+    ("show me laptops", "product_search"), ("find smartphones", "product_search"),
+    ("i need a new phone", "product_search"), ("do you have nike sneakers", "product_search"),
+    ("samsung tv", "product_search"), ("sony headphones", "product_search"), ("yoga mat", "product_search"),
+    ("running shoes for women", "product_search"), ("a good cookbook", "product_search"),
+    ("gaming console", "product_search"), ("wireless bluetooth speaker", "product_search"),
+    ("i need a birthday gift", "product_search"), ("something for my dad", "product_search"),
+    ("best rated headphones", "product_search"), ("browse electronics", "product_search"),
+    ("looking for a durable tent for camping", "product_search"), ("popular products", "product_search"),
+    ("show me categories", "category_browse"), ("what categories do you have", "category_browse"),
+    ("what do you have", "category_browse"), ("list the kinds of products", "category_browse"),
+    ("what do you sell", "category_browse"),
+    ("how much is the dyson vacuum", "price_inquiry"), ("what's the price of the apple watch?", "price_inquiry"),
+    ("products under $100", "price_inquiry"), ("under $50", "price_inquiry"), ("my budget is $200", "price_inquiry"),
+    ("anything cheap?", "price_inquiry"), ("laptops under $800", "price_inquiry"),
+    ("what goes well with the sony laptop", "recommendation"), ("any recommendations for my cart?", "recommendation"),
+    ("what else should i buy", "recommendation"), ("similar to the nike sneakers", "recommendation"),
+    ("help", "help"), ("what can you do", "help"), ("how does this work", "help"), ("can you assist me", "help"),
+    ("i'm not sure how to use this", "help"),
+    ("bye", "goodbye"), ("goodbye!", "goodbye"), ("see you later", "goodbye"), ("thank you, bye", "goodbye"),
+    ("that's all for today", "goodbye"),
+    ("do you ship to canada?", "out_of_scope"), ("where is my order #1234", "out_of_scope"),
+    ("how do i return something", "out_of_scope"), ("what is your refund policy", "out_of_scope"),
+    ("tell me a joke", "out_of_scope"), ("can i talk to a human", "out_of_scope"),
+    ("how long does shipping take", "out_of_scope"), ("i want to cancel my order", "out_of_scope"),
+]
+SEARCHING_INTENTS = {"product_search", "price_inquiry", "default"}
+
+def detect(mode: str, messages):
+    settings.intent_detection = mode
+    return ChatbotService(None).detect_intents(messages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the trained intent classifier with the regex patterns")
+    parser.add_argument("--model", default=settings.intent_model_path)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    if not intent_classifier.load(args.model):
+        print(f"No model at {args.model}; run app/scripts/train_intent_classifier.py first")
+        sys.exit(1)
+
+    messages = [message for message, _ in LABELED_MESSAGES]
+    expected = [label for _, label in LABELED_MESSAGES]
+    print(f"{'mode':<8} {'accuracy':>9} {'needless searches':>18} {'us/msg':>8} {'p99 us':>8} {'batch us/msg':>13}")
+    for mode in ("regex", "model", "hybrid"):
+        predicted = detect(mode, messages)
+        # The patterns have no out-of-scope intent; their default is the closest answer
+        correct = sum(
+            got == want or (got == "default" and want == "out_of_scope")
+            for got, want in zip(predicted, expected)
+        )
+        needless = sum(got in SEARCHING_INTENTS and want not in SEARCHING_INTENTS for got, want in zip(predicted, expected))
+
+        latencies = []
+        for _ in range(args.rounds):
+            for message in messages:
+                started = time.perf_counter()
+                detect(mode, [message])
+                latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            detect(mode, messages)
+        batch = (time.perf_counter() - started) / (args.rounds * len(messages))
+
+        print(
+            f"{mode:<8} {correct / len(messages):>9.3f} {needless:>18} {np.mean(latencies) * 1e6:>8.1f} "
+            f"{np.percentile(latencies, 99) * 1e6:>8.1f} {batch * 1e6:>13.1f}"
+        )
+        for message, got, want in zip(messages, predicted, expected):
+            if got != want and not (got == "default" and want == "out_of_scope"):
+                print(f"    {message!r}: {got} (expected {want})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import re
+import time
+from app.services.chatbot import ChatbotService
+from app.services.intent_engine import INTENT_PATTERNS, intent_engine
+
+# Messages as users send them, including the chat UI's suggestion chips
+CHAT_MESSAGES = [
+    "hi", "hello there", "hey!", "good morning", "how are you?", "what's up",
+    "show me laptops", "find smartphones", "browse electronics", "i need a new phone",
+    "show me laptops under $800", "find smartphones under $500", "i want a product for my kitchen",
+    "do you have nike sneakers", "samsung tv", "sony headphones", "yoga mat",
+    "running shoes for women", "a good cookbook", "gaming console", "wireless bluetooth speaker",
+    "show me categories", "what categories do you have", "list the kinds of products", "what do you have",
+    "electronics category", "browse categories", "what types of clothing are there",
+    "how much is the dyson vacuum", "what's the price of the apple watch?", "products under $100",
+    "under $50", "my budget is $200", "anything cheap?", "is the laptop expensive",
+    "help", "what can you do", "how does this work", "can you assist me", "i need support",
+    "bye", "goodbye!", "see you later", "thank you, bye", "quit",
+    "show me more", "filter by price", "popular products", "what's popular?", "what's on sale?",
+    "i need a birthday gift", "find a gift", "show cheaper options", "something for my dad",
+    "do you ship to canada?", "where is my order #1234", "red dress size 8", "4k tv 55 inch",
+    "best rated headphones 2024", "compare iphone and galaxy", "is this in stock?",
+    "I am looking for a durable tent for camping with my family this summer, ideally under $300",
+]
+
+def legacy_detect(message: str) -> str:
+    """Intent detection as it was: one re.search per pattern in priority order"""
+    for intent, patterns in INTENT_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, message, re.IGNORECASE):
+                return intent
+    return 'default'
+
+def measure(function, messages, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            function(message)
+    return (time.perf_counter() - started) / (rounds * len(messages)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the combined intent regex with per-pattern searching")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    messages = [message.lower().strip() for message in CHAT_MESSAGES]
+    mismatches = [message for message in messages if legacy_detect(message) != intent_engine.detect(message)]
+    if mismatches:
+        print(f"Intent mismatch on {len(mismatches)} messages: {mismatches}")
+        sys.exit(1)
+    print(f"Both matchers agree on all {len(messages)} messages\n")
+
+    legacy = measure(legacy_detect, messages, args.rounds)
+    combined = measure(intent_engine.detect, messages, args.rounds)
+    print(f"{'per-pattern re.search':<28} {legacy:7.2f} us/message")
+    print(f"{'combined intent regex':<28} {combined:7.2f} us/message   ({legacy / combined:.1f}x)")
+
+    started = time.perf_counter()
+    for _ in range(args.rounds * 10):
+        ChatbotService(None)
+    print(f"{'ChatbotService()':<28} {(time.perf_counter() - started) / (args.rounds * 10) * 1e6:7.2f} us/instance")
+
+if __name__ == "__main__":
+    main()
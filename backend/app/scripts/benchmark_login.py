@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import asyncio
+import time
+import numpy as np
+
+EMAIL = "login-benchmark@example.com"
+PASSWORD = "login-benchmark"
+
+async def probe(client, path: str, stop: asyncio.Event, latencies: list) -> None:
+    """Request path back to back until stopped, recording each latency"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        # In-process requests to async endpoints never suspend; let the other tasks run
+        await asyncio.sleep(0)
+
+async def login_burst(client, logins: int, concurrency: int) -> dict:
+    statuses = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/auth/login", data={"username": EMAIL, "password": PASSWORD})
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    return {"ok": statuses.count(200), "busy": statuses.count(503), "other": len(statuses) - statuses.count(200) - statuses.count(503), "seconds": elapsed}
+
+def summary(latencies: list) -> str:
+    if not latencies:
+        return "no requests"
+    ms = np.array(latencies) * 1000
+    return f"{len(ms):>5} requests  p50 {np.percentile(ms, 50):7.1f} ms  p99 {np.percentile(ms, 99):7.1f} ms  max {ms.max():7.1f} ms"
+
+async def run(args) -> None:
+    import httpx
+    from app.main import app
+    from app.core.security import password_hasher
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+            paths = ["/health", "/products/categories/", "/products/?limit=20"]
+
+            print(f"bcrypt rounds {args.rounds}, {password_hasher.workers} hashing threads, "
+                  f"{password_hasher.max_pending} pending allowed")
+            print("Other endpoints with no logins in flight:")
+            for path in paths:
+                stop, latencies = asyncio.Event(), []
+                task = asyncio.create_task(probe(client, path, stop, latencies))
+                await asyncio.sleep(args.probe_seconds)
+                stop.set()
+                await task
+                print(f"  {path:<24} {summary(latencies)}")
+
+            print(f"During {args.logins} logins, {args.concurrency} at a time:")
+            stop = asyncio.Event()
+            probes = {path: [] for path in paths}
+            tasks = [asyncio.create_task(probe(client, path, stop, probes[path])) for path in paths]
+            result = await login_burst(client, args.logins, args.concurrency)
+            stop.set()
+            await asyncio.gather(*tasks)
+            for path in paths:
+                print(f"  {path:<24} {summary(probes[path])}")
+            print(
+                f"  logins: {result['ok']} ok, {result['busy']} turned away with 503, {result['other']} other "
+                f"in {result['seconds']:.2f}s ({result['ok'] / result['seconds']:.1f} logins/s)"
+            )
+    finally:
+        await app.router.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login throughput and other endpoints' latency during a login burst")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--probe-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    # Read by the settings when the app is imported
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
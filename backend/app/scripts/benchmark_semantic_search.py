@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.config import settings
+from app.core.database import Base
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.models.product import Product
+from app.services.catalog_events import load_indexes
+from app.services.product_search import ProductSearchService
+from app.services.semantic_index import semantic_index
+from app.scripts.seed_database import PRODUCT_DATA, create_sample_products
+
+# Phrased the way shoppers type rather than the way titles are written
+NATURAL_QUERIES = [
+    "wireless sony headphones", "lightweight running gear", "something for the kitchen",
+    "portable speaker for the beach", "yoga and fitness", "gaming setup",
+    "durable hiking equipment", "skincare for daily use", "energy efficient appliance",
+    "children's reading", "professional camera", "i need a birthday gift"
+]
+
+def sample_queries(rng: random.Random, count: int):
+    """Two-word queries mixing item, brand and feature vocabulary"""
+    words = set()
+    for data in PRODUCT_DATA.values():
+        for phrase in data["items"] + data["brands"]:
+            words.update(phrase.lower().split())
+    words.update(["lightweight", "portable", "durable", "modern", "innovative", "efficient"])
+    words = sorted(words)
+    return [" ".join(rng.sample(words, 2)) for _ in range(count)]
+
+def timed(function, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(function(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+def report(name: str, latencies, extra: str = ""):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<32} mean {statistics.mean(latencies):7.3f} ms   "
+          f"p50 {statistics.median(latencies):7.3f} ms   p95 {p95:7.3f} ms   {extra}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure semantic index build time, ANN recall and search latency")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nprobe", type=int, default=semantic_index.NPROBE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    settings.semantic_search_enabled = True
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    print(f"Seeding {args.products} products...")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_sample_products(db, args.products)
+
+    started = time.perf_counter()
+    load_indexes(db)
+    print(f"All catalog indexes built in {time.perf_counter() - started:.2f} s")
+    started = time.perf_counter()
+    semantic_index.rebuild(
+        {column.key: getattr(found, column.key) for column in Product.__mapper__.column_attrs}
+        for found in db.query(Product).filter(Product.is_active == True)
+    )
+    print(f"Semantic index alone built in {time.perf_counter() - started:.2f} s "
+          f"({len(semantic_index._centroids)} lists, {semantic_index._components.shape[1]} dimensions)\n")
+
+    queries = sample_queries(rng, args.queries)
+    approximate, ann_latencies = timed(lambda query: semantic_index.search(query, 10, nprobe=args.nprobe), queries)
+    exact, exact_latencies = timed(lambda query: semantic_index.exact_search(query, 10), queries)
+
+    recalls = []
+    for found, expected in zip(approximate, exact):
+        if expected:
+            expected_ids = {product_id for product_id, _ in expected}
+            recalls.append(len(expected_ids & {product_id for product_id, _ in found}) / len(expected_ids))
+    report(f"ivf search (nprobe={args.nprobe})", ann_latencies, f"recall@10 {statistics.mean(recalls):.1%}")
+    report("exact search", exact_latencies)
+
+    service = ProductSearchService(db)
+    print("\nNatural-language queries, products returned in a page of 10:")
+    for backend in ("ilike", "memory"):
+        settings.search_backend = backend
+        for enabled in (False, True):
+            settings.semantic_search_enabled = enabled
+            pages, latencies = timed(lambda query: service.search_products(query=query, limit=10), NATURAL_QUERIES)
+            found = sum(len(page) for page in pages)
+            report(f"{backend}{' + semantic' if enabled else ''}", latencies, f"{found} products")
+
+    latencies = []
+    for index in range(100):
+        started = time.perf_counter()
+        db.add(Product(
+            title=f"Compact Sony Bluetooth Speaker {index}",
+            description="Portable speaker from Sony. Features lightweight design.",
+            price=49.99,
+            category="Electronics",
+            brand="Sony",
+            rating=4.5,
+            is_active=True
+        ))
+        db.commit()
+        latencies.append((time.perf_counter() - started) * 1000)
+    report("insert + commit + index update", latencies)
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import time
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.services.related_products import related_products
+
+def main():
+    parser = argparse.ArgumentParser(description="Count cart co-occurrences and save them for the API to load at startup")
+    parser.add_argument("--output", default=settings.related_products_path)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        related_products.build(db)
+        built = time.perf_counter() - started
+    finally:
+        db.close()
+
+    related_products.save(args.output)
+    stats = related_products.stats()
+    print(f"Counted {stats['pairs']} co-occurring pairs over {stats['products']} products in {built:.2f}s")
+    print(f"Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import time
+from sqlalchemy import bindparam
+from app.core.database import SessionLocal
+from app.models import cart, chat, product, user  # noqa: F401 - register all mappers
+from app.models.chat import ChatMessage
+from app.services.message_metadata import compact_stored
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite bot message metadata from full product cards to product references")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=int, default=0, help="sleep between chunks to leave room for live traffic")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    table = ChatMessage.__table__
+    update = table.update().where(table.c.id == bindparam("message_id")).values(message_metadata=bindparam("metadata"))
+    db = SessionLocal()
+    after_id = 0
+    scanned = rewritten = bytes_before = bytes_after = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            # Keyset chunks, each its own short transaction, so the table is never locked for long
+            rows = db.query(ChatMessage.id, ChatMessage.message_metadata)\
+                .filter(ChatMessage.id > after_id, ChatMessage.message_metadata.isnot(None))\
+                .order_by(ChatMessage.id)\
+                .limit(args.chunk_size)\
+                .all()
+            if not rows:
+                break
+            after_id = rows[-1].id
+            scanned += len(rows)
+            changes = []
+            for row in rows:
+                compacted = compact_stored(row.message_metadata)
+                if compacted is not None:
+                    changes.append({"message_id": row.id, "metadata": compacted})
+                    bytes_before += len(row.message_metadata)
+                    bytes_after += len(compacted)
+            if changes and not args.dry_run:
+                db.execute(update, changes)
+            db.commit()
+            rewritten += len(changes)
+            print(f"  up to message {after_id}: {rewritten} of {scanned} rewritten")
+            if args.pause_ms:
+                time.sleep(args.pause_ms / 1000)
+    finally:
+        db.close()
+
+    action = "Would rewrite" if args.dry_run else "Rewrote"
+    print(
+        f"{action} {rewritten} of {scanned} messages with metadata in {time.perf_counter() - started:.2f}s: "
+        f"{bytes_before / 1024:.1f} KiB -> {bytes_after / 1024:.1f} KiB"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import random
+from collections import Counter
+from typing import List, Tuple
+from app.core.config import settings
+from app.services.intent_classifier import IntentClassifier
+from app.scripts.seed_database import PRODUCT_DATA
+
+ADJECTIVES = ["cheap", "good", "new", "best", "premium", "black", "red", "small", "large", "wireless", "durable", "comfortable"]
+PEOPLE = ["mom", "dad", "wife", "husband", "son", "daughter", "friend", "boss", "kids", "grandma"]
+PREFIXES = ["", "", "", "please ", "can you ", "could you ", "hey, ", "ok ", "umm "]
+
+TEMPLATES = {
+    'greeting': [
+        "hi", "hello", "hey", "hey there", "hello there", "hi!", "good morning", "good afternoon",
+        "good evening", "how are you", "how are you doing today", "what's up", "yo", "greetings",
+        "hiya", "hi, how's it going", "morning!", "hello, anyone there?"
+    ],
+    'product_search': [
+        "{item}", "{brand} {item}", "show me {item}s", "show me {brand} {item}s", "find {item}s",
+        "find me a {adjective} {item}", "i need a new {item}", "i want a {brand} {item}",
+        "looking for a {adjective} {item}", "do you have {brand} {item}s", "search for {item}",
+        "any {item}s?", "i'm looking for {item}s from {brand}", "{adjective} {item}",
+        "a {item} for my {person}", "gift for my {person}", "something for my {person}",
+        "recommend a {item}", "browse {category}", "show me {category}", "{category} products",
+        "what {item}s do you have", "best rated {item}", "popular products", "what's popular?",
+        "what's on sale?", "i need a birthday gift", "find a gift", "top {category} items",
+        "compare {brand} and {other_brand} {item}s", "is the {brand} {item} in stock"
+    ],
+    'recommendation': [
+        "what goes well with the {brand} {item}", "what goes with my {item}", "what pairs with a {item}",
+        "frequently bought together with the {item}", "recommendations", "any recommendations?",
+        "recommend something for my cart", "suggest something to go with my {item}", "what else should i buy",
+        "what else should i get with a {item}", "customers who bought the {item} also bought",
+        "products similar to the {brand} {item}", "related products", "related to my {item}",
+        "what do people buy with a {item}", "items often added together with {item}s"
+    ],
+    'category_browse': [
+        "show me categories", "what categories do you have", "list the categories", "browse categories",
+        "what kinds of products do you sell", "what types of products are there", "what do you have",
+        "list your departments", "which categories are available", "what do you sell",
+        "show all product types", "what sections does the store have", "{category} category",
+        "what kinds of {category} are there", "categories please"
+    ],
+    'price_inquiry': [
+        "how much is the {brand} {item}", "what's the price of the {item}", "how much does a {item} cost",
+        "{item}s under ${amount}", "{brand} {item} under ${amount}", "under ${amount}", "below ${amount}",
+        "products under ${amount}", "my budget is ${amount}", "anything cheap?", "is the {item} expensive",
+        "{item} between ${amount} and ${high_amount}", "cheapest {item}", "price of {brand} {item}",
+        "what's your cheapest {item}", "show me {item}s less than ${amount}", "something within ${amount}",
+        "how expensive are {item}s", "i can spend about ${amount}", "cost of a {item}"
+    ],
+    'help': [
+        "help", "help me", "i need help", "what can you do", "how does this work", "can you assist me",
+        "i need support", "how do i use this", "what are your features", "guide me", "i'm confused",
+        "what should i ask you", "how can you help me", "support please", "instructions"
+    ],
+    'goodbye': [
+        "bye", "goodbye", "see you", "see you later", "thanks, bye", "thank you, bye", "that's all",
+        "quit", "exit", "later!", "have a nice day", "thanks for your help, goodbye", "bye bye",
+        "talk to you later", "i'm done, thanks"
+    ],
+    'out_of_scope': [
+        "do you ship to {place}?", "where is my order #{number}", "how do i return an item",
+        "what is your refund policy", "track my package", "what's the weather like", "tell me a joke",
+        "who are you", "what time do you close", "can i change my shipping address",
+        "i want to cancel my order", "how long does delivery take", "do you have a store in {place}",
+        "what payment methods do you accept", "my order arrived damaged", "can i talk to a human",
+        "what is the meaning of life", "are you a robot", "how do i reset my password",
+        "why was my card declined", "do you offer gift wrapping"
+    ]
+}
+PLACES = ["canada", "london", "new york", "germany", "my city", "australia", "paris"]
+
+def training_corpus(rng: random.Random, per_intent: int) -> List[Tuple[str, str]]:
+    """Labelled messages filled in from the templates with seed catalog vocabulary"""
+    items = [item for data in PRODUCT_DATA.values() for item in data["items"]]
+    brands = sorted({brand for data in PRODUCT_DATA.values() for brand in data["brands"]})
+    categories = list(PRODUCT_DATA)
+    corpus = []
+    for intent, templates in TEMPLATES.items():
+        for _ in range(per_intent):
+            amount = rng.choice([20, 25, 50, 75, 100, 150, 200, 300, 500, 800, 1000])
+            message = rng.choice(templates).format(
+                item=rng.choice(items).lower(),
+                brand=rng.choice(brands).lower(),
+                other_brand=rng.choice(brands).lower(),
+                category=rng.choice(categories).lower(),
+                adjective=rng.choice(ADJECTIVES),
+                person=rng.choice(PEOPLE),
+                place=rng.choice(PLACES),
+                number=rng.randint(100, 99999),
+                amount=amount,
+                high_amount=amount * 2
+            )
+            corpus.append((rng.choice(PREFIXES) + message, intent))
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the naive Bayes intent classifier and save its weights")
+    parser.add_argument("--output", default=settings.intent_model_path)
+    parser.add_argument("--per-intent", type=int, default=2000)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = training_corpus(rng, args.per_intent)
+    rng.shuffle(corpus)
+    split = len(corpus) * 9 // 10
+    train, held_out = corpus[:split], corpus[split:]
+
+    classifier = IntentClassifier.fit([m for m, _ in train], [label for _, label in train], args.alpha)
+    predictions = classifier.predict([message for message, _ in held_out])
+    correct = sum(predicted == label for (predicted, _), (_, label) in zip(predictions, held_out))
+    print(f"Trained on {len(train)} messages: {dict(Counter(label for _, label in train))}")
+    print(f"Held-out accuracy: {correct / len(held_out):.3f} on {len(held_out)} messages")
+
+    # The saved model is trained on everything
+    classifier = IntentClassifier.fit([m for m, _ in corpus], [label for _, label in corpus], args.alpha)
+    classifier.save(args.output)
+    print(f"Saved weights to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..models.product import Product
+
+# In-memory catalog indexes that are built at startup and kept in sync on writes
+_indexes = []
+
+_PENDING_KEY = "catalog_changes"
+
+# Writes committed while load_indexes runs, replayed once the indexes are rebuilt
+_load_lock = threading.Lock()
+_changes_during_load: Optional[List[Tuple[List[Dict[str, Any]], List[int]]]] = None
+
+# Incremented on every committed product insert, update or delete
+_version_lock = threading.Lock()
+_version = 0
+_changed_at = datetime.now(timezone.utc)
+
+def catalog_version() -> int:
+    """Current catalog version; any change to it invalidates derived caches"""
+    return _version
+
+def catalog_changed_at() -> datetime:
+    """When this process last saw the catalog change"""
+    return _changed_at
+
+def _bump_version() -> None:
+    global _version, _changed_at
+    with _version_lock:
+        _version += 1
+        _changed_at = datetime.now(timezone.utc)
+
+def product_record(product: Product) -> Dict[str, Any]:
+    """Snapshot the product fields used by the in-memory indexes"""
+    return {
+        "id": product.id,
+        "title": product.title,
+        "description": product.description,
+        "category": product.category,
+        "brand": product.brand,
+        "price": product.price,
+        "rating": product.rating,
+        "is_active": product.is_active,
+        "created_at": product.created_at,
+        "updated_at": product.updated_at
+    }
+
+def register_index(index):
+    """Register an index exposing rebuild(records) and apply(upserts, deleted_ids)"""
+    _indexes.append(index)
+    return index
+
+def indexes_loading() -> bool:
+    """Whether load_indexes is still building the indexes"""
+    return _changes_during_load is not None
+
+def load_indexes(db: Session) -> None:
+    """Build every registered index from the active catalog
+
+    Safe to run while the app serves writes: changes committed during the
+    build are applied again once it is done, in commit order, since the
+    catalog may have been read before they landed.
+    """
+    global _changes_during_load
+    with _load_lock:
+        _changes_during_load = []
+    try:
+        products = db.query(Product).filter(Product.is_active == True).yield_per(1000)
+        records = [product_record(product) for product in products]
+        for index in _indexes:
+            index.rebuild(records)
+    finally:
+        while True:
+            with _load_lock:
+                changes = _changes_during_load
+                _changes_during_load = [] if changes else None
+            if not changes:
+                break
+            for upserts, deleted_ids in changes:
+                for index in _indexes:
+                    index.apply(upserts, deleted_ids)
+    _bump_version()
+
+@event.listens_for(Session, "after_flush")
+def _collect_product_changes(session, flush_context):
+    """Remember products written in this transaction until it commits"""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, Product):
+            pending[obj.id] = product_record(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            pending[obj.id] = product_record(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            pending[obj.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _publish_product_changes(session):
+    """Push committed product writes to the registered indexes"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    upserts: List[Dict[str, Any]] = []
+    deleted_ids: List[int] = []
+    for product_id, record in pending.items():
+        if record is None or not record["is_active"]:
+            deleted_ids.append(product_id)
+        else:
+            upserts.append(record)
+
+    with _load_lock:
+        if _changes_during_load is not None:
+            _changes_during_load.append((upserts, deleted_ids))
+    for index in _indexes:
+        index.apply(upserts, deleted_ids)
+    _bump_version()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_product_changes(session):
+    session.info.pop(_PENDING_KEY, None)
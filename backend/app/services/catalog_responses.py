@@ -0,0 +1,56 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from ..core.cache import LRUCache
+from ..core.config import settings
+from ..core.http_cache import RenderedResponse
+from .catalog_events import catalog_version, register_index
+
+class CatalogResponseCache:
+    """Rendered catalog read responses, dropped as soon as the products behind them change
+
+    Product pages are keyed by id and evicted one by one; the category and
+    brand lists are evicted on any catalog write. The TTL bounds how long a
+    page can survive writes made by other processes.
+    """
+
+    LIST_KEYS = ("categories", "brands")
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.ready = True
+        self._cache = LRUCache(max_size, ttl_seconds)
+
+    def rebuild(self, records) -> None:
+        """Forget every rendered response"""
+        self._cache.clear()
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Evict responses for committed product writes"""
+        for product_id in deleted_ids:
+            self._cache.pop(("product", product_id))
+        for record in upserts:
+            self._cache.pop(("product", record["id"]))
+        for key in self.LIST_KEYS:
+            self._cache.pop(key)
+
+    async def get_or_render_async(
+        self,
+        key: Hashable,
+        render: Callable[[], Awaitable[Optional[RenderedResponse]]]
+    ) -> Optional[RenderedResponse]:
+        """Return the cached response for key, awaiting render and storing its result on a miss"""
+        rendered = self._cache.get(key)
+        if rendered is not None:
+            return rendered
+        version = catalog_version()
+        rendered = await render()
+        # A write that committed while rendering may already be in the body or not; don't keep it
+        if rendered is not None and catalog_version() == version:
+            self._cache.put(key, rendered)
+        return rendered
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return self._cache.stats()
+
+catalog_responses = register_index(CatalogResponseCache(
+    settings.catalog_response_cache_size,
+    settings.catalog_response_cache_ttl_seconds
+))
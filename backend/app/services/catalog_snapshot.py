@@ -0,0 +1,184 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.product import Product
+from .catalog_events import product_record, register_index
+
+def _timestamp(value: Optional[datetime]) -> float:
+    return value.timestamp() if value else 0.0
+
+class _Codes:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.codes: Dict[Optional[str], int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, needle: str) -> np.ndarray:
+        """Codes of every value containing needle, case-insensitively"""
+        needle = needle.lower()
+        return np.array(
+            [code for code, value in enumerate(self.values) if value and needle in value.lower()],
+            dtype=np.int32
+        )
+
+class CatalogSnapshot:
+    """Column arrays of the active catalog for vectorized filtering and sorting"""
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._clear(0)
+
+    def _clear(self, capacity: int) -> None:
+        capacity = max(capacity, 1024)
+        self._size = 0
+        self._rows: Dict[int, int] = {}
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._price = np.zeros(capacity, dtype=np.float64)
+        self._rating = np.zeros(capacity, dtype=np.float64)
+        self._category = np.zeros(capacity, dtype=np.int32)
+        self._brand = np.zeros(capacity, dtype=np.int32)
+        self._created_at = np.zeros(capacity, dtype=np.float64)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._categories = _Codes()
+        self._brands = _Codes()
+        self._high_water: Optional[datetime] = None
+        self._max_id = 0
+        self._refreshed_at = time.monotonic()
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        for name in ("_ids", "_price", "_rating", "_category", "_brand", "_created_at", "_live"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the snapshot with the given product records"""
+        if not settings.catalog_snapshot_enabled:
+            return
+        records = list(records)
+        with self._lock:
+            self._clear(len(records) * 2)
+            for record in records:
+                self._upsert(record)
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        if not self.ready:
+            return
+        with self._lock:
+            for product_id in deleted_ids:
+                self._delete(product_id)
+            for record in upserts:
+                self._upsert(record)
+
+    def _upsert(self, record: Dict[str, Any]) -> None:
+        row = self._rows.get(record["id"])
+        if row is None:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._rows[record["id"]] = self._size
+            self._size += 1
+        self._ids[row] = record["id"]
+        self._price[row] = record["price"]
+        self._rating[row] = record["rating"] or 0.0
+        self._category[row] = self._categories.encode(record["category"])
+        self._brand[row] = self._brands.encode(record["brand"])
+        self._created_at[row] = _timestamp(record["created_at"])
+        self._live[row] = True
+
+        self._max_id = max(self._max_id, record["id"])
+        for changed in (record["created_at"], record["updated_at"]):
+            if changed and (self._high_water is None or changed > self._high_water):
+                self._high_water = changed
+
+    def _delete(self, product_id: int) -> None:
+        row = self._rows.get(product_id)
+        if row is not None:
+            self._live[row] = False
+
+    def refresh(self, db: Session) -> int:
+        """Pull products inserted or updated since the last refresh, e.g. by other processes"""
+        with self._lock:
+            changed = Product.id > self._max_id
+            if self._high_water is not None:
+                # One second of overlap covers timestamps stored without sub-second precision
+                changed = or_(changed, Product.updated_at > self._high_water - timedelta(seconds=1))
+            products = db.query(Product).filter(changed).all()
+            for product in products:
+                if product.is_active:
+                    self._upsert(product_record(product))
+                else:
+                    self._delete(product.id)
+            self._refreshed_at = time.monotonic()
+            return len(products)
+
+    def refresh_if_stale(self, db: Session, max_age_seconds: float) -> None:
+        if time.monotonic() - self._refreshed_at >= max_age_seconds:
+            self.refresh(db)
+
+    def search(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brand: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+        after: Optional[Tuple[float, float, int]] = None
+    ) -> List[int]:
+        """Ids of matching products ordered by rating, newest and id, all descending"""
+        with self._lock:
+            size = self._size
+            mask = self._live[:size].copy()
+            if category:
+                mask &= np.isin(self._category[:size], self._categories.matching(category))
+            if brand:
+                mask &= np.isin(self._brand[:size], self._brands.matching(brand))
+            if min_price is not None:
+                mask &= self._price[:size] >= min_price
+            if max_price is not None:
+                mask &= self._price[:size] <= max_price
+
+            rating = self._rating[:size]
+            created_at = self._created_at[:size]
+            ids = self._ids[:size]
+            if after is not None:
+                after_rating, after_created_at, after_id = after
+                mask &= (rating < after_rating) | (
+                    (rating == after_rating) & (
+                        (created_at < after_created_at) |
+                        ((created_at == after_created_at) & (ids < after_id))
+                    )
+                )
+
+            rows = np.flatnonzero(mask)
+            wanted = offset + limit
+            if wanted <= 0 or not len(rows):
+                return []
+
+            # Partition on rating to keep only rows that can reach the page, then sort those
+            if len(rows) > wanted:
+                ratings = rating[rows]
+                threshold = ratings[np.argpartition(-ratings, wanted - 1)[wanted - 1]]
+                rows = rows[ratings >= threshold]
+            order = np.lexsort((-ids[rows], -created_at[rows], -rating[rows]))
+            return ids[rows[order[offset:wanted]]].tolist()
+
+catalog_snapshot = register_index(CatalogSnapshot())
@@ -0,0 +1,253 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..core.cache import LRUCache
+from ..core.config import settings
+from ..models.chat import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = ("id", "user_id", "session_name", "is_active", "created_at", "updated_at")
+MESSAGE_COLUMNS = ("id", "session_id", "content", "is_bot", "timestamp", "message_metadata")
+
+def _sync_directory(directory: str) -> None:
+    # A new file's directory entry needs its own fsync to survive a crash
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+class _UserIndex:
+    """A user's index file parsed up to offset: the last entry per session, None once restored"""
+
+    __slots__ = ("inode", "offset", "sessions")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.offset = 0
+        self.sessions: Dict[int, Optional[Dict[str, Any]]] = {}
+
+class ChatArchive:
+    """Cold storage for idle chat sessions
+
+    Each session is written with its messages as one JSON line, compressed
+    as its own gzip member and appended to the current segment file. A line
+    per session in its user's index file gives the member's offset and
+    length, so restoring a session reads and decompresses only that member.
+    Restoring inserts the session back into the hot tables under its old ids
+    and appends a line marking it restored; the last index line for a
+    session wins.
+
+    Parsed index files are cached per user. A lookup stats the file and
+    parses only lines appended since it was last read, whether by this
+    process or by an archive run elsewhere.
+    """
+
+    # Users whose parsed index files are kept in memory
+    INDEX_CACHE_SIZE = 4096
+
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._indexes = LRUCache(self.INDEX_CACHE_SIZE, float("inf"))
+        self._index_lock = threading.Lock()
+        self.archived_sessions = 0
+        self.restored_sessions = 0
+
+    def archive(self, db: Session, before: datetime, batch_size: int = 500) -> Dict[str, int]:
+        """Move sessions with no activity since `before` out of the hot tables"""
+        totals = {"sessions": 0, "messages": 0, "bytes": 0}
+        # Databases without sequences (SQLite) hand out max(id) + 1, so the newest rows stay hot to
+        # keep archived ids from being reused before they are restored
+        newest_session = db.query(func.max(ChatSession.id)).scalar()
+        newest_message = db.query(func.max(ChatMessage.id)).scalar()
+        if not newest_session or not newest_message:
+            return totals
+        last_activity = func.coalesce(func.max(ChatMessage.timestamp), ChatSession.created_at)
+        idle = db.query(ChatSession.id)\
+            .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)\
+            .filter(ChatSession.id < newest_session)\
+            .group_by(ChatSession.id, ChatSession.created_at)\
+            .having(last_activity < before)\
+            .having(func.coalesce(func.max(ChatMessage.id), 0) < newest_message)
+
+        after_id = 0
+        while True:
+            session_ids = [
+                session_id for session_id, in
+                idle.filter(ChatSession.id > after_id).order_by(ChatSession.id).limit(batch_size)
+            ]
+            if not session_ids:
+                break
+            after_id = session_ids[-1]
+            archived = self._archive_sessions(db, session_ids)
+            for key, value in archived.items():
+                totals[key] += value
+        return totals
+
+    def _archive_sessions(self, db: Session, session_ids: List[int]) -> Dict[str, int]:
+        sessions = db.query(ChatSession.__table__).filter(ChatSession.id.in_(session_ids)).all()
+        messages = defaultdict(list)
+        for row in db.query(ChatMessage.__table__)\
+                .filter(ChatMessage.session_id.in_(session_ids))\
+                .order_by(ChatMessage.session_id, ChatMessage.timestamp, ChatMessage.id):
+            messages[row.session_id].append(self._row(row, MESSAGE_COLUMNS))
+        by_user = defaultdict(list)
+        for session in sessions:
+            by_user[session.user_id].append({
+                "session": self._row(session, SESSION_COLUMNS),
+                "messages": messages[session.id]
+            })
+
+        # Segment data reaches disk before the index points at it, and both before the rows are deleted
+        index_directory = os.path.join(self.directory, "index")
+        os.makedirs(index_directory, exist_ok=True)
+        segment = self._current_segment()
+        new_segment = not os.path.exists(os.path.join(self.directory, segment))
+        entries = defaultdict(list)
+        written = 0
+        with open(os.path.join(self.directory, segment), "ab") as segment_file:
+            for user_id, records in by_user.items():
+                for record in records:
+                    member = gzip.compress((json.dumps(record) + "\n").encode())
+                    offset = segment_file.tell()
+                    segment_file.write(member)
+                    written += len(member)
+                    entries[user_id].append({
+                        "session_id": record["session"]["id"],
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(member),
+                        "messages": len(record["messages"])
+                    })
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        if new_segment:
+            _sync_directory(self.directory)
+        new_indexes = False
+        for user_id, user_entries in entries.items():
+            path = self._index_path(user_id)
+            new_indexes = new_indexes or not os.path.exists(path)
+            with open(path, "a", encoding="utf-8") as index_file:
+                index_file.write("".join(json.dumps(entry) + "\n" for entry in user_entries))
+                index_file.flush()
+                os.fsync(index_file.fileno())
+        if new_indexes:
+            _sync_directory(index_directory)
+
+        db.query(ChatMessage).filter(ChatMessage.session_id.in_(session_ids)).delete(synchronize_session=False)
+        db.query(ChatSession).filter(ChatSession.id.in_(session_ids)).delete(synchronize_session=False)
+        db.commit()
+        self.archived_sessions += len(sessions)
+        return {
+            "sessions": len(sessions),
+            "messages": sum(len(session_messages) for session_messages in messages.values()),
+            "bytes": written
+        }
+
+    def find(self, user_id: int, session_id: int) -> Optional[Dict[str, Any]]:
+        """Index entry of an archived session of the user, or None"""
+        path = self._index_path(user_id)
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            self._indexes.pop(user_id)
+            return None
+        with self._index_lock:
+            index = self._indexes.get(user_id)
+            if index is None or index.inode != status.st_ino or index.offset > status.st_size:
+                index = _UserIndex(status.st_ino)
+            if index.offset < status.st_size:
+                with open(path, "rb") as index_file:
+                    index_file.seek(index.offset)
+                    appended = index_file.read(status.st_size - index.offset)
+                # A last line without its newline is still being appended; it is read next time
+                complete = appended[:appended.rfind(b"\n") + 1]
+                for line in complete.splitlines():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    index.sessions[entry["session_id"]] = None if entry.get("restored") else entry
+                index.offset += len(complete)
+            self._indexes.put(user_id, index)
+            return index.sessions.get(session_id)
+
+    def load(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The archived session and messages an index entry points at"""
+        # Archives written before sessions got members of their own share one per user and batch
+        with open(os.path.join(self.directory, entry["segment"]), "rb") as segment_file:
+            segment_file.seek(entry["offset"])
+            member = segment_file.read(entry["length"])
+        for line in gzip.decompress(member).decode().splitlines():
+            record = json.loads(line)
+            if record["session"]["id"] == entry["session_id"]:
+                return record
+        return None
+
+    def restore(self, db: Session, user_id: int, session_id: int) -> bool:
+        """Move an archived session of the user back into the hot tables; False if there is none"""
+        entry = self.find(user_id, session_id)
+        record = self.load(entry) if entry else None
+        if record is None:
+            return False
+        try:
+            db.execute(ChatSession.__table__.insert(), [self._parse(record["session"], ("created_at", "updated_at"))])
+            if record["messages"]:
+                db.execute(
+                    ChatMessage.__table__.insert(),
+                    [self._parse(message, ("timestamp",)) for message in record["messages"]]
+                )
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Restored by a concurrent request for the same session, which also marks it in the index
+            if db.query(ChatSession.id).filter(ChatSession.id == session_id, ChatSession.user_id == user_id).first():
+                return True
+            logger.error("Could not restore archived chat session %d: its id is in use", session_id)
+            return False
+        with open(self._index_path(user_id), "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps({"session_id": session_id, "restored": True}) + "\n")
+        self.restored_sessions += 1
+        return True
+
+    def _current_segment(self) -> str:
+        segments = sorted(name for name in os.listdir(self.directory) if name.endswith(".jsonl.gz"))
+        if segments and os.path.getsize(os.path.join(self.directory, segments[-1])) < self.segment_bytes:
+            return segments[-1]
+        return f"segment-{len(segments) + 1:06d}.jsonl.gz"
+
+    def _index_path(self, user_id: int) -> str:
+        return os.path.join(self.directory, "index", f"{user_id}.jsonl")
+
+    def _row(self, row: Any, columns: tuple) -> Dict[str, Any]:
+        values = {column: getattr(row, column) for column in columns}
+        return {
+            column: value.isoformat() if isinstance(value, datetime) else value
+            for column, value in values.items()
+        }
+
+    def _parse(self, row: Dict[str, Any], datetime_columns: tuple) -> Dict[str, Any]:
+        return dict(row, **{
+            column: datetime.fromisoformat(row[column]) if row[column] else None
+            for column in datetime_columns
+        })
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "archived_sessions": self.archived_sessions,
+            "restored_sessions": self.restored_sessions
+        }
+
+chat_archive = ChatArchive(settings.chat_archive_dir, settings.chat_archive_segment_mb * 1024 * 1024)
@@ -0,0 +1,132 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import String, and_, func, or_, select, type_coerce
+from sqlalchemy.orm import Session
+from ..models.chat import ChatMessage, ChatSession
+from .message_metadata import hydrate_metadata
+from .pagination import decode_cursor, encode_cursor
+
+# Characters of the last message shown in session listings
+PREVIEW_LENGTH = 120
+
+class ChatHistoryService:
+    """Cursor-paginated chat sessions and messages
+
+    Session pages are keyed on the session id, newest first, and carry
+    each session's message count and last message from one windowed query
+    over the page's messages. Message pages are keyed on (timestamp, id),
+    newest first, and read the (session_id, timestamp) index.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def list_sessions(
+        self,
+        user_id: int,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        session_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of the user's session summaries and the cursor for the next one"""
+        sessions = select(ChatSession).where(ChatSession.user_id == user_id)
+        if session_id is not None:
+            sessions = sessions.where(ChatSession.id == session_id)
+        if cursor:
+            sessions = sessions.where(ChatSession.id < int(self._position(cursor)[0]))
+        page = sessions.order_by(ChatSession.id.desc()).limit(limit).subquery()
+
+        ranked = select(
+            ChatMessage.session_id,
+            ChatMessage.content,
+            ChatMessage.is_bot,
+            ChatMessage.timestamp,
+            func.row_number().over(
+                partition_by=ChatMessage.session_id,
+                order_by=(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+            ).label("position"),
+            func.count().over(partition_by=ChatMessage.session_id).label("message_count")
+        ).where(ChatMessage.session_id.in_(select(page.c.id))).subquery()
+
+        rows = self.db.execute(
+            select(page, ranked.c.content, ranked.c.is_bot, ranked.c.timestamp, ranked.c.message_count)
+            .outerjoin(ranked, and_(ranked.c.session_id == page.c.id, ranked.c.position == 1))
+            .order_by(page.c.id.desc())
+        ).mappings().all()
+
+        summaries = [
+            {
+                "id": row["id"],
+                "session_name": row["session_name"],
+                "is_active": row["is_active"],
+                "created_at": row["created_at"],
+                "message_count": row["message_count"] or 0,
+                "last_message": row["content"][:PREVIEW_LENGTH] if row["content"] is not None else None,
+                "last_message_is_bot": row["is_bot"],
+                "last_message_at": row["timestamp"]
+            }
+            for row in rows
+        ]
+        next_cursor = None
+        if len(summaries) == limit:
+            next_cursor = encode_cursor({"k": [summaries[-1]["id"]]})
+        return summaries, next_cursor
+
+    def get_session(self, user_id: int, session_id: int) -> Optional[Dict[str, Any]]:
+        """Summary of one of the user's sessions, or None if it isn't theirs"""
+        summaries, _ = self.list_sessions(user_id, limit=1, session_id=session_id)
+        return summaries[0] if summaries else None
+
+    def list_messages(
+        self,
+        session_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of the session's messages, newest first, and the cursor for older ones"""
+        timestamp = self._timestamp_column()
+        query = self.db.query(ChatMessage, timestamp.label("sort_timestamp"))\
+            .filter(ChatMessage.session_id == session_id)
+        if cursor:
+            after_timestamp, after_id = self._position(cursor)
+            if not isinstance(timestamp.type, String):
+                after_timestamp = datetime.fromisoformat(after_timestamp)
+            query = query.filter(or_(
+                timestamp < after_timestamp,
+                and_(timestamp == after_timestamp, ChatMessage.id < int(after_id))
+            ))
+        rows = query.order_by(timestamp.desc(), ChatMessage.id.desc()).limit(limit).all()
+
+        next_cursor = None
+        if rows and len(rows) == limit:
+            last, last_timestamp = rows[-1]
+            if isinstance(last_timestamp, datetime):
+                last_timestamp = last_timestamp.isoformat()
+            next_cursor = encode_cursor({"k": [last_timestamp, last.id]})
+        messages = [message for message, _ in rows]
+        # Product references of the whole page are filled in by one query
+        metadata = hydrate_metadata(self.db, [message.message_metadata for message in messages])
+        return [
+            {
+                "id": message.id,
+                "session_id": message.session_id,
+                "content": message.content,
+                "is_bot": message.is_bot,
+                "timestamp": message.timestamp,
+                "metadata": message_metadata
+            }
+            for message, message_metadata in zip(messages, metadata)
+        ], next_cursor
+
+    def _timestamp_column(self):
+        # SQLite keeps timestamps as text, in the format of whichever statement wrote them; sorting,
+        # comparing and returning that text unchanged keeps cursors exact and the index usable
+        if self.db.bind.dialect.name == "sqlite":
+            return type_coerce(ChatMessage.timestamp, String)
+        return ChatMessage.timestamp
+
+    def _position(self, cursor: str) -> List[Any]:
+        position = decode_cursor(cursor).get("k")
+        if not isinstance(position, list) or not position:
+            raise ValueError("Invalid cursor")
+        return position
@@ -1,73 +1,104 @@
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from sqlalchemy.orm import Session
-from ..models.product import Product
+from ..core.config import settings
+from ..models.cart import CartItem
 from ..services.product_search import ProductSearchService
+from .conversation_state import ConversationState, conversation_states
+from .entity_extractor import entity_extractor
+from .intent_classifier import intent_classifier
+from .intent_engine import INTENT_PATTERNS, follow_up_engine, intent_engine
+from .related_products import related_products
+
+PRICE_PATTERN = re.compile(r'\$?(\d+)')
+
+# Recommendation phrasing, removed to leave the product the shopper is asking about
+RECOMMENDATION_PATTERN = re.compile("|".join(INTENT_PATTERNS['recommendation']), re.IGNORECASE)
+
+# Asking about "my cart" means recommending from the cart rather than a named product
+CART_PATTERN = re.compile(r'\b(?:in |for |with )?(?:my |the )?(?:cart|basket)\b', re.IGNORECASE)
+
+# Filters a conversation state remembers between messages
+SEARCH_FILTERS = ('query', 'category', 'brand', 'min_price', 'max_price')
 
 class ChatbotService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, memoize_searches: bool = False):
         self.db = db
         self.product_service = ProductSearchService(db)
-        self.intents = {
-            'greeting': [
-                r'\b(hi|hello|hey|good morning|good afternoon|good evening)\b',
-                r'\bhow are you\b',
-                r'\bwhat\'s up\b'
-            ],
-            'product_search': [
-                r'\b(find|search|look for|show me|i want|i need)\b.*\b(product|item|thing)\b',
-                r'\b(laptop|phone|shirt|book|electronics|clothing)\b',
-                r'\bprice\b.*\b(under|below|less than|cheaper)\b',
-                r'^\s*[a-zA-Z\s]+\s*$'  # Simple product name
-            ],
-            'category_browse': [
-                r'\b(browse|show|list|what)\b.*\b(categories|types|kinds)\b',
-                r'\bcategory\b',
-                r'\bwhat do you have\b'
-            ],
-            'price_inquiry': [
-                r'\b(price|cost|how much|expensive|cheap)\b',
-                r'\$\d+',
-                r'\bbudget\b'
-            ],
-            'help': [
-                r'\b(help|assist|support|guide)\b',
-                r'\bwhat can you do\b',
-                r'\bhow does this work\b'
-            ],
-            'goodbye': [
-                r'\b(bye|goodbye|see you|later|exit|quit)\b',
-                r'\bthank you\b.*\bbye\b'
-            ]
-        }
+        self.intents = INTENT_PATTERNS
+        # First result pages by search parameters, reused across sessions when serving a whole batch
+        self._searches: Optional[Dict[tuple, Tuple[List[Dict[str, Any]], Optional[str]]]] = {} if memoize_searches else None
 
-    def process_message(self, message: str, user_id: int) -> Dict[str, Any]:
+    def process_message(
+        self,
+        message: str,
+        user_id: int,
+        session_id: Optional[int] = None,
+        intent: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Process user message and return appropriate response"""
+        return dict(self.respond(message, user_id, session_id, intent))
+
+    def respond(
+        self,
+        message: str,
+        user_id: int,
+        session_id: Optional[int] = None,
+        intent: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Yield the response's message, products and suggestions, each as soon as it is known"""
         message_lower = message.lower().strip()
-        intent = self._detect_intent(message_lower)
+        if intent is None:
+            intent = self._detect_intent(message_lower)
+        state_key = conversation_states.key(user_id, session_id)
+        state = conversation_states.get(state_key)
+
+        # Follow-ups without an earlier search in the session are searched as typed
+        if intent == 'follow_up' and state is None:
+            intent = 'product_search'
         
+        # Handlers that search yield their text before serializing the products
         if intent == 'greeting':
-            return self._handle_greeting()
+            yield from self._handle_greeting().items()
+        elif intent == 'follow_up':
+            yield from self._handle_follow_up(message_lower, state_key, state)
+        elif intent == 'recommendation':
+            yield from self._handle_recommendation(message, user_id)
         elif intent == 'product_search':
-            return self._handle_product_search(message)
+            yield from self._handle_product_search(message, state_key)
         elif intent == 'category_browse':
-            return self._handle_category_browse()
+            yield from self._handle_category_browse().items()
         elif intent == 'price_inquiry':
-            return self._handle_price_inquiry(message)
+            yield from self._handle_price_inquiry(message, state_key, state)
         elif intent == 'help':
-            return self._handle_help()
+            yield from self._handle_help().items()
         elif intent == 'goodbye':
-            return self._handle_goodbye()
+            yield from self._handle_goodbye().items()
+        elif intent == 'out_of_scope':
+            yield from self._handle_default(message, state_key, search=False)
         else:
-            return self._handle_default(message)
+            yield from self._handle_default(message, state_key)
 
     def _detect_intent(self, message: str) -> str:
         """Detect user intent from message"""
-        for intent, patterns in self.intents.items():
-            for pattern in patterns:
-                if re.search(pattern, message, re.IGNORECASE):
-                    return intent
-        return 'default'
+        return self.detect_intents([message])[0]
+
+    def detect_intents(self, messages: List[str]) -> List[str]:
+        """Intents of lowercased messages, scoring them in one batch when a classifier is in use"""
+        mode = settings.intent_detection
+        if mode == 'regex' or not intent_classifier.ready:
+            return [intent_engine.detect(message) for message in messages]
+
+        # Follow-ups refer to the conversation rather than the message, so their patterns decide them
+        intents = [follow_up_engine.detect(message) for message in messages]
+        pending = [i for i, intent in enumerate(intents) if intent != 'follow_up']
+        predictions = intent_classifier.predict([messages[i] for i in pending])
+        for i, (label, confidence) in zip(pending, predictions):
+            if confidence >= settings.intent_min_confidence:
+                intents[i] = label
+            elif mode == 'hybrid':
+                intents[i] = intent_engine.detect(messages[i])
+        return intents
 
     def _handle_greeting(self) -> Dict[str, Any]:
         """Handle greeting messages"""
@@ -87,27 +118,54 @@ class ChatbotService:
             ]
         }
 
-    def _handle_product_search(self, message: str) -> Dict[str, Any]:
+    def _handle_product_search(self, message: str, state_key: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[str, Any]]:
         """Handle product search queries"""
         # Extract search terms and filters
         search_params = self._extract_search_params(message)
-        products = self.product_service.search_products(**search_params)
+        cards, cursor = self._prefetch(search_params)
         
-        if products:
-            product_list = [product.to_dict() for product in products[:6]]
-            response = f"I found {len(products)} products for you! Here are some great options:"
+        if cards:
+            response = f"I found {min(len(cards), search_params['limit'])} products for you! Here are some great options:"
             
             if search_params.get('category'):
                 response = f"Here are some {search_params['category']} products I found:"
         else:
-            product_list = []
             response = "I couldn't find any products matching your search. Try being more specific or browse our categories!"
             
-        return {
-            'message': response,
-            'products': product_list,
-            'suggestions': self._get_search_suggestions()
-        }
+        yield 'message', response
+        yield 'products', self._remember(state_key, search_params, cards, cursor, 6)
+        yield 'suggestions', self._get_search_suggestions()
+
+    def _handle_recommendation(self, message: str, user_id: int) -> Iterator[Tuple[str, Any]]:
+        """Recommend products often added together with the one named, or with the user's cart"""
+        params = entity_extractor.extract(CART_PATTERN.sub(" ", RECOMMENDATION_PATTERN.sub(" ", message)))
+        related: List[int] = []
+        response = None
+        if params['query'] or params.get('brand') or params.get('category'):
+            anchors = self.product_service.search_products(
+                query=params['query'],
+                category=params.get('category'),
+                brand=params.get('brand'),
+                limit=5
+            )
+            # The best match that has been in a cart with anything, as titles repeat across products
+            for anchor in anchors:
+                related = [other for other, _ in related_products.related(anchor.id, related_products.top_n)]
+                if related:
+                    response = f"Shoppers who added {anchor.title} to their cart also added:"
+                    break
+        else:
+            cart_ids = [product_id for product_id, in self.db.query(CartItem.product_id).filter(CartItem.user_id == user_id)]
+            related = [other for other, _ in related_products.related_to_many(cart_ids, related_products.top_n)]
+            response = "Based on your cart, shoppers also added:"
+
+        products = self.product_service.get_products_by_ids(related)[:6]
+        if not products:
+            products = self.product_service.get_popular_products(limit=6)
+            response = "I don't have recommendations for that yet, but these are popular right now:"
+        yield 'message', response
+        yield 'products', [product.to_dict() for product in products]
+        yield 'suggestions', ["Popular products", "Browse categories"]
 
     def _handle_category_browse(self) -> Dict[str, Any]:
         """Handle category browsing requests"""
@@ -120,25 +178,163 @@ class ChatbotService:
             'suggestions': categories[:4]
         }
 
-    def _handle_price_inquiry(self, message: str) -> Dict[str, Any]:
+    def _handle_price_inquiry(
+        self,
+        message: str,
+        state_key: Optional[Tuple[int, int]] = None,
+        state: Optional[ConversationState] = None
+    ) -> Iterator[Tuple[str, Any]]:
         """Handle price-related queries"""
-        price_match = re.search(r'\$?(\d+)', message)
-        if price_match:
-            price = float(price_match.group(1))
-            products = self.product_service.search_products(max_price=price, limit=6)
-            product_list = [product.to_dict() for product in products]
-            
-            return {
-                'message': f"Here are products under ${price}:",
-                'products': product_list,
-                'suggestions': ["Show cheaper options", "Browse by category"]
+        params = entity_extractor.extract(message)
+        min_price, max_price = params.get('min_price'), params.get('max_price')
+        if min_price is None and max_price is None:
+            price_match = PRICE_PATTERN.search(message)
+            if price_match:
+                max_price = float(price_match.group(1))
+
+        if min_price is not None or max_price is not None:
+            if min_price is not None and max_price is not None:
+                response = f"Here are products between ${min_price} and ${max_price}:"
+            elif min_price is not None:
+                response = f"Here are products over ${min_price}:"
+            else:
+                response = f"Here are products under ${max_price}:"
+
+            # A bare price range narrows the session's last search instead of starting a new one
+            if state is not None and not any(params.get(key) for key in ('query', 'category', 'brand')):
+                state = self._refine(state, min_price, max_price)
+                yield 'message', response
+                yield 'products', self._next_page(state_key, state)
+                yield 'suggestions', ["Show cheaper options", "Browse by category"]
+                return
+
+            search_params = {
+                'query': params['query'],
+                'category': params.get('category'),
+                'brand': params.get('brand'),
+                'min_price': min_price,
+                'max_price': max_price,
+                'limit': 10
             }
+            cards, cursor = self._prefetch(search_params)
+            yield 'message', response
+            yield 'products', self._remember(state_key, search_params, cards, cursor, 6)
+            yield 'suggestions', ["Show cheaper options", "Browse by category"]
+            return
         
-        return {
-            'message': "What's your budget? I can help you find products within your price range!",
-            'products': [],
-            'suggestions': ["Under $50", "Under $100", "Under $500"]
-        }
+        yield from self._ask_budget()
+
+    def _ask_budget(self) -> Iterator[Tuple[str, Any]]:
+        yield 'message', "What's your budget? I can help you find products within your price range!"
+        yield 'products', []
+        yield 'suggestions', ["Under $50", "Under $100", "Under $500"]
+
+    def _handle_follow_up(
+        self,
+        message: str,
+        state_key: Optional[Tuple[int, int]],
+        state: ConversationState
+    ) -> Iterator[Tuple[str, Any]]:
+        """Answer "show me more", "show cheaper options" and "filter by price" from the last search"""
+        if 'cheaper' in message:
+            shown = [card['price'] for card in state.candidates[max(0, state.shown - state.page_size):state.shown]]
+            if not shown:
+                yield from self._ask_budget()
+                return
+            ceiling = round(min(shown) - 0.01, 2)
+            state = self._refine(state, state.params.get('min_price'), ceiling)
+            products = self._next_page(state_key, state)
+            if products:
+                yield 'message', f"Here are cheaper options under ${min(shown)}:"
+            else:
+                yield 'message', f"I couldn't find anything cheaper than ${min(shown)} for this search."
+            yield 'products', products
+            yield 'suggestions', ["Show me more", "Browse categories"]
+            return
+
+        if 'price' in message:
+            yield from self._ask_budget()
+            return
+
+        products = self._next_page(state_key, state)
+        if products:
+            yield 'message', "Here are more products from your last search:"
+        else:
+            yield 'message', "That's everything I found for this search. Try another search or browse our categories!"
+        yield 'products', products
+        yield 'suggestions', self._get_search_suggestions() if products else ["Browse categories", "Popular products"]
+
+    def _prefetch(self, search_params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Product cards of a search, with room for a few follow-up pages beyond the requested limit"""
+        key = tuple(sorted(search_params.items()))
+        if self._searches is not None and key in self._searches:
+            return self._searches[key]
+        limit = max(search_params['limit'], settings.conversation_prefetch_results)
+        products, cursor = self.product_service.search_products_page(**dict(search_params, limit=limit))
+        # States only ever replace their candidate lists, so one list can back several sessions
+        result = ([product.to_dict() for product in products], cursor)
+        if self._searches is not None:
+            self._searches[key] = result
+        return result
+
+    def _remember(
+        self,
+        state_key: Optional[Tuple[int, int]],
+        search_params: Dict[str, Any],
+        cards: List[Dict[str, Any]],
+        cursor: Optional[str],
+        page_size: int
+    ) -> List[Dict[str, Any]]:
+        """The first page of a search, keeping all fetched results for follow-ups"""
+        params = {key: search_params.get(key) for key in SEARCH_FILTERS}
+        state = ConversationState(params, cards, cursor, cursor is None, page_size)
+        return self._next_page(state_key, state)
+
+    def _refine(self, state: ConversationState, min_price: Optional[float], max_price: Optional[float]) -> ConversationState:
+        """The state of the same search with new price bounds
+
+        When the new bounds only narrow the old ones, the candidates that
+        fall inside them are still the first results of the narrower
+        search, so they are kept and the database is only asked for more
+        once they run out.
+        """
+        params = dict(state.params, min_price=min_price, max_price=max_price)
+        old_min, old_max = state.params.get('min_price'), state.params.get('max_price')
+        narrows = (
+            (old_min is None or (min_price is not None and min_price >= old_min)) and
+            (old_max is None or (max_price is not None and max_price <= old_max))
+        )
+        if not narrows or not state.current:
+            return ConversationState(params, [], None, False, state.page_size)
+        candidates = [
+            card for card in state.candidates
+            if (min_price is None or card['price'] >= min_price) and (max_price is None or card['price'] <= max_price)
+        ]
+        # The old cursor continues the unfiltered results, so past these the narrower search runs again
+        return ConversationState(params, candidates, None, state.complete, state.page_size)
+
+    def _next_page(self, state_key: Optional[Tuple[int, int]], state: ConversationState) -> List[Dict[str, Any]]:
+        """The next page_size unseen candidates, fetching more results only when they run out"""
+        if not state.current:
+            state.reset()
+        wanted = state.shown + state.page_size
+        while len(state.candidates) < wanted and not state.complete:
+            if state.cursor:
+                products, cursor = self.product_service.search_products_page(
+                    **state.params, limit=settings.conversation_prefetch_results, cursor=state.cursor
+                )
+                state.candidates = state.candidates + [product.to_dict() for product in products]
+            else:
+                # Without a cursor the results are fetched again from the start
+                products, cursor = self.product_service.search_products_page(
+                    **state.params, limit=max(wanted, settings.conversation_prefetch_results)
+                )
+                state.candidates = [product.to_dict() for product in products]
+            state.cursor, state.complete = cursor, cursor is None
+        page = state.candidates[state.shown:wanted]
+        state.shown += len(page)
+        conversation_states.save(state_key, state)
+        return page
 
     def _handle_help(self) -> Dict[str, Any]:
         """Handle help requests"""
@@ -169,20 +365,24 @@ Just type naturally - for example: "show me laptops under $800" or "I need a bir
             'suggestions': []
         }
 
-    def _handle_default(self, message: str) -> Dict[str, Any]:
+    def _handle_default(
+        self,
+        message: str,
+        state_key: Optional[Tuple[int, int]] = None,
+        search: bool = True
+    ) -> Iterator[Tuple[str, Any]]:
         """Handle unrecognized messages"""
-        # Try to search for products anyway
-        products = self.product_service.search_products(query=message, limit=4)
+        # Try to search for products anyway, unless the classifier is sure they aren't about products
+        search_params = {'query': message, 'limit': 4}
+        cards, cursor = self._prefetch(search_params) if search else ([], None)
         
-        if products:
-            product_list = [product.to_dict() for product in products]
-            return {
-                'message': f"I found some products that might match '{message}':",
-                'products': product_list,
-                'suggestions': ["Show more like this", "Browse categories"]
-            }
+        if cards:
+            yield 'message', f"I found some products that might match '{message}':"
+            yield 'products', self._remember(state_key, search_params, cards, cursor, 4)
+            yield 'suggestions', ["Show more like this", "Browse categories"]
+            return
         
-        return {
+        yield from {
             'message': """I'm a chatbot designed to help you with product search and information. Here are some things you can ask me:
 
 •   "Show me laptops"
@@ -197,33 +397,15 @@ How can I assist you today?""",
                 "What's on sale?",
                 "Find a gift"
             ]
-        }
+        }.items()
 
     def _extract_search_params(self, message: str) -> Dict[str, Any]:
         """Extract search parameters from user message"""
         params = {'limit': 10}
         
-        # Extract price range
-        price_match = re.search(r'under\s+\$?(\d+)', message, re.IGNORECASE)
-        if price_match:
-            params['max_price'] = float(price_match.group(1))
-        
-        # Extract category hints
-        categories = ['electronics', 'clothing', 'books', 'home', 'sports', 'beauty']
-        for category in categories:
-            if category in message.lower():
-                params['category'] = category
-                break
-        
-        # Extract brand hints
-        brands = ['apple', 'samsung', 'nike', 'adidas', 'sony', 'lg']
-        for brand in brands:
-            if brand in message.lower():
-                params['brand'] = brand
-                break
-        
-        # Use the full message as search query
-        params['query'] = message
+        # Categories, brands and price limits found in one pass over the message;
+        # the remaining words become the text query
+        params.update(entity_extractor.extract(message))
         
         return params
 
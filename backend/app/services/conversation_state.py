@@ -0,0 +1,77 @@
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.cache import LRUCache
+from ..core.config import settings
+from .catalog_events import catalog_version
+
+class ConversationState:
+    """The last product search of a chat session and the results fetched for it
+
+    Candidates are the first product cards of the search in result order;
+    shown counts how many of them the user has already seen, cursor fetches
+    the page after them and complete says no results are left beyond them.
+    States are tied to the catalog version they were fetched at, so
+    follow-ups after a product write search again.
+    """
+
+    __slots__ = ("params", "candidates", "cursor", "complete", "page_size", "shown", "version")
+
+    def __init__(self, params: Dict[str, Any], candidates: List[Dict[str, Any]], cursor: Optional[str],
+                 complete: bool, page_size: int, shown: int = 0):
+        self.params = params
+        self.candidates = candidates
+        self.cursor = cursor
+        self.complete = complete
+        self.page_size = page_size
+        self.shown = shown
+        self.version = catalog_version()
+
+    @property
+    def current(self) -> bool:
+        return self.version == catalog_version()
+
+    def reset(self) -> None:
+        """Drop the fetched candidates so the search runs again"""
+        self.candidates, self.cursor, self.complete = [], None, False
+        self.version = catalog_version()
+
+    def cost(self) -> int:
+        """Rough size in bytes, counted against the store's memory cap"""
+        size = 256 + sum(len(str(value)) for value in self.params.values())
+        for card in self.candidates:
+            size += 128 + sum(48 + len(str(value)) for value in card.values())
+        return size
+
+class ConversationStateStore:
+    """Per-session conversation states in an LRU evicted by idle time and total size
+
+    States are keyed by session id together with the owner's user id, so a
+    session id that has not been checked against its owner yet can never
+    reach another user's results.
+    """
+
+    def __init__(self, max_sessions: int, idle_seconds: float, max_bytes: int):
+        self._cache = LRUCache(max_sessions, idle_seconds, sliding=True, max_cost=max_bytes)
+
+    def key(self, user_id: int, session_id: Optional[int]) -> Optional[Tuple[int, int]]:
+        return (user_id, session_id) if session_id else None
+
+    def get(self, key: Optional[Tuple[int, int]]) -> Optional[ConversationState]:
+        if key is None:
+            return None
+        return self._cache.get(key)
+
+    def save(self, key: Optional[Tuple[int, int]], state: ConversationState) -> None:
+        if key is not None:
+            self._cache.put(key, state, state.cost())
+
+    def discard(self, user_id: int, session_id: int) -> None:
+        self._cache.pop((user_id, session_id))
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return self._cache.stats()
+
+conversation_states = ConversationStateStore(
+    settings.conversation_state_max_sessions,
+    settings.conversation_state_idle_seconds,
+    settings.conversation_state_max_bytes
+)
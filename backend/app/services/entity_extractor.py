@@ -0,0 +1,224 @@
+import re
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .catalog_events import register_index
+from .search_index import STOPWORDS, normalize_token
+
+_AMOUNT = r'\$?\s*(\d[\d,]*(?:\.\d+)?)'
+
+# Price phrases, tried in order; ranges first so their bounds aren't read as single limits
+PRICE_RANGE_PATTERNS = [
+    re.compile(rf'\bbetween\s+{_AMOUNT}\s+(?:and|to|-)\s+{_AMOUNT}', re.IGNORECASE),
+    re.compile(rf'\bfrom\s+{_AMOUNT}\s+(?:to|-)\s+{_AMOUNT}', re.IGNORECASE),
+    re.compile(rf'\$\s*(\d[\d,]*(?:\.\d+)?)\s*(?:-|to)\s*{_AMOUNT}', re.IGNORECASE),
+]
+MAX_PRICE_PATTERN = re.compile(
+    rf'\b(?:under|below|less than|cheaper than|up to|no more than|at most|max(?:imum)?|within)\s+{_AMOUNT}',
+    re.IGNORECASE
+)
+MIN_PRICE_PATTERN = re.compile(
+    rf'\b(?:over|above|more than|at least|from|starting at|min(?:imum)?)\s+{_AMOUNT}',
+    re.IGNORECASE
+)
+
+# Words left over after entity extraction that say nothing about the product
+FILLER_WORDS = STOPWORDS | frozenset([
+    "browse", "buy", "cheap", "cheaper", "display", "list", "products", "product",
+    "items", "item", "budget", "price", "priced", "between", "over", "above", "below",
+    "less", "than", "more", "least", "most", "up", "around", "about"
+])
+
+def _amount(text: str) -> float:
+    return float(text.replace(",", ""))
+
+class AhoCorasick:
+    """Multi-pattern string matcher that finds every keyword in one pass over the text"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self.keywords: List[str] = []
+        for keyword in keywords:
+            self._insert(keyword)
+        self._link()
+
+    def _insert(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self.keywords))
+        self.keywords.append(keyword)
+
+    def _link(self) -> None:
+        """Compute failure links breadth first, merging the outputs they lead to"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                # States one character deep fall back to the root
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, keyword index) of every occurrence in text"""
+        matches = []
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                matches.append((position + 1 - len(self.keywords[keyword]), position + 1, keyword))
+        return matches
+
+class EntityExtractor:
+    """Finds catalog categories, brands and price limits in chat messages
+
+    The keyword automaton is built from the live category and brand values
+    and rebuilt on the next lookup after a value appears in or disappears
+    from the catalog. Categories also match by their first word, so
+    'sports' finds 'Sports & Outdoors'.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._products: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._automaton = AhoCorasick([])
+        self._entities: List[List[Tuple[str, str]]] = []
+        self._stale = False
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the known values with those of the given product records"""
+        with self._lock:
+            self._products = {}
+            self._counts = {}
+            for record in records:
+                self._add(record)
+            self._stale = True
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for record in upserts:
+                self._remove(record["id"])
+                self._add(record)
+
+    def _values(self, category: str, brand: Optional[str]) -> List[Tuple[str, str]]:
+        values = [("category", category)]
+        if brand:
+            values.append(("brand", brand))
+        return values
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        self._products[record["id"]] = (record["category"], record["brand"])
+        for value in self._values(record["category"], record["brand"]):
+            count = self._counts.get(value, 0)
+            if not count:
+                self._stale = True
+            self._counts[value] = count + 1
+
+    def _remove(self, product_id: int) -> None:
+        values = self._products.pop(product_id, None)
+        if values is None:
+            return
+        for value in self._values(*values):
+            count = self._counts[value] - 1
+            if count:
+                self._counts[value] = count
+            else:
+                del self._counts[value]
+                self._stale = True
+
+    def _keywords(self, kind: str, value: str) -> List[str]:
+        keywords = {value.lower()}
+        if kind == "category":
+            words = re.findall(r"[a-z0-9']+", value.lower())
+            if words:
+                keywords.update([words[0], normalize_token(words[0])])
+        return [keyword for keyword in keywords if len(keyword) > 1]
+
+    def _compile(self) -> None:
+        entities: Dict[str, List[Tuple[str, str]]] = {}
+        for kind, value in sorted(self._counts):
+            for keyword in self._keywords(kind, value):
+                entities.setdefault(keyword, []).append((kind, value))
+        self._automaton = AhoCorasick(entities.keys())
+        self._entities = [entities[keyword] for keyword in self._automaton.keywords]
+        self._stale = False
+
+    def find_entities(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """(start, end, kind, value) of whole-word catalog values, longest leftmost first"""
+        with self._lock:
+            if self._stale:
+                self._compile()
+            automaton, entities = self._automaton, self._entities
+        matches = [
+            (start, end, keyword) for start, end, keyword in automaton.find(text)
+            if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+        ]
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+
+        found = []
+        covered = 0
+        for start, end, keyword in matches:
+            if start < covered:
+                continue
+            covered = end
+            for kind, value in entities[keyword]:
+                found.append((start, end, kind, value))
+        return found
+
+    def extract(self, message: str) -> Dict[str, Any]:
+        """Search filters in the message plus the words left over as the text query"""
+        text = message.lower()
+        params: Dict[str, Any] = {}
+        spans: List[Tuple[int, int]] = []
+
+        for pattern in PRICE_RANGE_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                low, high = sorted([_amount(match.group(1)), _amount(match.group(2))])
+                params['min_price'], params['max_price'] = low, high
+                spans.append(match.span())
+                break
+        else:
+            for key, pattern in (('max_price', MAX_PRICE_PATTERN), ('min_price', MIN_PRICE_PATTERN)):
+                match = pattern.search(text)
+                if match:
+                    params[key] = _amount(match.group(1))
+                    spans.append(match.span())
+
+        for start, end, kind, value in self.find_entities(text):
+            if any(start < span_end and span_start < end for span_start, span_end in spans):
+                continue
+            if kind not in params:
+                params[kind] = value
+            spans.append((start, end))
+
+        for start, end in sorted(spans, reverse=True):
+            text = text[:start] + " " + text[end:]
+        words = [word for word in re.findall(r"[a-z0-9'&-]+", text) if word not in FILLER_WORDS]
+        params['query'] = " ".join(words) or None
+        return params
+
+entity_extractor = register_index(EntityExtractor())
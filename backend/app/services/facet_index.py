@@ -0,0 +1,198 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from .catalog_events import register_index
+
+# Histogram bucket lower bounds; the last bucket is open-ended
+PRICE_BUCKETS = [0, 25, 50, 100, 200, 500, 1000, 2000]
+
+def _popcount(bitmap: int) -> int:
+    return bin(bitmap).count("1")
+
+def _bitmap_from_slots(slots: Iterable[int], size: int) -> int:
+    bits = bytearray((size + 7) // 8)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(bits, "little")
+
+def _bitmap_from_flags(flags: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+def _price_bucket(price: float) -> int:
+    bucket = 0
+    for index, lower in enumerate(PRICE_BUCKETS):
+        if price >= lower:
+            bucket = index
+    return bucket
+
+class FacetIndex:
+    """Bitmap per category, brand and price bucket over the active catalog
+
+    Prices are also kept in a NumPy array by slot, so a price range that
+    cuts through buckets is one vectorised comparison.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._slots: Dict[int, int] = {}
+        self._product_ids: List[Optional[int]] = []
+        self._free_slots: List[int] = []
+        self._values: List[Optional[Tuple[str, Optional[str], float]]] = []
+        # Price by slot, NaN for free slots so no range matches them
+        self._prices = np.zeros(0, dtype=np.float64)
+        self._all = 0
+        self._categories: Dict[str, int] = {}
+        self._brands: Dict[str, int] = {}
+        self._price_buckets: Dict[int, int] = {}
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given product records"""
+        with self._lock:
+            self._clear()
+            categories: Dict[str, List[int]] = {}
+            brands: Dict[str, List[int]] = {}
+            price_buckets: Dict[int, List[int]] = {}
+            for slot, record in enumerate(records):
+                self._slots[record["id"]] = slot
+                self._product_ids.append(record["id"])
+                self._values.append((record["category"], record["brand"], record["price"]))
+                categories.setdefault(record["category"], []).append(slot)
+                if record["brand"]:
+                    brands.setdefault(record["brand"], []).append(slot)
+                price_buckets.setdefault(_price_bucket(record["price"]), []).append(slot)
+
+            size = len(self._product_ids)
+            self._prices = np.array([values[2] for values in self._values], dtype=np.float64)
+            self._all = _bitmap_from_slots(range(size), size)
+            self._categories = {value: _bitmap_from_slots(slots, size) for value, slots in categories.items()}
+            self._brands = {value: _bitmap_from_slots(slots, size) for value, slots in brands.items()}
+            self._price_buckets = {bucket: _bitmap_from_slots(slots, size) for bucket, slots in price_buckets.items()}
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for record in upserts:
+                self._remove(record["id"])
+                self._add(record)
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._product_ids[slot] = record["id"]
+            self._values[slot] = (record["category"], record["brand"], record["price"])
+        else:
+            slot = len(self._product_ids)
+            self._product_ids.append(record["id"])
+            self._values.append((record["category"], record["brand"], record["price"]))
+            if slot == len(self._prices):
+                self._prices = np.concatenate((self._prices, np.full(max(1024, slot), np.nan)))
+        self._prices[slot] = record["price"]
+        self._slots[record["id"]] = slot
+
+        bit = 1 << slot
+        self._all |= bit
+        self._categories[record["category"]] = self._categories.get(record["category"], 0) | bit
+        if record["brand"]:
+            self._brands[record["brand"]] = self._brands.get(record["brand"], 0) | bit
+        bucket = _price_bucket(record["price"])
+        self._price_buckets[bucket] = self._price_buckets.get(bucket, 0) | bit
+
+    def _remove(self, product_id: int) -> None:
+        slot = self._slots.pop(product_id, None)
+        if slot is None:
+            return
+        category, brand, price = self._values[slot]
+        mask = ~(1 << slot)
+        self._all &= mask
+        self._discard(self._categories, category, mask)
+        if brand:
+            self._discard(self._brands, brand, mask)
+        self._discard(self._price_buckets, _price_bucket(price), mask)
+        self._product_ids[slot] = None
+        self._values[slot] = None
+        self._prices[slot] = np.nan
+        self._free_slots.append(slot)
+
+    def _discard(self, bitmaps: Dict[Any, int], key: Any, mask: int) -> None:
+        bitmap = bitmaps.get(key, 0) & mask
+        if bitmap:
+            bitmaps[key] = bitmap
+        else:
+            bitmaps.pop(key, None)
+
+    def values(self, facet: str) -> List[str]:
+        """Distinct values of 'category' or 'brand', most common first"""
+        with self._lock:
+            bitmaps = self._categories if facet == "category" else self._brands
+            counts = [(value, _popcount(bitmap)) for value, bitmap in bitmaps.items()]
+        return [value for value, _ in sorted(counts, key=lambda item: (-item[1], item[0]))]
+
+    def contains(self, facet: str, value: str) -> bool:
+        """Whether value is exactly one of the catalog's 'category' or 'brand' values"""
+        with self._lock:
+            return value in (self._categories if facet == "category" else self._brands)
+
+    def _substring_mask(self, bitmaps: Dict[str, int], needle: Optional[str]) -> int:
+        if not needle:
+            return self._all
+        needle = needle.lower()
+        mask = 0
+        for value, bitmap in bitmaps.items():
+            if needle in value.lower():
+                mask |= bitmap
+        return mask
+
+    def _price_mask(self, min_price: Optional[float], max_price: Optional[float]) -> int:
+        if min_price is None and max_price is None:
+            return self._all
+        low = min_price if min_price is not None else float("-inf")
+        high = max_price if max_price is not None else float("inf")
+        # Slots past the last product are trailing zero bits either way
+        return _bitmap_from_flags((self._prices >= low) & (self._prices <= high))
+
+    def _ids_mask(self, product_ids: Set[int]) -> int:
+        slots = [self._slots[product_id] for product_id in product_ids if product_id in self._slots]
+        return _bitmap_from_slots(slots, len(self._product_ids))
+
+    def counts(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        product_ids: Optional[Set[int]] = None
+    ) -> Dict[str, Any]:
+        """Count products per facet value under the given filters
+
+        Each facet is counted with every filter except its own, so the
+        counts show what selecting another value of that facet would return.
+        """
+        with self._lock:
+            category_mask = self._substring_mask(self._categories, category)
+            brand_mask = self._substring_mask(self._brands, brand)
+            price_mask = self._price_mask(min_price, max_price)
+            base = self._all if product_ids is None else self._ids_mask(product_ids)
+
+            def facet_counts(bitmaps: Dict[Any, int], mask: int) -> Dict[Any, int]:
+                counts = {}
+                for value, bitmap in bitmaps.items():
+                    count = _popcount(bitmap & mask)
+                    if count:
+                        counts[value] = count
+                return counts
+
+            return {
+                "total": _popcount(base & category_mask & brand_mask & price_mask),
+                "categories": facet_counts(self._categories, base & brand_mask & price_mask),
+                "brands": facet_counts(self._brands, base & category_mask & price_mask),
+                "price_buckets": facet_counts(self._price_buckets, base & category_mask & brand_mask)
+            }
+
+facet_index = register_index(FacetIndex())
@@ -0,0 +1,117 @@
+import logging
+from typing import List
+from sqlalchemy import Float, Integer, false, func, literal_column, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Query
+from ..models.product import Product
+from .search_index import STOPWORDS, TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# External-content FTS5 table over products, kept in sync by triggers
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        title, description, category, brand,
+        content='products', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, title, description, category, brand)
+        VALUES (new.id, new.title, new.description, new.category, new.brand);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, title, description, category, brand)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.brand);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, title, description, category, brand)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.brand);
+        INSERT INTO products_fts(rowid, title, description, category, brand)
+        VALUES (new.id, new.title, new.description, new.category, new.brand);
+    END
+    """
+]
+
+# Generated tsvector column, so PostgreSQL keeps it in sync on every write
+POSTGRES_DDL = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(brand, '') || ' ' || coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)"
+]
+
+def query_words(query: str) -> List[str]:
+    """Extract the words of a query that are safe to pass to the database matcher"""
+    return [word for word in TOKEN_PATTERN.findall(query.lower()) if word not in STOPWORDS]
+
+class FullTextSearch:
+    """Database-native full-text search: SQLite FTS5 or PostgreSQL tsvector"""
+
+    def __init__(self):
+        self.dialect = None
+
+    @property
+    def available(self) -> bool:
+        return self.dialect is not None
+
+    def install(self, engine: Engine) -> None:
+        """Create the full-text index structures if the database supports them"""
+        dialect = engine.dialect.name
+        try:
+            with engine.begin() as connection:
+                if dialect == "sqlite":
+                    exists = connection.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+                    ).first()
+                    for statement in SQLITE_DDL:
+                        connection.execute(text(statement))
+                    if not exists:
+                        # Index the rows written before the table existed
+                        connection.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+                elif dialect == "postgresql":
+                    for statement in POSTGRES_DDL:
+                        connection.execute(text(statement))
+                else:
+                    logger.warning("Full-text search is not supported on %s", dialect)
+                    return
+        except DBAPIError:
+            logger.exception("Could not install full-text search, falling back to ilike")
+            return
+        self.dialect = dialect
+
+    def apply(self, db_query: Query, query: str) -> Query:
+        """Restrict a product query to full-text matches, best match first"""
+        words = query_words(query)
+        if not words:
+            return db_query.filter(false())
+
+        if self.dialect == "sqlite":
+            matches = text(
+                "SELECT rowid AS product_id, bm25(products_fts, 10.0, 1.0, 2.0, 2.0) AS score "
+                "FROM products_fts WHERE products_fts MATCH :match"
+            ).bindparams(
+                match=" OR ".join(f'"{word}"' for word in words)
+            ).columns(product_id=Integer, score=Float).subquery("fts_matches")
+            return db_query\
+                .join(matches, matches.c.product_id == Product.id)\
+                .order_by(matches.c.score, Product.rating.desc(), Product.created_at.desc())
+
+        search_vector = literal_column("products.search_vector")
+        ts_query = func.to_tsquery("english", " | ".join(words))
+        return db_query\
+            .filter(search_vector.op("@@")(ts_query))\
+            .order_by(func.ts_rank(search_vector, ts_query).desc(), Product.rating.desc(), Product.created_at.desc())
+
+fulltext_search = FullTextSearch()
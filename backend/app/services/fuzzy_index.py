@@ -0,0 +1,133 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+from .catalog_events import register_index
+from .search_index import STOPWORDS, TOKEN_PATTERN
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """Edit distance counting adjacent transpositions as one edit, or None if above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return None
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+class FuzzyIndex:
+    """Trigram index over title, brand and category words for typo correction"""
+
+    MIN_WORD_LENGTH = 3
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._word_counts: Counter = Counter()
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._product_words: Dict[int, Set[str]] = {}
+
+    def _words(self, record: Dict[str, Any]) -> Set[str]:
+        text = " ".join(filter(None, (record["title"], record["brand"], record["category"])))
+        return {
+            word for word in TOKEN_PATTERN.findall(text.lower())
+            if len(word) >= self.MIN_WORD_LENGTH and not word.isdigit()
+        }
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given product records"""
+        with self._lock:
+            self._word_counts = Counter()
+            self._trigrams = {}
+            self._product_words = {}
+            for record in records:
+                self._add(record)
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for record in upserts:
+                self._remove(record["id"])
+                self._add(record)
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        words = self._words(record)
+        self._product_words[record["id"]] = words
+        for word in words:
+            if not self._word_counts[word]:
+                for trigram in trigrams(word):
+                    self._trigrams.setdefault(trigram, set()).add(word)
+            self._word_counts[word] += 1
+
+    def _remove(self, product_id: int) -> None:
+        for word in self._product_words.pop(product_id, ()):
+            self._word_counts[word] -= 1
+            if self._word_counts[word] > 0:
+                continue
+            del self._word_counts[word]
+            for trigram in trigrams(word):
+                words = self._trigrams.get(trigram)
+                if words is None:
+                    continue
+                words.discard(word)
+                if not words:
+                    del self._trigrams[trigram]
+
+    def max_distance(self, word: str) -> int:
+        return 1 if len(word) <= 5 else 2
+
+    def closest(self, word: str) -> Optional[str]:
+        """Return the indexed word nearest to word within the allowed edit distance"""
+        limit = self.max_distance(word)
+        grams = trigrams(word)
+        # Strings within k edits share at least this many trigrams
+        required = max(1, len(grams) - 3 * limit)
+
+        with self._lock:
+            if word in self._word_counts:
+                return word
+            shared: Counter = Counter()
+            for trigram in grams:
+                shared.update(self._trigrams.get(trigram, ()))
+
+            best = None
+            for candidate, overlap in shared.items():
+                if overlap < required:
+                    continue
+                distance = bounded_edit_distance(word, candidate, limit)
+                if distance is None:
+                    continue
+                rank = (distance, -self._word_counts[candidate], candidate)
+                if best is None or rank < best:
+                    best = rank
+        return best[2] if best else None
+
+    def correct(self, query: str) -> Optional[str]:
+        """Replace misspelled words in query with their closest catalog words, or None if none changed"""
+        words = TOKEN_PATTERN.findall(query.lower())
+        corrected = []
+        for word in words:
+            if len(word) >= self.MIN_WORD_LENGTH and word not in STOPWORDS and not word.isdigit():
+                word = self.closest(word) or word
+            corrected.append(word)
+        if corrected == words:
+            return None
+        return " ".join(corrected)
+
+fuzzy_index = register_index(FuzzyIndex())
@@ -0,0 +1,112 @@
+import re
+import zlib
+from functools import lru_cache
+from itertools import chain
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# Hashed feature space; large enough that the few thousand n-grams of chat messages rarely collide
+N_FEATURES = 1 << 15
+
+# Suggestion chips and common phrases repeat, so their features are remembered
+@lru_cache(maxsize=4096)
+def message_features(message: str) -> Tuple[int, ...]:
+    """Hashed word unigrams, bigrams and character trigrams of a message
+
+    Digits are folded so "$50" and "$800" share features, and start and
+    end markers let short messages like "hi" or "help" stand apart from
+    the same word inside a sentence.
+    """
+    words = re.findall(r"[a-z0-9$']+", re.sub(r"\d+", "0", message.lower()))
+    if not words:
+        return ()
+    grams = ["w:" + word for word in words]
+    bounded = ["<s>"] + words + ["</s>"]
+    grams += ["b:" + first + " " + second for first, second in zip(bounded, bounded[1:])]
+    for word in words:
+        padded = f" {word} "
+        grams += ["c:" + padded[i:i + 3] for i in range(len(padded) - 2)]
+    return tuple(zlib.crc32(gram.encode()) & (N_FEATURES - 1) for gram in grams)
+
+class IntentClassifier:
+    """Multinomial naive Bayes over hashed n-grams, trained offline and loaded at startup
+
+    The model is a log prior per intent and a (features x intents) matrix
+    of log likelihoods. Scoring a batch gathers the rows of every feature
+    in every message and sums them per message, which is the sparse count
+    matrix times the likelihood matrix without materializing either.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.labels: List[str] = []
+        self._log_prior = np.zeros(0, dtype=np.float32)
+        self._log_likelihood = np.zeros((N_FEATURES, 0), dtype=np.float32)
+
+    @classmethod
+    def fit(cls, messages: Sequence[str], labels: Sequence[str], alpha: float = 0.1) -> "IntentClassifier":
+        """Train on labelled messages with additive smoothing alpha"""
+        classifier = cls()
+        classifier.labels = sorted(set(labels))
+        index = {label: i for i, label in enumerate(classifier.labels)}
+        counts = np.zeros((N_FEATURES, len(classifier.labels)), dtype=np.float64)
+        priors = np.zeros(len(classifier.labels), dtype=np.float64)
+        for message, label in zip(messages, labels):
+            column = index[label]
+            priors[column] += 1
+            np.add.at(counts[:, column], list(message_features(message)), 1)
+        smoothed = counts + alpha
+        classifier._log_likelihood = np.log(smoothed / smoothed.sum(axis=0)).astype(np.float32)
+        classifier._log_prior = np.log(priors / priors.sum()).astype(np.float32)
+        classifier.ready = True
+        return classifier
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            labels=np.array(self.labels),
+            log_prior=self._log_prior,
+            log_likelihood=self._log_likelihood
+        )
+
+    def load(self, path: str) -> bool:
+        """Load weights saved by save(); returns False and stays unready if the file is missing"""
+        try:
+            with np.load(path) as model:
+                labels = [str(label) for label in model["labels"]]
+                log_prior = model["log_prior"].astype(np.float32)
+                log_likelihood = model["log_likelihood"].astype(np.float32)
+        except FileNotFoundError:
+            return False
+        if log_likelihood.shape != (N_FEATURES, len(labels)):
+            raise ValueError(f"Intent model {path} was trained with a different feature space")
+        self.labels, self._log_prior, self._log_likelihood = labels, log_prior, log_likelihood
+        self.ready = True
+        return True
+
+    def predict_proba(self, messages: Sequence[str]) -> np.ndarray:
+        """(messages x intents) posterior probabilities, in the order of labels"""
+        features = [message_features(message) for message in messages]
+        rows = self._log_likelihood[np.array(list(chain.from_iterable(features)), dtype=np.intp)]
+        if len(features) == 1:
+            scores = (rows.sum(axis=0) + self._log_prior)[np.newaxis]
+        else:
+            lengths = np.array([len(row) for row in features])
+            nonempty = lengths > 0
+            scores = np.tile(self._log_prior, (len(features), 1))
+            if rows.size:
+                starts = np.cumsum(lengths[nonempty]) - lengths[nonempty]
+                scores[nonempty] += np.add.reduceat(rows, starts, axis=0)
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, messages: Sequence[str]) -> List[Tuple[str, float]]:
+        """(intent, probability) of the most likely intent of each message"""
+        if not messages:
+            return []
+        probabilities = self.predict_proba(messages)
+        best = probabilities.argmax(axis=1)
+        return [(self.labels[column], float(probabilities[row, column])) for row, column in enumerate(best)]
+
+intent_classifier = IntentClassifier()
@@ -0,0 +1,81 @@
+import re
+from typing import Dict, List
+
+# Intent patterns in priority order: the first intent with a pattern found anywhere in the message wins
+INTENT_PATTERNS: Dict[str, List[str]] = {
+    'follow_up': [
+        r'^\s*(?:show|see|give|load)?\s*(?:me\s+)?more(?:\s+(?:results|products|options|like (?:this|these)))?\s*[.!?]*\s*$',
+        r'^\s*next(?: page)?\s*[.!?]*\s*$',
+        r'^\s*(?:show|see|find|any)?\s*(?:me\s+)?(?:something\s+)?cheaper(?:\s+(?:ones|options|products|items))?\s*[.!?]*\s*$',
+        r'^\s*filter by price\s*$'
+    ],
+    'greeting': [
+        r'\b(hi|hello|hey|good morning|good afternoon|good evening)\b',
+        r'\bhow are you\b',
+        r'\bwhat\'s up\b'
+    ],
+    'recommendation': [
+        r'\b(?:frequently|often|usually) (?:bought|added|purchased) together\b',
+        r'\b(?:goes|go|pairs?) (?:well )?with\b',
+        r'\b(?:related|similar) (?:to|products|items)\b',
+        r'\b(?:recommendations|recommend something|suggest something)\b',
+        r'\bwhat else (?:should|could|can) i (?:buy|get|add)\b',
+        r'\b(?:customers who|also (?:bought|added))\b'
+    ],
+    'product_search': [
+        r'\b(find|search|look for|show me|i want|i need)\b.*\b(product|item|thing)\b',
+        r'\b(laptop|phone|shirt|book|electronics|clothing)\b',
+        r'\bprice\b.*\b(under|below|less than|cheaper)\b',
+        r'^\s*[a-zA-Z\s]+\s*$'  # Simple product name
+    ],
+    'category_browse': [
+        r'\b(browse|show|list|what)\b.*\b(categories|types|kinds)\b',
+        r'\bcategory\b',
+        r'\bwhat do you have\b'
+    ],
+    'price_inquiry': [
+        r'\b(price|cost|how much|expensive|cheap)\b',
+        r'\$\d+',
+        r'\bbudget\b'
+    ],
+    'help': [
+        r'\b(help|assist|support|guide)\b',
+        r'\bwhat can you do\b',
+        r'\bhow does this work\b'
+    ],
+    'goodbye': [
+        r'\b(bye|goodbye|see you|later|exit|quit)\b',
+        r'\bthank you\b.*\bbye\b'
+    ]
+}
+
+class IntentEngine:
+    """All intent patterns compiled into one regex that reports the first matching intent
+
+    Each intent's patterns are joined into one alternation inside a
+    lookahead anchored at the start of the message, followed by an empty
+    group named after the intent. Intents are tried in order, so the group
+    that takes part in the match is the highest-priority intent with a
+    pattern found anywhere in the message, exactly as searching the
+    patterns one by one would find it, but in a single call into the
+    regex engine.
+    """
+
+    def __init__(self, intents: Dict[str, List[str]], default: str = 'default'):
+        self.default = default
+        alternatives = []
+        for intent, patterns in intents.items():
+            any_pattern = "|".join(f"(?:{pattern})" for pattern in patterns)
+            alternatives.append(f"(?=[\\s\\S]*?(?:{any_pattern}))(?P<{intent}>)")
+        self._pattern = re.compile(r"\A(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+    def detect(self, message: str) -> str:
+        """Return the intent of the message, or the default intent"""
+        match = self._pattern.match(message)
+        if match is None:
+            return self.default
+        return match.lastgroup
+
+intent_engine = IntentEngine(INTENT_PATTERNS)
+# Follow-ups alone, for when a classifier decides the other intents
+follow_up_engine = IntentEngine({'follow_up': INTENT_PATTERNS['follow_up']})
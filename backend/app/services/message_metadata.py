@@ -0,0 +1,67 @@
+import json
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..models.product import Product
+
+# Bot message metadata written since product cards became references
+METADATA_VERSION = 2
+
+def compact_metadata(products: List[Dict[str, Any]], suggestions: List[str]) -> str:
+    """Metadata JSON for a bot reply: the ids of the products shown and the prices they were shown at"""
+    return json.dumps({
+        'v': METADATA_VERSION,
+        'products': [{'id': product['id'], 'price': product['price']} for product in products],
+        'suggestions': suggestions
+    })
+
+def compact_stored(metadata: Optional[str]) -> Optional[str]:
+    """Stored metadata rewritten in the compact format; None if it already is, or isn't JSON"""
+    try:
+        parsed = json.loads(metadata) if metadata else None
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict) or parsed.get('v') == METADATA_VERSION:
+        return None
+    return compact_metadata(parsed.get('products') or [], parsed.get('suggestions') or [])
+
+def hydrate_metadata(db: Session, stored: List[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+    """Parse stored metadata, filling compact product references from one query for all of them
+
+    Cards keep the price shown in the conversation, with the current price
+    alongside when it has changed; products deleted since are left out.
+    Metadata written before the compact format carries full cards and is
+    returned as stored.
+    """
+    parsed = []
+    for metadata in stored:
+        try:
+            parsed.append(json.loads(metadata) if metadata else None)
+        except ValueError:
+            parsed.append(None)
+
+    product_ids = {
+        reference['id']
+        for metadata in parsed if metadata and metadata.get('v') == METADATA_VERSION
+        for reference in metadata['products']
+    }
+    # History shows products even after they are deactivated
+    products = {
+        product.id: product.to_dict()
+        for product in db.query(Product).filter(Product.id.in_(product_ids))
+    } if product_ids else {}
+
+    hydrated = []
+    for metadata in parsed:
+        if metadata and metadata.get('v') == METADATA_VERSION:
+            cards = []
+            for reference in metadata['products']:
+                product = products.get(reference['id'])
+                if product is None:
+                    continue
+                card = dict(product, price=reference['price'])
+                if product['price'] != reference['price']:
+                    card['current_price'] = product['price']
+                cards.append(card)
+            metadata = {'products': cards, 'suggestions': metadata.get('suggestions', [])}
+        hydrated.append(metadata)
+    return hydrated
@@ -0,0 +1,337 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.chat import ChatMessage, ChatSession
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): journals of other processes are taken to be left over
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class MessageWriter:
+    """Write-behind persistence for chat messages
+
+    Replies enqueue their message rows and return; a background thread
+    inserts whatever has queued up in one multi-row insert and commit,
+    once batch_size rows are waiting or interval_seconds after the first
+    of them arrived. Every enqueued batch is first appended to a journal
+    file, and a line recording the last committed batch is appended after
+    each flush, so rows a crashed process never flushed are inserted when
+    the next one starts. Batches can reach the queue out of sequence
+    order, so that line only covers the unbroken run of committed batches;
+    a crash can insert batches after it twice, but messages are never lost.
+
+    A batch the database keeps refusing is written one row at a time, and
+    rows that still fail are appended to the journal path suffixed with
+    .rejected rather than holding up every message queued behind them.
+
+    Appends are fsynced before enqueue returns, one fsync covering every
+    append made while the previous one ran. Each process journals to its
+    own file, suffixed with its pid and held under an exclusive lock, and
+    at startup replays only the journals no live process holds.
+    """
+
+    # Attempts at a failing batch before its rows are written one at a time
+    MAX_BATCH_ATTEMPTS = 5
+
+    def __init__(self, journal_path: str, batch_size: int, interval_seconds: float, queue_size: int):
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self._queue: "queue.Queue[Optional[Tuple[int, List[Dict[str, Any]]]]]" = queue.Queue(queue_size)
+        self._journal_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._journal = None
+        self._sequence = 0
+        self._synced = 0
+        # Every sequence up to flushed_through is committed; flushed_ahead holds those committed after a gap
+        self._flushed_through = 0
+        self._flushed_ahead: Set[int] = set()
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.last_flush_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        """Insert rows left in the journal by an earlier process, then start the worker"""
+        if self.running:
+            return
+        self._replay()
+        path = f"{self.journal_path}.{os.getpid()}"
+        self._journal = open(path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX)
+        self._sync_directory(path)
+        self._thread = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Flush everything queued and stop the worker"""
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        with self._journal_lock:
+            path = self._journal.name
+            # Emptied by the last checkpoint unless rows were still unwritten at the timeout
+            caught_up = os.fstat(self._journal.fileno()).st_size == 0
+            self._journal.close()
+            self._journal = None
+        if caught_up:
+            os.remove(path)
+
+    def save(self, db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Persist message rows: queued when the writer runs, otherwise inserted and committed now"""
+        if not self.running:
+            # A single executemany on the table; ORM bulk inserts split rows whose None keys differ
+            if rows:
+                db.execute(ChatMessage.__table__.insert(), rows)
+            db.commit()
+            return
+        # Sessions created for this reply still commit now, as the client is given their id
+        db.commit()
+        self.enqueue(rows)
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        # Stamped now rather than at flush time, so history keeps the order messages arrived in
+        timestamp = datetime.utcnow()
+        rows = [dict(row, timestamp=row.get('timestamp') or timestamp) for row in rows]
+        with self._journal_lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._journal.write(json.dumps({"seq": sequence, "rows": rows}, default=datetime.isoformat) + "\n")
+            self._journal.flush()
+            self.enqueued += len(rows)
+        self._sync(sequence)
+        # Blocks when the worker falls queue_size batches behind
+        self._queue.put((sequence, rows))
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            count = len(item[1])
+            deadline = time.monotonic() + self.interval_seconds
+            while count < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                count += len(item[1])
+            self._flush(batch)
+
+        # Drain whatever arrived after the stop request
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[int, List[Dict[str, Any]]]]) -> None:
+        rows = [row for _, batch_rows in batch for row in batch_rows]
+        started = time.perf_counter()
+        self._write(rows)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.flushed += len(rows)
+        self.flushes += 1
+        self._checkpoint([sequence for sequence, _ in batch])
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert rows, retrying failures; rows the database goes on refusing are set aside"""
+        delay = 0.1
+        for attempt in range(1, self.MAX_BATCH_ATTEMPTS + 1):
+            try:
+                self._insert(rows)
+                return
+            except Exception:
+                self.failures += 1
+                logger.exception("Could not write %d chat messages (attempt %d)", len(rows), attempt)
+                if attempt < self.MAX_BATCH_ATTEMPTS:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+
+        # One bad row fails the whole insert, so find it by writing the rows one at a time
+        for row in rows:
+            delay = 0.1
+            while True:
+                try:
+                    self._insert([row])
+                    break
+                except OperationalError:
+                    # The database is unreachable rather than refusing the row, so keep retrying
+                    self.failures += 1
+                    logger.exception("Could not write a chat message, retrying in %.1fs", delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                except Exception:
+                    logger.exception("Setting aside a chat message the database refused")
+                    self._reject(row)
+                    break
+
+    def _reject(self, row: Dict[str, Any]) -> None:
+        with open(f"{self.journal_path}.rejected", "a", encoding="utf-8") as rejected:
+            rejected.write(json.dumps(row, default=datetime.isoformat) + "\n")
+            rejected.flush()
+            os.fsync(rejected.fileno())
+        self.rejected += 1
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            # Sessions deleted while their messages were queued; SQLite doesn't enforce the foreign key
+            session_ids = {row['session_id'] for row in rows}
+            existing = {
+                session_id for session_id, in
+                db.query(ChatSession.id).filter(ChatSession.id.in_(session_ids))
+            }
+            kept = [row for row in rows if row['session_id'] in existing]
+            if kept:
+                db.execute(ChatMessage.__table__.insert(), kept)
+            db.commit()
+            self.dropped += len(rows) - len(kept)
+        finally:
+            db.close()
+
+    def _checkpoint(self, sequences: List[int]) -> None:
+        with self._journal_lock:
+            if self._journal is None:
+                return
+            self._flushed_ahead.update(sequences)
+            while self._flushed_through + 1 in self._flushed_ahead:
+                self._flushed_through += 1
+                self._flushed_ahead.remove(self._flushed_through)
+            if self._flushed_through == self._sequence:
+                # Caught up: nothing in the journal is still needed
+                self._journal.seek(0)
+                self._journal.truncate()
+            else:
+                # A batch with an earlier sequence may still be on its way to the queue
+                self._journal.write(json.dumps({"done": self._flushed_through}) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _sync(self, sequence: int) -> None:
+        """Wait until the journal is on disk up to sequence"""
+        with self._sync_lock:
+            if self._synced >= sequence:
+                # Another caller's fsync already covered this append
+                return
+            with self._journal_lock:
+                written = self._sequence
+                descriptor = self._journal.fileno()
+            os.fsync(descriptor)
+            self._synced = written
+
+    @staticmethod
+    def _sync_directory(path: str) -> None:
+        # A new file's directory entry needs its own fsync to survive a crash
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def _replay(self) -> None:
+        """Insert what journals of processes that are gone still hold, then remove them"""
+        # The unsuffixed path is the journal written before journals were kept per process
+        suffixed = glob.glob(glob.escape(self.journal_path) + ".*")
+        for path in [self.journal_path, *(path for path in suffixed if path.rsplit(".", 1)[1].isdigit())]:
+            try:
+                journal = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with journal:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # Still held by a running process
+                        continue
+                if os.fstat(journal.fileno()).st_nlink == 0:
+                    # Replayed and removed by another process while this one waited to open it
+                    continue
+                self._replay_journal(path, journal)
+                os.remove(path)
+
+    def _replay_journal(self, path: str, journal) -> None:
+        done = 0
+        pending: List[Tuple[int, List[Dict[str, Any]]]] = []
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by the crash was never acknowledged
+                continue
+            if "done" in entry:
+                done = max(done, entry["done"])
+            else:
+                pending.append((entry["seq"], entry["rows"]))
+        rows = [
+            dict(row, timestamp=datetime.fromisoformat(row['timestamp']))
+            for sequence, batch_rows in pending if sequence > done
+            for row in batch_rows
+        ]
+        if rows:
+            logger.warning("Writing %d chat messages left in %s", len(rows), path)
+            self._write(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued_batches": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+message_writer = MessageWriter(
+    settings.chat_write_behind_journal,
+    settings.chat_write_behind_batch_size,
+    settings.chat_write_behind_interval_ms / 1000,
+    settings.chat_write_behind_queue_size
+)
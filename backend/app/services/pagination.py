@@ -0,0 +1,20 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Pack a page position into an opaque URL-safe token"""
+    payload = json.dumps(position, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Unpack a token produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
@@ -1,7 +1,24 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy import String, or_, and_, case, func, select, type_coerce
+from ..core.cache import LRUCache
+from ..core.config import settings
+from ..core.database import SessionLocal
 from ..models.product import Product
+from .catalog_events import catalog_version
+from .catalog_snapshot import catalog_snapshot
+from .facet_index import PRICE_BUCKETS, facet_index
+from .fulltext_search import fulltext_search
+from .fuzzy_index import fuzzy_index
+from .pagination import decode_cursor, encode_cursor
+from .search_index import product_index
+from .semantic_index import semantic_index
+
+# Result pages of recent searches, shared by every request in this process
+search_cache = LRUCache(settings.search_cache_size, settings.search_cache_ttl_seconds)
 
 class ProductSearchService:
     def __init__(self, db: Session):
@@ -15,26 +32,112 @@ class ProductSearchService:
         max_price: Optional[float] = None,
         brand: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> List[Product]:
         """Search products with various filters"""
-        
-        db_query = self.db.query(Product).filter(Product.is_active == True)
-        
-        # Text search
-        if query:
-            db_query = db_query.filter(
-                or_(
-                    Product.title.ilike(f"%{query}%"),
-                    Product.description.ilike(f"%{query}%"),
-                    Product.category.ilike(f"%{query}%"),
-                    Product.brand.ilike(f"%{query}%")
+        products, _ = self.search_products_page(
+            query=query,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            brand=brand,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+        return products
+
+    def search_products_page(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brand: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Product], Optional[str]]:
+        """Search products and return the page with a cursor for the next one"""
+        # Keyed on the catalog version so any product write invalidates older pages
+        key = (
+            catalog_version(),
+            settings.search_backend,
+            settings.fuzzy_search_enabled,
+            settings.semantic_search_enabled,
+            " ".join(query.lower().split()) if query else None,
+            category.lower() if category else None,
+            min_price,
+            max_price,
+            brand.lower() if brand else None,
+            limit,
+            offset,
+            cursor
+        )
+        cached = search_cache.get(key)
+        if cached is not None:
+            rows, next_cursor = cached
+            return [self._attach(row) for row in rows], next_cursor
+
+        products, next_cursor = self._search_page(
+            query, category, min_price, max_price, brand, limit, offset, cursor
+        )
+
+        # Retry queries that matched nothing with misspelled words corrected
+        if not products and query and settings.fuzzy_search_enabled and fuzzy_index.ready:
+            corrected = fuzzy_index.correct(query)
+            if corrected:
+                products, next_cursor = self._search_page(
+                    corrected, category, min_price, max_price, brand, limit, offset, cursor
                 )
+
+        # Fill a short first page with products that are semantically close to the query
+        if (query and not cursor and offset == 0 and len(products) < limit
+                and settings.semantic_search_enabled and semantic_index.ready):
+            products = products + self._semantic_products(
+                query, category, min_price, max_price, brand,
+                limit - len(products), {product.id for product in products}
             )
-        
-        # Category filter
+            next_cursor = None
+
+        search_cache.put(key, ([self._detach(product) for product in products], next_cursor))
+        return products, next_cursor
+
+    def _semantic_products(
+        self,
+        query: str,
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        brand: Optional[str],
+        limit: int,
+        exclude: Set[int]
+    ) -> List[Product]:
+        # Over-fetch neighbours since the filters below may drop some of them
+        neighbours = semantic_index.search(query, limit=limit * 5 + len(exclude))
+        product_ids = [product_id for product_id, _ in neighbours if product_id not in exclude]
+        if not product_ids:
+            return []
+        db_query = self.db.query(Product).filter(Product.id.in_(product_ids), Product.is_active == True)
+        products = self._apply_filters(db_query, category, min_price, max_price, brand).all()
+        by_id = {product.id: product for product in products}
+        return [by_id[product_id] for product_id in product_ids if product_id in by_id][:limit]
+
+    def _apply_filters(
+        self,
+        db_query,
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        brand: Optional[str]
+    ):
+        # Category filter; exact catalog values, as the chat extractor returns, can use the index
         if category:
-            db_query = db_query.filter(Product.category.ilike(f"%{category}%"))
+            if facet_index.contains("category", category):
+                db_query = db_query.filter(Product.category == category)
+            else:
+                db_query = db_query.filter(Product.category.ilike(f"%{category}%"))
         
         # Price range filters
         if min_price is not None:
@@ -45,20 +148,278 @@ class ProductSearchService:
         
         # Brand filter
         if brand:
-            db_query = db_query.filter(Product.brand.ilike(f"%{brand}%"))
+            if facet_index.contains("brand", brand):
+                db_query = db_query.filter(Product.brand == brand)
+            else:
+                db_query = db_query.filter(Product.brand.ilike(f"%{brand}%"))
+        return db_query
+
+    def _substring_match(self, query: str):
+        return or_(
+            Product.title.ilike(f"%{query}%"),
+            Product.description.ilike(f"%{query}%"),
+            Product.category.ilike(f"%{query}%"),
+            Product.brand.ilike(f"%{query}%")
+        )
+
+    def _detach(self, product: Product) -> Dict[str, Any]:
+        return {column.key: getattr(product, column.key) for column in Product.__mapper__.column_attrs}
+
+    def _attach(self, row: Dict[str, Any]) -> Product:
+        """Add a cached product to this session without loading it again"""
+        product = Product(**row)
+        make_transient_to_detached(product)
+        return self.db.merge(product, load=False)
+
+    def _search_page(
+        self,
+        query: Optional[str],
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        brand: Optional[str],
+        limit: int,
+        offset: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[Product], Optional[str]]:
+        backend = settings.search_backend
+        after = None
+        if cursor:
+            position = decode_cursor(cursor)
+            if "o" in position:
+                offset = int(position["o"])
+            elif isinstance(position.get("k"), list) and len(position["k"]) == 3:
+                after = position["k"]
+            else:
+                raise ValueError("Invalid cursor")
+
+        # Rank text queries with the in-memory index once it has been built
+        if query and backend == "memory" and product_index.ready:
+            if after is not None:
+                # A cursor from the listing order (say, issued while the index was loading) has no
+                # position in the ranked order
+                raise ValueError("Invalid cursor")
+            product_ids = product_index.search(
+                query,
+                category=category,
+                min_price=min_price,
+                max_price=max_price,
+                brand=brand,
+                limit=limit,
+                offset=offset
+            )
+            products = self.get_products_by_ids(product_ids)
+            return products, self._offset_cursor(product_ids, offset, limit)
+
+        # Pure filter queries are answered from the columnar snapshot without a table scan
+        if not query and settings.catalog_snapshot_enabled and catalog_snapshot.ready:
+            catalog_snapshot.refresh_if_stale(self.db, settings.catalog_snapshot_refresh_seconds)
+            product_ids = catalog_snapshot.search(
+                category=category,
+                min_price=min_price,
+                max_price=max_price,
+                brand=brand,
+                limit=limit,
+                offset=0 if after is not None else offset,
+                after=(
+                    float(after[0]), datetime.fromisoformat(after[1]).timestamp(), int(after[2])
+                ) if after is not None else None
+            )
+            products = self.get_products_by_ids(product_ids)
+            return products, self._keyset_cursor(products, limit)
         
-        # Order by relevance (rating, then by newest)
-        db_query = db_query.order_by(Product.rating.desc(), Product.created_at.desc())
+        db_query = self.db.query(Product).filter(Product.is_active == True)
         
-        return db_query.offset(offset).limit(limit).all()
+        # Text search, falling back to substring matching without a full-text index
+        ranked = False
+        if query and backend == "fulltext" and fulltext_search.available:
+            db_query = fulltext_search.apply(db_query, query)
+            ranked = True
+        elif query:
+            db_query = db_query.filter(self._substring_match(query))
+        
+        db_query = self._apply_filters(db_query, category, min_price, max_price, brand)
+        
+        # Order by relevance (rating, then by newest); full-text matches are already ranked
+        db_query = db_query.order_by(Product.rating.desc(), Product.created_at.desc(), Product.id.desc())
+
+        if ranked:
+            if after is not None:
+                raise ValueError("Invalid cursor")
+            products = db_query.offset(offset).limit(limit).all()
+            return products, self._offset_cursor(products, offset, limit)
+
+        # Continue after the last row of the previous page instead of skipping rows
+        if after is not None:
+            db_query = db_query.filter(self._after_sort_key(*after))
+        else:
+            db_query = db_query.offset(offset)
+
+        if self.db.bind.dialect.name != "sqlite":
+            products = db_query.limit(limit).all()
+            return products, self._keyset_cursor(products, limit)
+        # SQLite sorts timestamps as the text it stored, so the cursor carries that text
+        rows = db_query.add_columns(type_coerce(Product.created_at, String)).limit(limit).all()
+        products = [product for product, _ in rows]
+        return products, self._keyset_cursor(products, limit, rows[-1][1] if rows else None)
+
+    def _keyset_cursor(self, page: List[Product], limit: int, created_at: Optional[str] = None) -> Optional[str]:
+        if page and len(page) == limit:
+            last = page[-1]
+            return encode_cursor({"k": [last.rating, created_at or last.created_at.isoformat(), last.id]})
+        return None
+
+    def _offset_cursor(self, page: list, offset: int, limit: int) -> Optional[str]:
+        if page and len(page) == limit:
+            return encode_cursor({"o": offset + limit})
+        return None
+
+    def _after_sort_key(self, rating: float, created_at: str, product_id: int):
+        """Filter for rows sorting after (rating, created_at, id) in descending order"""
+        created_column = Product.created_at
+        created_value: Any = datetime.fromisoformat(created_at)
+        if self.db.bind.dialect.name == "sqlite":
+            # Compare the raw stored text, as ORDER BY does, so the index applies and fractions of
+            # a second count; cursors from the snapshot carry ISO text instead, and are converted to
+            # the format written by the server default, or by SQLAlchemy when there is a fraction
+            created_column = type_coerce(Product.created_at, String)
+            if "T" in created_at:
+                created_value = created_value.strftime(
+                    "%Y-%m-%d %H:%M:%S.%f" if created_value.microsecond else "%Y-%m-%d %H:%M:%S"
+                )
+            else:
+                created_value = created_at
+        # The leading rating bound lets the listing index start its scan at the cursor
+        return and_(
+            Product.rating <= rating,
+            or_(
+                Product.rating < rating,
+                and_(Product.rating == rating, created_column < created_value),
+                and_(Product.rating == rating, created_column == created_value, Product.id < product_id)
+            )
+        )
+
+    def get_products_by_ids(self, product_ids: List[int]) -> List[Product]:
+        """Load active products by id, keeping the order of the given ids"""
+        if not product_ids:
+            return []
+        products = self.db.query(Product)\
+            .filter(Product.id.in_(product_ids), Product.is_active == True)\
+            .all()
+        by_id = {product.id: product for product in products}
+        return [by_id[product_id] for product_id in product_ids if product_id in by_id]
+
+    def get_facets(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brand: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Count matching products per category, brand and price bucket"""
+        if facet_index.ready and (product_index.ready or not query):
+            counts = facet_index.counts(
+                category=category,
+                brand=brand,
+                min_price=min_price,
+                max_price=max_price,
+                product_ids=product_index.match(query) if query else None
+            )
+        else:
+            # The indexes are still being built at startup
+            counts = self._count_facets(query, category, min_price, max_price, brand)
+
+        def ranked(values: Dict[str, int]) -> List[Dict[str, Any]]:
+            return [
+                {"value": value, "count": count}
+                for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+            ]
+
+        price_histogram = []
+        for bucket, lower in enumerate(PRICE_BUCKETS):
+            upper = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+            price_histogram.append({
+                "min_price": lower,
+                "max_price": upper,
+                "count": counts["price_buckets"].get(bucket, 0)
+            })
+
+        return {
+            "total": counts["total"],
+            "categories": ranked(counts["categories"]),
+            "brands": ranked(counts["brands"]),
+            "price_histogram": price_histogram
+        }
+
+    def _count_facets(
+        self,
+        query: Optional[str],
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        brand: Optional[str]
+    ) -> Dict[str, Any]:
+        """The counts of facet_index.counts, from GROUP BY queries"""
+        matching = [Product.is_active == True]
+        if query:
+            matching.append(self._substring_match(query))
+        by_category = [Product.category.ilike(f"%{category}%")] if category else []
+        by_brand = [Product.brand.ilike(f"%{brand}%")] if brand else []
+        by_price = []
+        if min_price is not None:
+            by_price.append(Product.price >= min_price)
+        if max_price is not None:
+            by_price.append(Product.price <= max_price)
+        price_bucket = case(
+            *[(Product.price >= lower, bucket) for bucket, lower in reversed(list(enumerate(PRICE_BUCKETS)))],
+            else_=0
+        )
+
+        def grouped(column, conditions: list) -> Dict[Any, int]:
+            rows = self.db.query(column, func.count(Product.id)).filter(*conditions).group_by(column)
+            return {value: count for value, count in rows if value is not None}
+
+        return {
+            "total": self.db.query(func.count(Product.id)).filter(*matching, *by_category, *by_brand, *by_price).scalar(),
+            "categories": grouped(Product.category, matching + by_brand + by_price),
+            "brands": grouped(Product.brand, matching + by_category + by_price),
+            "price_buckets": grouped(price_bucket, matching + by_category + by_brand)
+        }
+
+    def suggest(self, prefix: str, limit: int) -> List[Dict[str, str]]:
+        """Completions ranked like suggest_index's, matching the start of any word in the database"""
+        text = " ".join(prefix.lower().split())
+        if not text:
+            return []
+        if prefix[-1:].isspace():
+            text += " "
+        weight = func.sum(func.coalesce(Product.rating, 0.0) + 1.0)
+        phrases: Dict[str, Tuple[float, str, str]] = {}
+        for kind, column in (("title", Product.title), ("brand", Product.brand), ("category", Product.category)):
+            rows = self.db.query(column, weight)\
+                .filter(Product.is_active == True, or_(column.ilike(f"{text}%"), column.ilike(f"% {text}%")))\
+                .group_by(column)\
+                .order_by(weight.desc())\
+                .limit(limit)
+            for value, value_weight in rows:
+                key = " ".join(value.lower().split())
+                if key not in phrases or phrases[key][0] < value_weight:
+                    phrases[key] = (value_weight, value, kind)
+        ranked = sorted(phrases.values(), key=lambda phrase: (-phrase[0], phrase[1]))
+        return [{"text": value, "kind": kind} for _, value, kind in ranked[:limit]]
 
     def get_categories(self) -> List[str]:
         """Get all unique product categories"""
+        if facet_index.ready:
+            return facet_index.values("category")
         categories = self.db.query(Product.category).distinct().all()
         return [cat[0] for cat in categories if cat[0]]
 
     def get_brands(self) -> List[str]:
         """Get all unique product brands"""
+        if facet_index.ready:
+            return facet_index.values("brand")
         brands = self.db.query(Product.brand).distinct().all()
         return [brand[0] for brand in brands if brand[0]]
 
@@ -78,3 +439,52 @@ class ProductSearchService:
             ))\
             .order_by(Product.rating.desc())\
             .limit(limit).all()
+
+def _with_session(function: Callable[[Session], Any]) -> Any:
+    db = SessionLocal()
+    try:
+        return function(db)
+    finally:
+        db.close()
+
+class AsyncProductSearchService:
+    """ProductSearchService for routes holding an AsyncSession
+
+    Searches and facets run the sync service, with its caches and indexes,
+    on the threadpool with a session of their own: ranking and filtering
+    are CPU work that would hold the event loop, and AsyncSession.run_sync
+    runs on the loop's thread. Plain lookups are async queries.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search_products_page(self, **filters: Any) -> Tuple[List[Product], Optional[str]]:
+        return await run_in_threadpool(_with_session, lambda db: ProductSearchService(db).search_products_page(**filters))
+
+    async def get_facets(self, **filters: Any) -> Dict[str, Any]:
+        return await run_in_threadpool(_with_session, lambda db: ProductSearchService(db).get_facets(**filters))
+
+    async def get_products_by_ids(self, product_ids: List[int]) -> List[Product]:
+        """Load active products by id, keeping the order of the given ids"""
+        if not product_ids:
+            return []
+        products = await self.db.scalars(
+            select(Product).where(Product.id.in_(product_ids), Product.is_active == True)
+        )
+        by_id = {product.id: product for product in products}
+        return [by_id[product_id] for product_id in product_ids if product_id in by_id]
+
+    async def get_categories(self) -> List[str]:
+        """Get all unique product categories"""
+        if facet_index.ready:
+            return facet_index.values("category")
+        categories = await self.db.scalars(select(Product.category).distinct())
+        return [category for category in categories if category]
+
+    async def get_brands(self) -> List[str]:
+        """Get all unique product brands"""
+        if facet_index.ready:
+            return facet_index.values("brand")
+        brands = await self.db.scalars(select(Product.brand).distinct())
+        return [brand for brand in brands if brand]
@@ -0,0 +1,154 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
+from ..core.config import settings
+from ..models.cart import CartItem
+
+class RelatedProducts:
+    """Products frequently added together, from the item-item co-occurrence of carts
+
+    Two products co-occur once for every cart holding both. The full sparse
+    co-occurrence counts are kept as one dict of neighbour counts per
+    product, and each product's top_n neighbours are precomputed into a row
+    of two fixed-width arrays, so a lookup is a dict probe and a row slice.
+    A cart add bumps the counts of the new product against the rest of the
+    cart and recomputes only the rows of those products; removals don't
+    undo co-occurrences, and the offline build re-baselines from the
+    cart_items table.
+    """
+
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self.ready = False
+        self._lock = threading.Lock()
+        self._pairs: Dict[int, Dict[int, int]] = {}
+        self._rows: Dict[int, int] = {}
+        self._pair_count = 0
+        self._neighbors = np.full((0, top_n), -1, dtype=np.int32)
+        self._counts = np.zeros((0, top_n), dtype=np.int32)
+
+    def build(self, db: Session) -> None:
+        """Count every co-occurring pair in the cart_items table"""
+        other = aliased(CartItem)
+        rows = db.query(CartItem.product_id, other.product_id, func.count())\
+            .join(other, (other.user_id == CartItem.user_id) & (other.product_id != CartItem.product_id))\
+            .group_by(CartItem.product_id, other.product_id)
+        pairs: Dict[int, Dict[int, int]] = {}
+        for product_id, other_id, count in rows.yield_per(10000):
+            pairs.setdefault(product_id, {})[other_id] = count
+        self._load_pairs(pairs)
+
+    def save(self, path: str) -> None:
+        """Write the co-occurrence counts as CSR arrays"""
+        with self._lock:
+            product_ids = np.array(sorted(self._pairs), dtype=np.int64)
+            indptr = np.zeros(len(product_ids) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(self._pairs[product_id]) for product_id in product_ids])
+            indices = np.fromiter(
+                (other for product_id in product_ids for other in self._pairs[product_id]),
+                dtype=np.int64, count=int(indptr[-1])
+            )
+            data = np.fromiter(
+                (count for product_id in product_ids for count in self._pairs[product_id].values()),
+                dtype=np.int64, count=int(indptr[-1])
+            )
+        np.savez_compressed(path, product_ids=product_ids, indptr=indptr, indices=indices, data=data)
+
+    def load(self, path: str) -> bool:
+        """Load counts written by save(); returns False if the file is missing"""
+        try:
+            with np.load(path) as saved:
+                product_ids, indptr = saved["product_ids"], saved["indptr"]
+                indices, data = saved["indices"].tolist(), saved["data"].tolist()
+        except FileNotFoundError:
+            return False
+        pairs = {
+            int(product_id): dict(zip(indices[start:end], data[start:end]))
+            for product_id, start, end in zip(product_ids, indptr[:-1], indptr[1:])
+        }
+        self._load_pairs(pairs)
+        return True
+
+    def _load_pairs(self, pairs: Dict[int, Dict[int, int]]) -> None:
+        neighbors = np.full((len(pairs), self.top_n), -1, dtype=np.int32)
+        counts = np.zeros((len(pairs), self.top_n), dtype=np.int32)
+        rows = {}
+        for row, (product_id, others) in enumerate(pairs.items()):
+            rows[product_id] = row
+            self._fill_row(neighbors, counts, row, others)
+        with self._lock:
+            self._pairs, self._rows, self._neighbors, self._counts = pairs, rows, neighbors, counts
+            self._pair_count = sum(len(others) for others in pairs.values())
+            self.ready = True
+
+    def _fill_row(self, neighbors: np.ndarray, counts: np.ndarray, row: int, others: Dict[int, int]) -> None:
+        # Most co-occurrences first, older (lower) ids breaking ties
+        top = heapq.nsmallest(self.top_n, others.items(), key=lambda item: (-item[1], item[0]))
+        neighbors[row] = -1
+        counts[row] = 0
+        if top:
+            neighbors[row, :len(top)] = [other for other, _ in top]
+            counts[row, :len(top)] = [count for _, count in top]
+
+    def _row(self, product_id: int) -> int:
+        row = self._rows.get(product_id)
+        if row is None:
+            row = len(self._rows)
+            # Grown before the row is published, so lookups never see a row past the arrays
+            if row == len(self._neighbors):
+                grown = max(16, 2 * row)
+                self._neighbors = np.concatenate([
+                    self._neighbors, np.full((grown - row, self.top_n), -1, dtype=np.int32)
+                ])
+                self._counts = np.concatenate([self._counts, np.zeros((grown - row, self.top_n), dtype=np.int32)])
+            self._rows[product_id] = row
+        return row
+
+    def record_add(self, product_id: int, cart_product_ids: Iterable[int]) -> None:
+        """Count a product newly added to a cart that already holds cart_product_ids"""
+        with self._lock:
+            touched = set()
+            for other_id in cart_product_ids:
+                if other_id == product_id:
+                    continue
+                for first, second in ((product_id, other_id), (other_id, product_id)):
+                    others = self._pairs.setdefault(first, {})
+                    if second not in others:
+                        self._pair_count += 1
+                    others[second] = others.get(second, 0) + 1
+                touched.add(other_id)
+            if touched:
+                touched.add(product_id)
+            for touched_id in touched:
+                row = self._row(touched_id)
+                self._fill_row(self._neighbors, self._counts, row, self._pairs[touched_id])
+
+    def related(self, product_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+        """(product id, co-occurrence count) of the products most often added with product_id"""
+        row = self._rows.get(product_id)
+        if row is None:
+            return []
+        neighbors, counts = self._neighbors[row, :limit], self._counts[row, :limit]
+        return [(int(other), int(count)) for other, count in zip(neighbors, counts) if other >= 0]
+
+    def related_to_many(self, product_ids: Iterable[int], limit: int = 10) -> List[Tuple[int, int]]:
+        """Neighbours of several products with their counts summed, excluding the products themselves"""
+        product_ids = set(product_ids)
+        totals: Dict[int, int] = {}
+        for product_id in product_ids:
+            for other, count in self.related(product_id, self.top_n):
+                if other not in product_ids:
+                    totals[other] = totals.get(other, 0) + count
+        return heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], item[0]))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "products": len(self._rows),
+            "pairs": self._pair_count,
+            "top_n": self.top_n
+        }
+
+related_products = RelatedProducts(settings.related_products_top_n)
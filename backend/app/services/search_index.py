@@ -0,0 +1,277 @@
+import math
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from .catalog_events import register_index
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no product meaning in chat messages
+STOPWORDS = frozenset([
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "for",
+    "from", "find", "get", "have", "i", "in", "is", "it", "like", "looking",
+    "me", "my", "need", "of", "on", "or", "please", "search", "show", "some",
+    "something", "the", "to", "under", "want", "what", "with", "you"
+])
+
+@lru_cache(maxsize=65536)
+def normalize_token(token: str) -> str:
+    """Reduce simple plurals so 'laptops' matches 'laptop'"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and token[-2] not in "sui":
+        return token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalized search terms"""
+    if not text:
+        return []
+    return [
+        normalize_token(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+class ProductIndex:
+    """Tokenized inverted index over the active catalog ranked with BM25
+
+    Products occupy slots in NumPy columns, and each term's postings are
+    arrays of slots and term frequencies, so a query scores every matching
+    product with a few vector operations per term. Writes free a product's
+    slot and append the new version to the postings; freed slots are
+    compacted away once they make up a quarter of the index.
+    """
+
+    TITLE_WEIGHT = 2
+    # Freed slots tolerated before the postings are compacted
+    MIN_COMPACT_SLOTS = 1024
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ready = False
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._document_frequency: Dict[str, int] = {}
+        self._slots: Dict[int, int] = {}
+        self._terms: Dict[int, Tuple[str, ...]] = {}
+        self._values: Dict[str, List[str]] = {"category": [], "brand": []}
+        self._codes: Dict[str, Dict[str, int]] = {"category": {}, "brand": {}}
+        self._size = 0
+        self._freed = 0
+        self._total_length = 0
+        self._columns = self._allocate(0)
+
+    @staticmethod
+    def _allocate(capacity: int) -> Dict[str, np.ndarray]:
+        return {
+            "id": np.zeros(capacity, dtype=np.int64),
+            "length": np.zeros(capacity, dtype=np.float64),
+            "price": np.zeros(capacity, dtype=np.float64),
+            "rating": np.zeros(capacity, dtype=np.float64),
+            "created_at": np.zeros(capacity, dtype=np.float64),
+            "category": np.zeros(capacity, dtype=np.int32),
+            "brand": np.zeros(capacity, dtype=np.int32),
+            "live": np.zeros(capacity, dtype=bool)
+        }
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given product records"""
+        with self._lock:
+            self._reset()
+            self._add_all(list(records))
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            # The last write of a product wins, as when records were applied one at a time
+            latest = {record["id"]: record for record in upserts}
+            for product_id in latest:
+                self._remove(product_id)
+            self._add_all(list(latest.values()))
+            if self._freed >= max(self.MIN_COMPACT_SLOTS, self._size // 4):
+                self._compact()
+
+    def _document_terms(self, record: Dict[str, Any]) -> Counter:
+        terms = Counter()
+        for term in tokenize(record["title"]):
+            terms[term] += self.TITLE_WEIGHT
+        for field in ("brand", "category", "description"):
+            terms.update(tokenize(record[field]))
+        return terms
+
+    def _code(self, field: str, value: Optional[str]) -> int:
+        value = (value or "").lower()
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[field])
+            self._values[field].append(value)
+        return code
+
+    def _add_all(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        start = self._size
+        end = start + len(records)
+        capacity = len(self._columns["id"])
+        if end > capacity:
+            grown = self._allocate(max(end, capacity * 2))
+            for name, column in self._columns.items():
+                grown[name][:start] = column[:start]
+            self._columns = grown
+
+        # Postings of the whole batch are gathered first and appended once per term
+        new_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        columns = self._columns
+        for slot, record in enumerate(records, start):
+            product_id = record["id"]
+            terms = self._document_terms(record)
+            for term, frequency in terms.items():
+                slots, frequencies = new_postings.setdefault(term, ([], []))
+                slots.append(slot)
+                frequencies.append(frequency)
+                self._document_frequency[term] = self._document_frequency.get(term, 0) + 1
+            length = sum(terms.values())
+            created_at = record["created_at"]
+            columns["id"][slot] = product_id
+            columns["length"][slot] = length
+            columns["price"][slot] = record["price"]
+            columns["rating"][slot] = record["rating"] or 0.0
+            columns["created_at"][slot] = created_at.timestamp() if created_at else 0.0
+            columns["category"][slot] = self._code("category", record["category"])
+            columns["brand"][slot] = self._code("brand", record["brand"])
+            columns["live"][slot] = True
+            self._slots[product_id] = slot
+            self._terms[product_id] = tuple(terms)
+            self._total_length += length
+        self._size = end
+
+        for term, (slots, frequencies) in new_postings.items():
+            slots = np.array(slots, dtype=np.int32)
+            frequencies = np.array(frequencies, dtype=np.float32)
+            existing = self._postings.get(term)
+            if existing is not None:
+                slots = np.concatenate((existing[0], slots))
+                frequencies = np.concatenate((existing[1], frequencies))
+            self._postings[term] = (slots, frequencies)
+
+    def _remove(self, product_id: int) -> None:
+        slot = self._slots.pop(product_id, None)
+        if slot is None:
+            return
+        # The slot stays in the postings until the next compaction; queries skip it
+        self._columns["live"][slot] = False
+        for term in self._terms.pop(product_id):
+            remaining = self._document_frequency[term] - 1
+            if remaining:
+                self._document_frequency[term] = remaining
+            else:
+                del self._document_frequency[term]
+        self._total_length -= self._columns["length"][slot]
+        self._freed += 1
+
+    def _compact(self) -> None:
+        """Drop freed slots, renumbering the live ones"""
+        live = np.flatnonzero(self._columns["live"][:self._size])
+        renumbered = np.full(self._size, -1, dtype=np.int32)
+        renumbered[live] = np.arange(len(live), dtype=np.int32)
+        postings = {}
+        for term, (slots, frequencies) in self._postings.items():
+            kept = self._columns["live"][slots]
+            if kept.any():
+                postings[term] = (renumbered[slots[kept]], frequencies[kept])
+        self._postings = postings
+        self._columns = {name: column[live] for name, column in self._columns.items()}
+        self._slots = {product_id: slot for slot, product_id in enumerate(self._columns["id"].tolist())}
+        self._size = len(live)
+        self._freed = 0
+
+    def match(self, query: str) -> Set[int]:
+        """Return the ids of every product containing at least one query term"""
+        with self._lock:
+            matched = [self._postings[term][0] for term in set(tokenize(query)) if term in self._postings]
+            if not matched:
+                return set()
+            slots = np.concatenate(matched)
+            slots = slots[self._columns["live"][slots]]
+            return set(self._columns["id"][slots].tolist())
+
+    def _value_codes(self, field: str, value: str) -> np.ndarray:
+        # Filters match substrings, so test each distinct value once rather than every product
+        return np.array([code for code, text in enumerate(self._values[field]) if value in text], dtype=np.int32)
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        brand: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[int]:
+        """Return product ids matching the query, best BM25 score first"""
+        terms = set(tokenize(query))
+        category = category.lower() if category else None
+        brand = brand.lower() if brand else None
+
+        with self._lock:
+            total = len(self._slots)
+            if not terms or not total:
+                return []
+            average_length = self._total_length / total
+            columns = self._columns
+
+            # Every BM25 term contribution is positive, so a nonzero score marks a match
+            scores = np.zeros(self._size, dtype=np.float64)
+            for term in terms:
+                frequency_of_term = self._document_frequency.get(term)
+                if not frequency_of_term:
+                    continue
+                slots, frequencies = self._postings[term]
+                idf = math.log(1 + (total - frequency_of_term + 0.5) / (frequency_of_term + 0.5))
+                length_norm = 1 - self.b + self.b * columns["length"][slots] / average_length
+                scores[slots] += idf * (frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm))
+
+            candidates = np.flatnonzero(scores)
+            keep = columns["live"][candidates]
+            if category:
+                keep &= np.isin(columns["category"][candidates], self._value_codes("category", category))
+            if brand:
+                keep &= np.isin(columns["brand"][candidates], self._value_codes("brand", brand))
+            if min_price is not None:
+                keep &= columns["price"][candidates] >= min_price
+            if max_price is not None:
+                keep &= columns["price"][candidates] <= max_price
+            candidates = candidates[keep]
+
+            # Only the page's worth of best scores, plus ties with the last of them, gets sorted
+            wanted = offset + limit
+            candidate_scores = scores[candidates]
+            if len(candidates) > wanted > 0:
+                threshold = np.partition(candidate_scores, len(candidates) - wanted)[len(candidates) - wanted]
+                best = candidate_scores >= threshold
+                candidates = candidates[best]
+                candidate_scores = candidate_scores[best]
+
+            # Best score first, then rating, newest and highest id
+            order = np.lexsort((
+                columns["id"][candidates],
+                columns["created_at"][candidates],
+                columns["rating"][candidates],
+                candidate_scores
+            ))[::-1]
+            return columns["id"][candidates[order]][offset:wanted].tolist()
+
+product_index = register_index(ProductIndex())
@@ -0,0 +1,272 @@
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from .catalog_events import register_index
+from .search_index import tokenize
+
+def _document_terms(record: Dict[str, Any]) -> Counter:
+    terms = Counter()
+    for term in tokenize(record["title"]):
+        terms[term] += 2
+    for field in ("brand", "category", "description"):
+        terms.update(tokenize(record[field]))
+    return terms
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class _SparseRows:
+    """Compressed sparse rows of the TF-IDF matrix, multiplied in chunks to bound memory"""
+
+    CHUNK_NONZEROS = 1 << 20
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, columns: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.rows = len(indptr) - 1
+        self.columns = columns
+
+    def _chunks(self):
+        start = 0
+        while start < self.rows:
+            end = int(np.searchsorted(self.indptr, self.indptr[start] + self.CHUNK_NONZEROS, side="right"))
+            end = min(max(end - 1, start + 1), self.rows)
+            yield start, end
+            start = end
+
+    def dot(self, dense: np.ndarray) -> np.ndarray:
+        """self @ dense"""
+        out = np.zeros((self.rows, dense.shape[1]), dtype=np.float32)
+        for start, end in self._chunks():
+            low, high = self.indptr[start], self.indptr[end]
+            if low == high:
+                continue
+            products = self.data[low:high, None] * dense[self.indices[low:high]]
+            starts = self.indptr[start:end] - low
+            filled = starts < (self.indptr[start + 1:end + 1] - low)
+            out[start:end][filled] = np.add.reduceat(products, starts[filled])
+        return out
+
+    def tdot(self, dense: np.ndarray) -> np.ndarray:
+        """self.T @ dense"""
+        out = np.zeros((self.columns, dense.shape[1]), dtype=np.float32)
+        for start, end in self._chunks():
+            low, high = self.indptr[start], self.indptr[end]
+            if low == high:
+                continue
+            row_ids = np.repeat(np.arange(start, end), np.diff(self.indptr[start:end + 1]))
+            products = self.data[low:high, None] * dense[row_ids]
+            order = np.argsort(self.indices[low:high], kind="stable")
+            columns = self.indices[low:high][order]
+            boundaries = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+            out[columns[boundaries]] += np.add.reduceat(products[order], boundaries)
+        return out
+
+class SemanticIndex:
+    """Latent semantic vectors of the active catalog with an IVF nearest neighbour index
+
+    Product text is weighted with TF-IDF and projected onto the leading
+    singular vectors of the catalog's term matrix (LSA), so products that
+    share related vocabulary land close together. Vectors are grouped under
+    k-means centroids and a query only scans the lists of its nearest ones.
+    Products added later are folded into the existing vocabulary and
+    projection; words first seen after the last rebuild are ignored.
+    """
+
+    DIMENSIONS = 128
+    MAX_TERMS = 20000
+    NPROBE = 8
+    KMEANS_ITERATIONS = 10
+    FIT_SAMPLE = 10000
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._terms: Dict[str, int] = {}
+        self._idf: List[float] = []
+        self._components = np.zeros((0, 0), dtype=np.float32)
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._lists: List[np.ndarray] = []
+        self._rows: Dict[int, int] = {}
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._assignment = np.zeros(0, dtype=np.int32)
+        self._free_rows: List[int] = []
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Fit the vocabulary and projection to the given product records and index them"""
+        if not settings.semantic_search_enabled:
+            return
+        documents = [(record["id"], _document_terms(record)) for record in records]
+        with self._lock:
+            self._clear()
+            if not documents:
+                self.ready = True
+                return
+
+            document_frequency = Counter()
+            for _, terms in documents:
+                document_frequency.update(terms.keys())
+            vocabulary = [term for term, _ in document_frequency.most_common(self.MAX_TERMS)]
+            self._terms = {term: column for column, term in enumerate(vocabulary)}
+            total = len(documents)
+            self._idf = [math.log((1 + total) / (1 + document_frequency[term])) + 1 for term in vocabulary]
+
+            # The projection is fitted on a sample; every product is then projected with it
+            rng = np.random.default_rng(0)
+            sample = rng.choice(total, min(total, self.FIT_SAMPLE), replace=False)
+            self._components = self._fit_components(self._tfidf([documents[i][1] for i in sample]))
+            matrix = self._tfidf([terms for _, terms in documents])
+            vectors = _normalize_rows(matrix.dot(self._components))
+            self._centroids = self._fit_centroids(vectors)
+
+            self._ids = np.array([product_id for product_id, _ in documents], dtype=np.int64)
+            self._rows = {product_id: row for row, (product_id, _) in enumerate(documents)}
+            self._vectors = vectors
+            self._assignment = self._nearest_centroids(vectors)
+            order = np.argsort(self._assignment, kind="stable")
+            bounds = np.searchsorted(self._assignment[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        if not self.ready:
+            return
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for record in upserts:
+                self._remove(record["id"])
+                self._add(record)
+
+    def _tfidf(self, documents: List[Counter]) -> _SparseRows:
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for terms in documents:
+            columns = [(self._terms[term], count) for term, count in terms.items() if term in self._terms]
+            weights = [(1 + math.log(count)) * self._idf[column] for column, count in columns]
+            norm = math.sqrt(sum(weight * weight for weight in weights)) or 1.0
+            indices.extend(column for column, _ in columns)
+            data.extend(weight / norm for weight in weights)
+            indptr.append(len(indices))
+        return _SparseRows(
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int64),
+            np.array(data, dtype=np.float32),
+            len(self._terms)
+        )
+
+    def _fit_components(self, matrix: _SparseRows) -> np.ndarray:
+        """Top right singular vectors of the TF-IDF matrix by randomized SVD"""
+        rng = np.random.default_rng(0)
+        width = min(self.DIMENSIONS + 10, matrix.rows, matrix.columns)
+        basis = matrix.tdot(rng.standard_normal((matrix.rows, width)).astype(np.float32))
+        basis, _ = np.linalg.qr(basis)
+        # Power iterations sharpen the estimate when singular values decay slowly
+        for _ in range(2):
+            basis, _ = np.linalg.qr(matrix.tdot(matrix.dot(basis)))
+        projected = matrix.dot(basis).T
+        left, _, _ = np.linalg.svd(projected, full_matrices=False)
+        dimensions = min(self.DIMENSIONS, width)
+        return np.ascontiguousarray((basis @ left[:, :dimensions]).astype(np.float32))
+
+    def _fit_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        """Spherical k-means over a sample of the product vectors"""
+        rng = np.random.default_rng(0)
+        count = max(1, min(len(vectors), int(math.sqrt(len(vectors)))))
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), count * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), count, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            # Keep the previous centroid for clusters that lost every member
+            filled = np.bincount(assignment, minlength=count) > 0
+            centroids[filled] = _normalize_rows(sums[filled])
+        return centroids
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):
+            block = vectors[start:start + 8192]
+            assignment[start:start + len(block)] = np.argmax(block @ self._centroids.T, axis=1)
+        return assignment
+
+    def _embed(self, terms: Counter) -> Optional[np.ndarray]:
+        matrix = self._tfidf([terms])
+        if not len(matrix.data):
+            return None
+        vector = matrix.dot(self._components)[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        vector = self._embed(_document_terms(record))
+        if vector is None or not len(self._centroids):
+            return
+        if not self._free_rows:
+            self._grow()
+        row = self._free_rows.pop()
+        centroid = int(np.argmax(self._centroids @ vector))
+        self._ids[row] = record["id"]
+        self._vectors[row] = vector
+        self._assignment[row] = centroid
+        self._lists[centroid] = np.append(self._lists[centroid], row)
+        self._rows[record["id"]] = row
+
+    def _grow(self) -> None:
+        size = len(self._ids)
+        capacity = max(size * 2, 1024)
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:len(self._ids)] = self._ids
+        vectors = np.zeros((capacity, self._components.shape[1]), dtype=np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        assignment = np.zeros(capacity, dtype=np.int32)
+        assignment[:len(self._assignment)] = self._assignment
+        self._free_rows.extend(range(capacity - 1, size - 1, -1))
+        self._ids, self._vectors, self._assignment = ids, vectors, assignment
+
+    def _remove(self, product_id: int) -> None:
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        centroid = self._assignment[row]
+        self._lists[centroid] = self._lists[centroid][self._lists[centroid] != row]
+        self._free_rows.append(row)
+
+    def search(self, query: str, limit: int = 20, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(product id, cosine similarity) of the nearest products to the query, closest first"""
+        with self._lock:
+            if not self._rows:
+                return []
+            vector = self._embed(Counter(tokenize(query)))
+            if vector is None:
+                return []
+            nprobe = min(nprobe or self.NPROBE, len(self._centroids))
+            probes = np.argpartition(-(self._centroids @ vector), nprobe - 1)[:nprobe]
+            rows = np.concatenate([self._lists[probe] for probe in probes])
+            if not len(rows):
+                return []
+            similarities = self._vectors[rows] @ vector
+            keep = np.flatnonzero(similarities >= settings.semantic_min_similarity)
+            if len(keep) > limit:
+                keep = keep[np.argpartition(-similarities[keep], limit - 1)[:limit]]
+            keep = keep[np.argsort(-similarities[keep], kind="stable")]
+            return [(int(self._ids[rows[i]]), float(similarities[i])) for i in keep]
+
+    def exact_search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """Brute-force search over every indexed product, for measuring ANN recall"""
+        return self.search(query, limit, nprobe=len(self._centroids))
+
+semantic_index = register_index(SemanticIndex())
@@ -0,0 +1,212 @@
+import bisect
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from .catalog_events import register_index
+from .search_index import TOKEN_PATTERN
+
+class SuggestIndex:
+    """Prefix completion over product titles, brands and categories
+
+    Each phrase is indexed under keys starting at each of its first few
+    words, cut to a fixed length. Keys sit in a sorted NumPy array of
+    fixed-width byte strings, so a prefix is one searchsorted range and the
+    index costs a few dozen bytes per key. Keys added by writes go to a
+    small sorted list that is merged into the array once it fills up.
+    Completions of prefixes covering many keys are cached until a phrase
+    under them changes; there are only a few such prefixes.
+    """
+
+    TOP_K = 10
+    MAX_KEY_LENGTH = 24
+    MAX_KEY_WORDS = 3
+    # Prefixes with at least this many keys keep their completions cached
+    CACHE_MIN_KEYS = 2048
+    # Keys added since the last merge before they are merged into the array
+    MAX_PENDING_KEYS = 4096
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._bulk = False
+        self._phrase_ids: Dict[str, int] = {}
+        self._phrases: List[Optional[Tuple[str, str]]] = []
+        self._weights = np.zeros(0, dtype=np.float64)
+        self._free_ids: List[int] = []
+        # Ids of removed phrases whose keys are still in the array; reusable after the next merge
+        self._retired_ids: List[int] = []
+        # Per product: its weight followed by the ids of its phrases
+        self._product_phrases: Dict[int, Tuple[float, ...]] = {}
+        self._keys = np.zeros(0, dtype=f"S{self.MAX_KEY_LENGTH}")
+        self._key_phrases = np.zeros(0, dtype=np.int32)
+        self._pending: List[Tuple[bytes, int]] = []
+        # Keys of a rebuild, in two flat lists until they are sorted into the array
+        self._bulk_keys: List[bytes] = []
+        self._bulk_phrases: List[int] = []
+        self._top: Dict[bytes, Tuple[int, ...]] = {}
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given product records"""
+        with self._lock:
+            self._clear()
+            self._bulk = True
+            for record in records:
+                self._add(record)
+            self._bulk = False
+            self._merge()
+            self.ready = True
+
+    def apply(self, upserts: List[Dict[str, Any]], deleted_ids: List[int]) -> None:
+        """Apply committed product writes"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for record in upserts:
+                self._remove(record["id"])
+                self._add(record)
+            if len(self._pending) >= self.MAX_PENDING_KEYS:
+                self._merge()
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        # Weight phrases by the summed rating of the products that carry them
+        weight = (record["rating"] or 0.0) + 1.0
+        phrase_ids = []
+        for kind in ("title", "brand", "category"):
+            text = record[kind]
+            if text:
+                phrase_id = self._phrase(text, kind)
+                phrase_ids.append(phrase_id)
+                self._reweight(phrase_id, weight)
+        self._product_phrases[record["id"]] = (weight, *phrase_ids)
+
+    def _remove(self, product_id: int) -> None:
+        weight, *phrase_ids = self._product_phrases.pop(product_id, (0.0,))
+        for phrase_id in phrase_ids:
+            self._reweight(phrase_id, -weight)
+
+    def _phrase(self, text: str, kind: str) -> int:
+        key = " ".join(text.lower().split())
+        phrase_id = self._phrase_ids.get(key)
+        if phrase_id is None:
+            if self._free_ids:
+                phrase_id = self._free_ids.pop()
+                self._phrases[phrase_id] = (text, kind)
+            else:
+                phrase_id = len(self._phrases)
+                self._phrases.append((text, kind))
+                if phrase_id == len(self._weights):
+                    self._weights = np.concatenate((self._weights, np.zeros(max(1024, phrase_id))))
+            self._weights[phrase_id] = 0.0
+            self._phrase_ids[key] = phrase_id
+        return phrase_id
+
+    def _keys_of(self, phrase_id: int) -> Set[bytes]:
+        words = TOKEN_PATTERN.findall(self._phrases[phrase_id][0].lower())
+        return {
+            " ".join(words[start:])[:self.MAX_KEY_LENGTH].encode("ascii")
+            for start in range(min(len(words), self.MAX_KEY_WORDS))
+        }
+
+    def _reweight(self, phrase_id: int, delta: float) -> None:
+        old_weight = self._weights[phrase_id]
+        new_weight = old_weight + delta
+        if new_weight < 1e-9:
+            new_weight = 0.0
+        self._weights[phrase_id] = new_weight
+        if self._bulk and old_weight:
+            return
+
+        keys = self._keys_of(phrase_id)
+        if old_weight == 0.0:
+            for key in keys:
+                if self._bulk:
+                    # Sorted once by the merge at the end of a rebuild
+                    self._bulk_keys.append(key)
+                    self._bulk_phrases.append(phrase_id)
+                else:
+                    bisect.insort(self._pending, (key, phrase_id))
+        if not self._bulk:
+            # Cached completions of every prefix of the phrase's keys may have changed
+            for key in keys:
+                for length in range(len(key) + 1):
+                    self._top.pop(key[:length], None)
+
+        if new_weight == 0.0:
+            # Its keys stay behind until the next merge; completions skip phrases without weight
+            text, _ = self._phrases[phrase_id]
+            del self._phrase_ids[" ".join(text.lower().split())]
+            self._phrases[phrase_id] = None
+            self._retired_ids.append(phrase_id)
+
+    def _merge(self) -> None:
+        """Fold pending keys into the sorted array, dropping keys of removed phrases"""
+        keys = np.concatenate((
+            self._keys,
+            np.array(self._bulk_keys + [key for key, _ in self._pending], dtype=self._keys.dtype)
+        ))
+        phrase_ids = np.concatenate((
+            self._key_phrases,
+            np.array(self._bulk_phrases + [phrase_id for _, phrase_id in self._pending], dtype=np.int32)
+        ))
+        self._bulk_keys, self._bulk_phrases = [], []
+        live = self._weights[phrase_ids] > 0
+        keys, phrase_ids = keys[live], phrase_ids[live]
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._key_phrases = phrase_ids[order]
+        self._pending = []
+        self._free_ids.extend(self._retired_ids)
+        self._retired_ids = []
+
+    def _candidates(self, key: bytes) -> np.ndarray:
+        """Phrase ids of every key starting with key"""
+        start = np.searchsorted(self._keys, key, "left")
+        if len(key) < self.MAX_KEY_LENGTH:
+            end = np.searchsorted(self._keys, key + b"\xff", "left")
+        else:
+            end = np.searchsorted(self._keys, key, "right")
+        pending_start = bisect.bisect_left(self._pending, (key,))
+        pending_end = bisect.bisect_left(self._pending, (key + b"\xff",))
+        candidates = self._key_phrases[start:end]
+        if pending_end > pending_start:
+            pending = [phrase_id for _, phrase_id in self._pending[pending_start:pending_end]]
+            candidates = np.concatenate((candidates, np.array(pending, dtype=np.int32)))
+        return candidates
+
+    def _rank(self, candidates: np.ndarray) -> Tuple[int, ...]:
+        phrase_ids = np.unique(candidates)
+        weights = self._weights[phrase_ids]
+        live = weights > 0
+        phrase_ids, weights = phrase_ids[live], weights[live]
+        if len(phrase_ids) > self.TOP_K:
+            # Everything tied with the last of the best K, so the name order among ties holds
+            threshold = np.partition(weights, len(weights) - self.TOP_K)[len(weights) - self.TOP_K]
+            phrase_ids = phrase_ids[weights >= threshold]
+        return tuple(sorted(
+            phrase_ids.tolist(),
+            key=lambda phrase_id: (-self._weights[phrase_id], self._phrases[phrase_id][0])
+        )[:self.TOP_K])
+
+    def suggest(self, prefix: str, limit: int = TOP_K) -> List[Dict[str, str]]:
+        """Best completions for a typed prefix"""
+        key = " ".join(TOKEN_PATTERN.findall(prefix.lower()))[:self.MAX_KEY_LENGTH]
+        # Keep a trailing space so 'sony ' only completes phrases continuing after 'sony'
+        if prefix[-1:].isspace() and key and len(key) < self.MAX_KEY_LENGTH:
+            key += " "
+        key = key.encode("ascii")
+        with self._lock:
+            top = self._top.get(key)
+            if top is None:
+                candidates = self._candidates(key)
+                top = self._rank(candidates)
+                if len(candidates) >= self.CACHE_MIN_KEYS:
+                    self._top[key] = top
+            return [
+                {"text": self._phrases[phrase_id][0], "kind": self._phrases[phrase_id][1]}
+                for phrase_id in top[:limit]
+            ]
+
+suggest_index = register_index(SuggestIndex())
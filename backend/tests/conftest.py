@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models import cart, chat, user  # noqa: F401 - register all mappers
+from app.models.product import Product
+
+# (title, category, brand, price, rating)
+CATALOG = [
+    ("Sony Wireless Headphones", "Electronics", "Sony", 199.0, 4.6),
+    ("Sony Bluetooth Speaker", "Electronics", "Sony", 89.0, 4.2),
+    ("Samsung Galaxy Phone", "Electronics", "Samsung", 799.0, 4.5),
+    ("Samsung Laptop Pro", "Electronics", "Samsung", 1299.0, 4.1),
+    ("Dell Laptop Basic", "Electronics", "Dell", 549.0, 3.9),
+    ("Nike Running Shoes", "Sports", "Nike", 120.0, 4.4),
+    ("Adidas Running Jacket", "Sports", "Adidas", 75.0, 4.0),
+    ("Cotton Running Socks", "Clothing", None, 12.0, 3.5),
+    ("Classic Cookbook", "Books", None, 25.0, 4.8),
+    ("Wireless Mouse", "Electronics", "Dell", 25.0, 4.2),
+]
+
+@pytest.fixture
+def catalog_db(tmp_path):
+    """A session on a fresh SQLite database holding CATALOG, oldest product first"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    created_at = datetime(2026, 1, 1)
+    for i, (title, category, brand, price, rating) in enumerate(CATALOG):
+        db.add(Product(
+            title=title, category=category, brand=brand, price=price, rating=rating,
+            description=f"{title} description", created_at=created_at + timedelta(hours=i)
+        ))
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
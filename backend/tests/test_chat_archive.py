@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models.chat import ChatMessage, ChatSession
+from app.services.chat_archive import ChatArchive
+
+OLD = datetime(2025, 1, 1)
+
+@pytest.fixture
+def archived(catalog_db, tmp_path):
+    """Three idle sessions of user 1 and a newer one; the idle ones but the newest are archived"""
+    for session_id in range(1, 5):
+        created_at = OLD if session_id < 4 else datetime.utcnow()
+        catalog_db.add(ChatSession(id=session_id, user_id=1, created_at=created_at))
+        catalog_db.add(ChatMessage(session_id=session_id, content=f"hello {session_id}", timestamp=created_at))
+    catalog_db.commit()
+    archive = ChatArchive(str(tmp_path / "archive"), 1024 * 1024)
+    totals = archive.archive(catalog_db, datetime.utcnow() - timedelta(days=90))
+    assert totals["sessions"] == 3
+    return catalog_db, archive
+
+def test_restore_brings_back_the_session_and_its_messages(archived):
+    db, archive = archived
+    assert archive.restore(db, 1, 2)
+    assert [message.content for message in db.query(ChatMessage).filter(ChatMessage.session_id == 2)] == ["hello 2"]
+    # Once restored it is no longer in the archive
+    assert archive.find(1, 2) is None
+    assert not archive.restore(db, 1, 2)
+
+def test_restore_of_another_users_session_finds_nothing(archived):
+    db, archive = archived
+    assert not archive.restore(db, 2, 1)
+
+def test_restore_that_loses_a_race_reports_the_session_restored(archived):
+    db, archive = archived
+    # A concurrent request inserted the session but has not marked it restored in the index yet
+    db.add(ChatSession(id=3, user_id=1, created_at=OLD))
+    db.commit()
+    assert archive.restore(db, 1, 3)
+    assert db.query(ChatSession).filter(ChatSession.id == 3).count() == 1
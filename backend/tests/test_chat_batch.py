@@ -0,0 +1,54 @@
+from app.models.chat import ChatSession
+from app.services.chatbot import ChatbotService
+from app.services.conversation_state import conversation_states
+
+def sessions(db, count: int) -> list:
+    created = [ChatSession(user_id=1) for _ in range(count)]
+    db.add_all(created)
+    db.commit()
+    return [session.id for session in created]
+
+def counting_searches(chatbot: ChatbotService) -> list:
+    calls = []
+    search = chatbot.product_service.search_products_page
+
+    def counted(**filters):
+        calls.append(filters)
+        return search(**filters)
+
+    chatbot.product_service.search_products_page = counted
+    return calls
+
+def test_batch_runs_each_distinct_search_once_across_sessions(catalog_db):
+    chatbot = ChatbotService(catalog_db, memoize_searches=True)
+    calls = counting_searches(chatbot)
+    session_ids = sessions(catalog_db, 3)
+
+    replies = [chatbot.process_message("running", 1, session_id, "product_search") for session_id in session_ids]
+    assert len(calls) == 1
+    assert all(reply == replies[0] for reply in replies)
+    assert {product["title"] for product in replies[0]["products"]} == {
+        "Nike Running Shoes", "Adidas Running Jacket", "Cotton Running Socks"
+    }
+    # Each session still has its own follow-up state
+    for session_id in session_ids:
+        assert conversation_states.get(conversation_states.key(1, session_id)).shown == 3
+
+def test_follow_ups_move_through_their_own_session(catalog_db):
+    chatbot = ChatbotService(catalog_db, memoize_searches=True)
+    first, second = sessions(catalog_db, 2)
+    chatbot.process_message("electronics", 1, first, "default")
+    chatbot.process_message("electronics", 1, second, "default")
+
+    more = chatbot.process_message("show me more", 1, first, "follow_up")
+    assert more["products"]
+    assert conversation_states.get(conversation_states.key(1, first)).shown == 4 + len(more["products"])
+    assert conversation_states.get(conversation_states.key(1, second)).shown == 4
+
+def test_services_outside_a_batch_search_every_time(catalog_db):
+    chatbot = ChatbotService(catalog_db)
+    calls = counting_searches(chatbot)
+    first, second = sessions(catalog_db, 2)
+    chatbot.process_message("running", 1, first, "product_search")
+    chatbot.process_message("running", 1, second, "product_search")
+    assert len(calls) == 2
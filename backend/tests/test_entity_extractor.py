@@ -0,0 +1,70 @@
+import random
+import pytest
+from app.services.entity_extractor import AhoCorasick, EntityExtractor
+
+def record(product_id: int, category: str, brand=None) -> dict:
+    return {"id": product_id, "category": category, "brand": brand}
+
+@pytest.fixture
+def extractor():
+    extractor = EntityExtractor()
+    extractor.rebuild([
+        record(1, "Electronics", "Sony"),
+        record(2, "Sports & Outdoors", "Nike"),
+        record(3, "Home", "Sony Pictures"),
+        record(4, "Books", "LG"),
+        record(5, "Home Kitchen", None),
+    ])
+    return extractor
+
+def test_aho_corasick_finds_every_occurrence():
+    random.seed(12)
+    keywords = ["he", "she", "his", "hers", "s", "ssh"]
+    automaton = AhoCorasick(keywords)
+    for _ in range(200):
+        text = "".join(random.choice("hesri ") for _ in range(30))
+        expected = sorted(
+            (start, start + len(keyword), index)
+            for index, keyword in enumerate(keywords)
+            for start in range(len(text)) if text.startswith(keyword, start)
+        )
+        assert sorted(automaton.find(text)) == expected
+
+def test_longest_leftmost_whole_words(extractor):
+    text = "sony pictures dvd for my home kitchen"
+    assert [(kind, value) for _, _, kind, value in extractor.find_entities(text)] == [
+        ("brand", "Sony Pictures"), ("category", "Home Kitchen")
+    ]
+    # Inside a word is not a match: 'sonyx', 'homes' and 'lgbt' name nothing
+    assert extractor.find_entities("sonyx homes lgbt") == []
+    assert [value for _, _, _, value in extractor.find_entities("an lg tv")] == ["LG"]
+
+def test_categories_match_their_first_word_and_its_singular(extractor):
+    assert extractor.extract("sports gear")["category"] == "Sports & Outdoors"
+    assert extractor.extract("a book about cooking")["category"] == "Books"
+
+@pytest.mark.parametrize("message, prices", [
+    ("headphones under $200", {"max_price": 200.0}),
+    ("headphones below 1,299.99", {"max_price": 1299.99}),
+    ("shoes over $50", {"min_price": 50.0}),
+    ("shoes between $100 and $50", {"min_price": 50.0, "max_price": 100.0}),
+    ("tv from 300 to 800", {"min_price": 300.0, "max_price": 800.0}),
+    ("tv $300-$800", {"min_price": 300.0, "max_price": 800.0}),
+    ("at least 20 and at most 40 dollars", {"min_price": 20.0, "max_price": 40.0}),
+    ("a 4k tv", {}),
+])
+def test_price_limits(extractor, message, prices):
+    params = extractor.extract(message)
+    assert {key: params[key] for key in ("min_price", "max_price") if key in params} == prices
+
+def test_extract_leaves_the_rest_as_the_query(extractor):
+    params = extractor.extract("Show me Sony headphones under $200 please")
+    assert params == {"max_price": 200.0, "brand": "Sony", "query": "headphones"}
+    assert extractor.extract("electronics")["query"] is None
+
+def test_values_follow_catalog_writes(extractor):
+    assert extractor.find_entities("a dell laptop") == []
+    extractor.apply([record(6, "Computers", "Dell")], [3])
+    assert [value for _, _, _, value in extractor.find_entities("a dell laptop")] == ["Dell"]
+    # The last Sony Pictures product is gone, so only Sony is left
+    assert [value for _, _, _, value in extractor.find_entities("sony pictures")] == ["Sony"]
@@ -0,0 +1,34 @@
+import random
+from app.services.facet_index import FacetIndex
+
+def record(product_id: int, price: float, category: str = "Electronics", brand: str = "Sony") -> dict:
+    return {"id": product_id, "category": category, "brand": brand, "price": price}
+
+def expected_total(records: list, min_price: float, max_price: float) -> int:
+    return sum(1 for item in records if min_price <= item["price"] <= max_price)
+
+def test_price_range_cutting_through_buckets():
+    random.seed(4)
+    records = [record(product_id, round(random.uniform(0, 3000), 2)) for product_id in range(1, 2001)]
+    index = FacetIndex()
+    index.rebuild(records)
+
+    # 30-150 cuts through the 25-50 and 100-200 buckets and covers 50-100 whole
+    assert index.counts(min_price=30, max_price=150)["total"] == expected_total(records, 30, 150)
+    assert index.counts(min_price=2500)["total"] == expected_total(records, 2500, float("inf"))
+    assert index.counts(max_price=60)["total"] == expected_total(records, 0, 60)
+    # Bounds are inclusive
+    assert index.counts(min_price=records[0]["price"], max_price=records[0]["price"])["total"] >= 1
+
+def test_price_range_after_writes():
+    index = FacetIndex()
+    index.rebuild([record(1, 30.0), record(2, 45.0), record(3, 120.0)])
+    index.apply([record(2, 60.0), record(4, 40.0, brand="Dell")], [3])
+
+    counts = index.counts(min_price=35, max_price=130)
+    assert counts["total"] == 2
+    assert counts["brands"] == {"Sony": 1, "Dell": 1}
+    # The price facet ignores the price filter, and the removed product is gone from every bucket
+    assert counts["price_buckets"] == {1: 2, 2: 1}
+    index.apply([record(5, 130.0)], [])
+    assert index.counts(min_price=35, max_price=130)["total"] == 3
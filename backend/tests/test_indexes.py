@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine, inspect, text
+from app.core.database import create_missing_indexes
+from app.models import cart, chat, user  # noqa: F401 - register all mappers
+from app.models.product import Product
+
+# The products table as created before the listing, brand and updated_at indexes were declared
+PRODUCTS_TABLE = """
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR NOT NULL,
+    description TEXT,
+    price FLOAT NOT NULL,
+    category VARCHAR NOT NULL,
+    image_url VARCHAR,
+    brand VARCHAR,
+    rating FLOAT,
+    stock_quantity INTEGER,
+    is_active BOOLEAN,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    updated_at DATETIME
+)
+"""
+
+def test_indexes_added_to_existing_products_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'existing.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(PRODUCTS_TABLE))
+        connection.execute(text("CREATE INDEX ix_products_category ON products (category)"))
+
+    create_missing_indexes(engine, [Product.__table__])
+
+    indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("products")}
+    assert indexes["ix_products_active_rating_created_id"] == ["is_active", "rating", "created_at", "id"]
+    assert indexes["ix_products_brand"] == ["brand"]
+    assert indexes["ix_products_updated_at"] == ["updated_at"]
+
+    # Running it again at the next startup leaves the indexes alone
+    create_missing_indexes(engine, [Product.__table__])
+    assert len(inspect(engine).get_indexes("products")) == len(indexes)
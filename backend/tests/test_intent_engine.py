@@ -0,0 +1,49 @@
+import random
+import re
+import pytest
+from app.services.intent_engine import INTENT_PATTERNS, IntentEngine, follow_up_engine, intent_engine
+
+CORPUS = [
+    "", "   ", "hi", "Hello there!", "hey, show me laptops", "how are you", "what's up",
+    "good morning, I need a phone", "show me more", "  more  ", "next page", "next", "show cheaper options",
+    "cheaper", "something cheaper?", "filter by price", "show me more laptops under $500",
+    "what goes well with a tripod", "frequently bought together with headphones", "recommend something",
+    "what else should i buy", "customers who bought this", "similar to the sony speaker",
+    "find me a product for the kitchen", "laptop", "Samsung Galaxy", "running shoes", "books",
+    "show me categories", "what kinds of shoes", "category", "what do you have",
+    "how much is the iphone?", "$200", "anything under $50?", "what's my budget", "is it expensive",
+    "help", "can you assist me", "what can you do", "how does this work?",
+    "bye", "goodbye!", "see you later", "thank you, bye", "quit",
+    "where is my order #12345?", "1234", "ok.", "phone\nwith a big screen", "téléphone pas cher",
+    "PRICE OF A LAPTOP", "Hi! What's the price?", "help me find a cheap phone", "exit the chat",
+]
+
+def per_pattern_intent(message: str) -> str:
+    """How intents were detected before the patterns were merged: search them one by one"""
+    for intent, patterns in INTENT_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, message, re.IGNORECASE):
+                return intent
+    return 'default'
+
+@pytest.mark.parametrize("message", CORPUS)
+def test_same_intent_as_searching_patterns_one_by_one(message):
+    assert intent_engine.detect(message.lower().strip()) == per_pattern_intent(message.lower().strip())
+    assert intent_engine.detect(message) == per_pattern_intent(message)
+
+def test_same_intent_on_random_word_mixes():
+    random.seed(11)
+    words = " ".join(CORPUS).split() + ["more", "$", "cheaper", "with", "related", "to", "?", "!"]
+    for _ in range(2000):
+        message = " ".join(random.choice(words) for _ in range(random.randint(1, 8)))
+        assert intent_engine.detect(message) == per_pattern_intent(message), message
+
+def test_priority_follows_dictionary_order():
+    engine = IntentEngine({'first': [r'\bphone\b'], 'second': [r'\bcheap\b']}, default='none')
+    assert engine.detect("cheap phone") == 'first'
+    assert engine.detect("cheap laptop") == 'second'
+    assert engine.detect("laptop") == 'none'
+
+def test_follow_up_engine_only_knows_follow_ups():
+    assert follow_up_engine.detect("show me more") == 'follow_up'
+    assert follow_up_engine.detect("hello") == 'default'
@@ -0,0 +1,90 @@
+import json
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models import cart, chat, user  # noqa: F401 - register all mappers
+from app.models.chat import ChatMessage, ChatSession
+from app.services import message_writer as message_writer_module
+from app.services.message_writer import MessageWriter
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(message_writer_module, "SessionLocal", session_factory)
+    db = session_factory()
+    db.add(ChatSession(id=1, user_id=1))
+    db.commit()
+    yield db
+    db.close()
+
+def journaling_writer(path: str) -> MessageWriter:
+    """A writer journaling to path, with batches flushed by hand instead of by its thread"""
+    writer = MessageWriter(path, batch_size=500, interval_seconds=0.2, queue_size=100)
+    writer._journal = open(f"{path}.12345", "a", encoding="utf-8")
+    return writer
+
+def row(content: str, session_id: int = 1) -> dict:
+    return {"session_id": session_id, "content": content, "is_bot": False, "message_metadata": None}
+
+def contents(db) -> list:
+    db.expire_all()
+    return [message.content for message in db.query(ChatMessage).order_by(ChatMessage.id)]
+
+def test_replay_inserts_batches_left_behind_by_an_earlier_flush(tmp_path, database):
+    path = str(tmp_path / "chat.journal")
+    writer = journaling_writer(path)
+    writer.enqueue([row("first")])
+    writer.enqueue([row("second")])
+    first = writer._queue.get_nowait()
+    second = writer._queue.get_nowait()
+
+    # The later batch is committed while the earlier one is still on its way to the worker
+    writer._flush([second])
+    assert contents(database) == ["second"]
+    # The process dies here, before "first" is written
+    writer._journal.close()
+
+    MessageWriter(path, 500, 0.2, 100)._replay()
+    assert sorted(set(contents(database))) == ["first", "second"]
+    assert contents(database).count("first") == 1
+    assert not os.path.exists(f"{path}.12345")
+
+def test_checkpoint_covers_only_the_unbroken_run_of_flushed_batches(tmp_path, database):
+    writer = journaling_writer(str(tmp_path / "chat.journal"))
+    for content in ("one", "two", "three"):
+        writer.enqueue([row(content)])
+    batches = [writer._queue.get_nowait() for _ in range(3)]
+
+    writer._flush([batches[2]])
+    writer._flush([batches[0]])
+    with open(writer._journal.name, encoding="utf-8") as journal:
+        assert [json.loads(line) for line in journal][-1] == {"done": 1}
+
+    writer._flush([batches[1]])
+    # Caught up, so the journal is emptied
+    assert os.path.getsize(writer._journal.name) == 0
+    writer._journal.close()
+
+def test_rows_of_deleted_sessions_are_dropped(tmp_path, database):
+    writer = journaling_writer(str(tmp_path / "chat.journal"))
+    writer.enqueue([row("kept"), row("orphan", session_id=99)])
+    writer._flush([writer._queue.get_nowait()])
+    writer._journal.close()
+    assert contents(database) == ["kept"]
+    assert writer.dropped == 1
+
+def test_refused_rows_are_set_aside_without_holding_up_the_batch(tmp_path, database, monkeypatch):
+    monkeypatch.setattr(MessageWriter, "MAX_BATCH_ATTEMPTS", 1)
+    path = str(tmp_path / "chat.journal")
+    writer = journaling_writer(path)
+    writer.enqueue([row("before"), row(None), row("after")])
+    writer._flush([writer._queue.get_nowait()])
+    writer._journal.close()
+    assert contents(database) == ["before", "after"]
+    assert writer.rejected == 1
+    with open(f"{path}.rejected", encoding="utf-8") as rejected:
+        assert json.loads(rejected.readline())["content"] is None
@@ -0,0 +1,126 @@
+from datetime import datetime
+import pytest
+from app.models.product import Product
+from app.services import product_search
+from app.services.catalog_events import product_record
+from app.services.pagination import encode_cursor
+from app.services.product_search import ProductSearchService, search_cache
+from app.services.facet_index import FacetIndex
+from app.services.search_index import ProductIndex
+from app.services.suggest_index import SuggestIndex
+
+@pytest.fixture(autouse=True)
+def empty_search_cache():
+    search_cache.clear()
+    yield
+    search_cache.clear()
+
+@pytest.fixture
+def tied_catalog(catalog_db):
+    """The catalog plus rating ties within one second, some with fractional timestamps"""
+    same_second = datetime(2026, 2, 1, 12, 0, 0)
+    for i, microsecond in enumerate([999999, 500000, 250000, 250000, 0]):
+        catalog_db.add(Product(
+            title=f"Tied Lamp {i}", category="Home", price=40.0, rating=4.2,
+            created_at=same_second.replace(microsecond=microsecond)
+        ))
+    # Written with the server default, so stored without a fraction
+    for i in range(3):
+        catalog_db.add(Product(title=f"Default Lamp {i}", category="Home", price=35.0, rating=4.2))
+    catalog_db.commit()
+    return catalog_db
+
+def cursor_pages(service: ProductSearchService, limit: int, **filters) -> list:
+    ids, cursor = [], None
+    while True:
+        page, cursor = service.search_products_page(limit=limit, cursor=cursor, **filters)
+        ids.extend(product.id for product in page)
+        if cursor is None:
+            return ids
+
+def skip_pages(service: ProductSearchService, limit: int, **filters) -> list:
+    ids, offset = [], 0
+    while True:
+        page = service.search_products(limit=limit, offset=offset, **filters)
+        ids.extend(product.id for product in page)
+        if len(page) < limit:
+            return ids
+        offset += limit
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_cursor_pages_match_skip_pages(tied_catalog, limit):
+    service = ProductSearchService(tied_catalog)
+    expected = skip_pages(service, limit)
+    assert len(expected) == len(set(expected)) == tied_catalog.query(Product).count()
+    assert cursor_pages(service, limit) == expected
+
+def test_cursor_pages_match_skip_pages_with_filters(tied_catalog):
+    service = ProductSearchService(tied_catalog)
+    filters = {"query": "lamp", "max_price": 39.0}
+    assert cursor_pages(service, 1, **filters) == skip_pages(service, 1, **filters)
+    filters = {"category": "Electronics", "min_price": 50.0}
+    assert cursor_pages(service, 2, **filters) == skip_pages(service, 2, **filters)
+
+def test_cursor_from_iso_timestamp_continues_the_listing(tied_catalog):
+    # Cursors issued by the column snapshot carry ISO timestamps rather than SQLite's stored text
+    service = ProductSearchService(tied_catalog)
+    listing = skip_pages(service, 100)
+    last = tied_catalog.get(Product, listing[3])
+    cursor = encode_cursor({"k": [last.rating, last.created_at.isoformat(), last.id]})
+    page, _ = service.search_products_page(limit=100, cursor=cursor)
+    assert [product.id for product in page] == listing[4:]
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    encode_cursor({"k": [4.2, "2026-01-01T00:00:00"]}),
+    encode_cursor({"x": 1}),
+    encode_cursor([1, 2]),
+])
+def test_invalid_cursors_are_rejected(catalog_db, cursor):
+    with pytest.raises(ValueError):
+        ProductSearchService(catalog_db).search_products_page(cursor=cursor)
+
+def test_listing_cursor_is_rejected_by_ranked_search(catalog_db, monkeypatch):
+    index = ProductIndex()
+    index.rebuild([product_record(product) for product in catalog_db.query(Product)])
+    service = ProductSearchService(catalog_db)
+
+    # Issued while the in-memory index was still loading
+    monkeypatch.setattr(product_search, "product_index", ProductIndex())
+    page, cursor = service.search_products_page(query="running", limit=1)
+    assert cursor is not None
+
+    monkeypatch.setattr(product_search, "product_index", index)
+    with pytest.raises(ValueError):
+        service.search_products_page(query="running", limit=1, cursor=cursor)
+
+    # Offset cursors page through the ranked results
+    first, cursor = service.search_products_page(query="running", limit=2)
+    second, _ = service.search_products_page(query="running", limit=2, cursor=cursor)
+    ranked = [product.id for product in service.search_products(query="running", limit=10)]
+    assert [product.id for product in first + second] == ranked[:len(first) + len(second)]
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"category": "electronics"},
+    {"brand": "sony", "max_price": 150.0},
+    {"min_price": 30.0, "max_price": 700.0, "category": "o"},
+])
+def test_facets_fall_back_to_the_database_while_indexes_load(catalog_db, monkeypatch, filters):
+    records = [product_record(product) for product in catalog_db.query(Product)]
+    built = FacetIndex()
+    built.rebuild(records)
+    service = ProductSearchService(catalog_db)
+
+    monkeypatch.setattr(product_search, "facet_index", built)
+    expected = service.get_facets(**filters)
+    monkeypatch.setattr(product_search, "facet_index", FacetIndex())
+    assert expected["total"] > 0
+    assert service.get_facets(**filters) == expected
+
+def test_suggestions_fall_back_to_the_database_while_indexes_load(catalog_db):
+    built = SuggestIndex()
+    built.rebuild([product_record(product) for product in catalog_db.query(Product)])
+    service = ProductSearchService(catalog_db)
+    for prefix in ["s", "sony", "run", "laptop ", "wireless m", "zz"]:
+        assert service.suggest(prefix, 5) == built.suggest(prefix, 5), prefix
@@ -0,0 +1,123 @@
+import math
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from app.services.search_index import ProductIndex, tokenize
+
+WORDS = ["wireless", "headphones", "laptop", "phone", "case", "running", "shoes", "black", "pro", "mini",
+         "speaker", "bluetooth", "gaming", "mouse", "keyboard", "cotton", "socks", "book", "cookbook", "lamp"]
+CATEGORIES = ["Electronics", "Sports & Outdoors", "Clothing", "Books", "Home"]
+BRANDS = ["Sony", "Samsung", "Nike", "Dell", None]
+
+def random_catalog(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [{
+        "id": product_id,
+        "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))),
+        "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12))),
+        "category": rng.choice(CATEGORIES),
+        "brand": rng.choice(BRANDS),
+        "price": round(rng.uniform(5, 2000), 2),
+        "rating": round(rng.uniform(0, 5), 1),
+        "is_active": True,
+        "created_at": datetime(2026, 1, 1) + timedelta(minutes=rng.randint(0, 100000)),
+        "updated_at": None
+    } for product_id in range(1, count + 1)]
+
+def reference_search(records: list, query: str, k1: float = 1.2, b: float = 0.75, **filters) -> list:
+    """BM25 over the same fields, scored one product at a time"""
+    documents = {}
+    for record in records:
+        terms = Counter()
+        for term in tokenize(record["title"]):
+            terms[term] += ProductIndex.TITLE_WEIGHT
+        for field in ("brand", "category", "description"):
+            terms.update(tokenize(record[field]))
+        documents[record["id"]] = terms
+    total = len(documents)
+    average_length = sum(sum(terms.values()) for terms in documents.values()) / total
+    scored = []
+    for record in records:
+        terms = documents[record["id"]]
+        length = sum(terms.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            frequency = terms.get(term, 0)
+            if not frequency:
+                continue
+            containing = sum(1 for other in documents.values() if term in other)
+            idf = math.log(1 + (total - containing + 0.5) / (containing + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        if not score:
+            continue
+        if filters.get("category") and filters["category"].lower() not in record["category"].lower():
+            continue
+        if filters.get("brand") and filters["brand"].lower() not in (record["brand"] or "").lower():
+            continue
+        if filters.get("min_price") is not None and record["price"] < filters["min_price"]:
+            continue
+        if filters.get("max_price") is not None and record["price"] > filters["max_price"]:
+            continue
+        scored.append((round(score, 9), record["rating"], record["created_at"], record["id"]))
+    return [product_id for *_, product_id in sorted(scored, reverse=True)]
+
+@pytest.fixture(scope="module")
+def catalog():
+    records = random_catalog(400, seed=1)
+    index = ProductIndex()
+    index.rebuild(records)
+    return records, index
+
+@pytest.mark.parametrize("query", ["wireless headphones", "laptop", "black running shoes", "sony", "books", "zzz"])
+def test_ranking_matches_reference_bm25(catalog, query):
+    records, index = catalog
+    assert index.search(query, limit=1000) == reference_search(records, query)
+
+@pytest.mark.parametrize("filters", [
+    {"category": "electronics"},
+    {"brand": "SONY"},
+    {"category": "out", "min_price": 100.0},
+    {"min_price": 50.0, "max_price": 500.0},
+])
+def test_filters(catalog, filters):
+    records, index = catalog
+    assert index.search("pro mini speaker", limit=1000, **filters) == reference_search(records, "pro mini speaker", **filters)
+
+def test_pages_are_slices_of_the_full_ranking(catalog):
+    _, index = catalog
+    ranking = index.search("black case", limit=1000)
+    assert len(ranking) > 30
+    pages = [index.search("black case", limit=7, offset=offset) for offset in range(0, len(ranking), 7)]
+    assert [product_id for page in pages for product_id in page] == ranking
+
+def test_title_matches_outrank_description_matches():
+    index = ProductIndex()
+    base = {"category": "Home", "brand": None, "price": 10.0, "rating": 4.0,
+            "is_active": True, "created_at": datetime(2026, 1, 1), "updated_at": None}
+    index.rebuild([
+        dict(base, id=1, title="Table", description="a lamp for the table"),
+        dict(base, id=2, title="Desk Lamp", description="for the desk"),
+        dict(base, id=3, title="Chair", description="wooden chair"),
+    ])
+    assert index.search("lamp") == [2, 1]
+
+def test_writes_give_the_same_results_as_a_rebuild():
+    records = random_catalog(300, seed=2)
+    index = ProductIndex()
+    index.MIN_COMPACT_SLOTS = 16
+    index.rebuild(records)
+    rng = random.Random(3)
+    live = {record["id"]: record for record in records}
+    for step in range(60):
+        updated = [dict(rng.choice(records), title=f"{rng.choice(WORDS)} {rng.choice(WORDS)}") for _ in range(5)]
+        deleted = [rng.choice(records)["id"] for _ in range(2)]
+        index.apply(updated, deleted)
+        for product_id in deleted:
+            live.pop(product_id, None)
+        for record in updated:
+            live[record["id"]] = record
+    fresh = ProductIndex()
+    fresh.rebuild(list(live.values()))
+    for query in ["wireless", "black case", "running shoes sony"]:
+        assert index.search(query, limit=1000) == fresh.search(query, limit=1000)